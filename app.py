@@ -1,9 +1,18 @@
+import os
+import math
+import time
+import atexit
 import logging.config
 
 from flask import Flask
-from flask import render_template, request, redirect, url_for
+from flask import render_template, request, redirect, url_for, jsonify
 from src.train import get_model, predict_ind
-from src.createdb import Transaction, ResponseManager
+from src.createdb import (Transaction, ResponseManager, SummaryCache, PredictionLogWriter,
+                          get_scores)
+from src.page_cache import PageCache, gzip_response, COMPRESSIBLE_TYPES
+from src.price_store import PriceIndex
+from src.shadow import ShadowScorer
+from src.drift import DriftMonitor
 
 # Initialize Flask app
 app = Flask(__name__, template_folder="app/templates", static_folder="app/static")
@@ -20,10 +29,101 @@ model_path = app.config["MODEL_PATH"]
 encoder_path = app.config["ENCODER_PATH"]
 scaler_path = app.config["SCALER_PATH"]
 model, enc, scaler = get_model(model_path, encoder_path, scaler_path)
+artifacts_mtime = max(os.path.getmtime(path) for path in [model_path, encoder_path, scaler_path])
+
+# Daily closes served from memory, used when the user leaves the price empty
+price_index = PriceIndex(app.config["PRICE_STORE_DIR"], app.config["PRICE_INDEX_REFRESH_SECONDS"])
 
 # Manager to query data from sql table
 response_manager = ResponseManager(app)
 
+# Rendered pages, emptied when the data is re-ingested or the model is reloaded
+page_cache = PageCache(app.config["PAGE_CACHE_MAX_ENTRIES"])
+
+# In-process cache of the per-representative summaries built at ingestion
+summary_cache = SummaryCache(response_manager.session, app.config["SUMMARY_CACHE_TTL"])
+summary_cache.listeners.append(lambda version: page_cache.clear(f"after ingestion at {version}"))
+
+# Audit trail of the predictions, written in bulk from a background thread
+prediction_log = PredictionLogWriter(app.config["SQLALCHEMY_DATABASE_URI"],
+                                     app.config["PREDICTION_LOG_BATCH_SIZE"],
+                                     app.config["PREDICTION_LOG_FLUSH_SECONDS"],
+                                     app.config["PREDICTION_LOG_MAX_QUEUE"],
+                                     app.config["PREDICTION_LOG_POLICY"])
+atexit.register(prediction_log.close)
+
+# Candidate model of the registry scoring a sample of the predictions in the background
+shadow_scorer = ShadowScorer(app.config["REGISTRY_DIR"],
+                             app.config["SHADOW_MODEL_VERSION"],
+                             app.config["SHADOW_FRACTION"],
+                             app.config["SHADOW_MAX_QUEUE"],
+                             app.config["SHADOW_LOG_EVERY"])
+atexit.register(shadow_scorer.close)
+
+# Counters of the form inputs, compared with the training data on /drift. The counters
+# are in shared memory, so the worker processes of serve.py count into the same windows
+drift_monitor = DriftMonitor(app.config["DRIFT_PROFILE_PATH"], app.config["DRIFT_WINDOW"],
+                             app.config["DRIFT_MIN_PREDICTIONS"])
+
+def reload_artifacts():
+    '''Reloads the model artifacts if they were saved again since they were loaded
+    Args:
+        None
+    Returns:
+        reloaded (bool): True if new artifacts were loaded
+    '''
+    global model, enc, scaler, artifacts_mtime  # pylint: disable=global-statement
+    mtime = max(os.path.getmtime(path) for path in [model_path, encoder_path, scaler_path])
+    if mtime == artifacts_mtime:
+        return False
+    model, enc, scaler = get_model(model_path, encoder_path, scaler_path)
+    artifacts_mtime = mtime
+    drift_monitor.load()
+    page_cache.clear("after model reload")
+    return True
+
+@app.before_request
+def reload_model():
+    '''Reloads the model artifacts before a request, unless the process was forked by
+    serve.py, whose master reloads them and replaces the workers instead
+    Args:
+        None
+    Returns:
+        None
+    '''
+    if request.endpoint == "static" or not app.config["MODEL_RELOAD"]:
+        return
+    reload_artifacts()
+
+@app.after_request
+def add_http_caching(response):
+    '''Compresses successful GET responses and adds ETag, Last-Modified and Cache-Control
+    headers, so that browsers revalidate pages and reuse the static files
+    Args:
+        response (flask.Response): response returned by the view
+    Returns:
+        response (flask.Response): compressed response, or 304 if the client copy is current
+    '''
+    # the drift scores change with every prediction, they are never revalidated
+    if request.method != "GET" or response.status_code not in (200, 304) \
+            or request.endpoint == "drift":
+        return response
+    # set before any revalidation, also on the 304 answered by send_file itself
+    if response.mimetype in COMPRESSIBLE_TYPES:
+        response.vary.add("Accept-Encoding")
+    if response.status_code == 304:
+        return response
+    if request.endpoint != "static":
+        response.cache_control.no_cache = True
+        response.last_modified = page_cache.updated_at
+    gzip_response(response, request.headers.get("Accept-Encoding", ""),
+                  app.config["GZIP_MIN_SIZE"])
+    # static files sent as they are keep the ETag set by send_file; a compressed body
+    # gets an ETag of its gzip bytes, told apart by the Vary: Accept-Encoding
+    if not response.direct_passthrough:
+        response.add_etag(overwrite=True)
+    return response.make_conditional(request)
+
 @app.route("/", methods=["GET", "POST"])
 def home():
     '''Main page of application providing information and collecting form info
@@ -34,8 +134,11 @@ def home():
     '''
     if request.method == "GET":
         try:
+            page = page_cache.get(("home",))
+            if page is None:
+                page = page_cache.set(("home",), render_template("index.html"))
             logger.info("Main page returned")
-            return render_template("index.html")
+            return page
         except Exception as error:
             logger.error("Error page returned with error: %s", error)
             return render_template("error.html")
@@ -47,9 +150,23 @@ def home():
             owner = str(request.form["owner"])
             type_trans = str(request.form["type"])
             amount = str(request.form["amount"])
-            cat_vars = [owner, ticker, type_trans, amount, representative]
-            trans_price = float(request.form["trans_price"])
+            cat_vars = {"owner": owner, "ticker": ticker, "type": type_trans,
+                        "amount": amount, "representative": representative}
+            transaction_date = request.form.get("transaction_date", "").strip() or None
+            trans_price = request.form["trans_price"].strip()
+            if not trans_price:
+                trans_price = price_index.price(ticker, transaction_date)
+                logger.info("Price of %s filled in from the price index", ticker)
+            trans_price = float(trans_price)
+            if math.isnan(trans_price) or trans_price <= 0:
+                raise ValueError(f"No valid price entered or stored for {ticker}")
+            start = time.perf_counter()
             prediction = predict_ind(model, enc, scaler, cat_vars, trans_price)
+            shadow_scorer.submit(cat_vars, trans_price, prediction, time.perf_counter() - start)
+            drift_monitor.update(cat_vars, trans_price)
+            prediction_log.log({"representative": representative, "ticker": ticker,
+                                "owner": owner, "type": type_trans, "amount": amount,
+                                "trans_price": trans_price, "probability": prediction})
             url_for_post = url_for("response_page", class1 = str(representative), prob1=prediction)
             logger.info("Prediction submitted from form")
             return redirect(url_for_post)
@@ -69,11 +186,34 @@ def response_page(class1, prob1):
     '''
     if request.method == "GET":
         try:
-            response = response_manager.session.query(Transaction)\
-                                       .filter(Transaction.representative.in_([str(class1)]))
-            probs = [prob1]
+            try:
+                summary = summary_cache.get(str(class1))
+            except Exception as error:
+                logger.warning("Summary table unavailable, querying transactions: %s", error)
+                response_manager.session.rollback()
+                summary = None
+            key = ("response_page", str(class1), str(prob1))
+            page = page_cache.get(key)
+            if page is None:
+                if summary is not None:
+                    response = summary["latest"]
+                else:
+                    response = response_manager.session.query(Transaction)\
+                                        .filter(Transaction.representative.in_([str(class1)]))
+                try:
+                    scores = get_scores(response_manager.session, str(class1))
+                except Exception as error:
+                    logger.warning("Transaction scores unavailable: %s", error)
+                    response_manager.session.rollback()
+                    scores = {}
+                probs = [prob1]
+                page = render_template("response.html", responses = response ,
+                                       probabilities=probs, summary=summary, scores=scores)
+                # without the summary table, re-ingestion cannot be detected
+                if summary is not None:
+                    page_cache.set(key, page)
             logger.info("Response page requested")
-            return render_template("response.html", responses = response ,probabilities=probs)
+            return page
         except Exception as error:
             logger.error("Error getting page: %s", error)
             logger.debug("Make sure to fill entire form")
@@ -83,5 +223,18 @@ def response_page(class1, prob1):
         url_for_post = url_for("home/")
         return redirect(url_for_post)
 
+@app.route("/drift", methods=["GET"])
+def drift():
+    '''Drift of the form inputs of the last predictions of every worker process from
+    the training data
+    Args:
+        None
+    Returns:
+        json with the population stability index of every input
+    '''
+    response = jsonify(drift_monitor.scores())
+    response.cache_control.no_store = True
+    return response
+
 if __name__ == "__main__":
     app.run(debug=app.config["DEBUG"], port=app.config["PORT"], host=app.config["HOST"])
@@ -0,0 +1,88 @@
+"""
+Benchmark of the stepwise cleaning functions against the fused cleaning pass.
+Reports wall time and peak traced memory for each data size.
+
+Run from the root of the repo:
+    python -m benchmarks.bench_clean --sizes 10000 1000000 10000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import typing
+import yaml
+
+from src import clean, synthetic
+
+COLUMNS = ['transaction_date', 'disclosure_date', 'disclosure_year',
+           'cap_gains_over_200_usd', 'asset_description', 'ptr_link',
+           'date_x', 'date_y', 'district', 'current_price']
+
+def make_raw_data(n_rows: int, directory: str, seed: int = 29) -> typing.List[str]:
+    '''
+    Writes synthetic stockwatcher, transact_price and current_price files
+
+    Args:
+        n_rows (int): number of transactions
+        directory (str): folder where the files get written
+        seed (int): random seed
+    Returns:
+        paths (typing.List[str]): paths of the three files
+    '''
+    with open('config/test.yaml', 'r', encoding='utf8') as file:
+        conf = yaml.safe_load(file)['synthetic']
+    paths = [os.path.join(directory, name)
+             for name in ['stockwatcher.csv', 'transact_price.csv', 'current_price.csv']]
+    conf.update(stockwatcher_path=paths[0], transact_price_path=paths[1],
+                current_price_path=paths[2], recent_path=None, price_history_path=None,
+                n_rows=n_rows, n_tickers=200, n_representatives=50, seed=seed)
+    synthetic.generate_data(**conf)
+    return paths
+
+def stepwise(paths: typing.List[str], directory: str) -> None:
+    '''Runs the clean and add_features stages as the pipeline does'''
+    cleaned = os.path.join(directory, 'cleaned_data.csv')
+    data = clean.join_transact_price(paths[0], paths[1])
+    clean.join_current_price(data, paths[2], cleaned)
+    data = clean.add_response(cleaned)
+    data = clean.filter_df(data, COLUMNS)
+    data = clean.drop_dups(data)
+    clean.impute_missing(data, os.path.join(directory, 'stepwise.csv'))
+
+def fused(paths: typing.List[str], directory: str) -> None:
+    '''Runs the fused cleaning pass'''
+    clean.clean_fused(*paths, COLUMNS, os.path.join(directory, 'fused.csv'))
+
+def measure(func: typing.Callable, *args) -> typing.Tuple[float, float]:
+    '''
+    Runs the function twice: once for wall time, once for peak traced memory
+
+    Returns:
+        seconds (float): wall time in seconds
+        peak_mb (float): peak memory allocated while running, in MB
+    '''
+    start = time.perf_counter()
+    func(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 1e6
+
+def main() -> None:
+    '''Parses the arguments and prints one result line per size and method'''
+    parser = argparse.ArgumentParser(description='Benchmark the cleaning stage')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 1_000_000, 10_000_000])
+    args = parser.parse_args()
+    print(f"{'rows':>10} {'method':>9} {'seconds':>9} {'peak MB':>9}")
+    for n_rows in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = make_raw_data(n_rows, directory)
+            for name, func in [('stepwise', stepwise), ('fused', fused)]:
+                seconds, peak_mb = measure(func, paths, directory)
+                print(f'{n_rows:>10} {name:>9} {seconds:>9.2f} {peak_mb:>9.1f}')
+
+if __name__ == '__main__':
+    main()
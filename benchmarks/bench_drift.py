@@ -0,0 +1,58 @@
+"""
+Benchmark of the drift monitor of the app. Reports the time taken to count the inputs
+of one prediction into the shared counters, and the time taken by /drift to compare a
+window with a training profile with many tickers and representatives.
+
+Run from the root of the repo:
+    python -m benchmarks.bench_drift --updates 200000 --tickers 3000
+"""
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+from src import drift
+
+CATEG = ['owner', 'ticker', 'type', 'amount', 'representative']
+
+def make_training_data(n_rows: int, n_tickers: int, seed: int = 0) -> pd.DataFrame:
+    '''Returns random transactions with skewed ticker and representative frequencies'''
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'owner': rng.choice(['self', 'joint', 'spouse', 'dependent'], n_rows),
+        'ticker': [f'T{i}' for i in rng.zipf(1.3, n_rows) % n_tickers],
+        'type': rng.choice(['purchase', 'sale_full', 'sale_partial'], n_rows),
+        'amount': rng.choice(['$1,001 - $15,000', '$15,001 - $50,000',
+                              '$50,001 - $100,000'], n_rows),
+        'representative': [f'Hon. R{i}' for i in rng.zipf(1.5, n_rows) % 500],
+        'trans_price': rng.lognormal(4, 1, n_rows)})
+
+def main() -> None:
+    '''Parses the arguments and prints the update and comparison times'''
+    parser = argparse.ArgumentParser(description='Benchmark the drift monitor')
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--tickers', type=int, default=3000)
+    parser.add_argument('--updates', type=int, default=200_000)
+    args = parser.parse_args()
+    data = make_training_data(args.rows, args.tickers)
+    with tempfile.TemporaryDirectory() as directory:
+        profile_path = os.path.join(directory, 'profile.json')
+        drift.save_profile(drift.build_profile(data, CATEG), profile_path)
+        monitor = drift.DriftMonitor(profile_path, window_size=1000)
+    rows = data.sample(args.updates, replace=True, random_state=1).to_dict('records')
+    start = time.perf_counter()
+    for row in rows:
+        monitor.update(row, row['trans_price'])
+    per_update = (time.perf_counter() - start) / args.updates
+    start = time.perf_counter()
+    scores = monitor.scores()
+    per_scores = time.perf_counter() - start
+    print(f"update: {per_update * 1e6:.2f} us per prediction, "
+          f"scores: {per_scores * 1e3:.2f} ms, "
+          f"max PSI on training rows: "
+          f"{max(feature['psi'] for feature in scores['features'].values()):.4f}")
+
+if __name__ == '__main__':
+    main()
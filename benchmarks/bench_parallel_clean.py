@@ -0,0 +1,68 @@
+"""
+Scaling benchmark of the parallel feature steps (add_features_parallel) against
+the serial functions. Saves a chart of the speed-up for 1 to N worker processes.
+
+Run from the root of the repo:
+    python -m benchmarks.bench_parallel_clean --n_rows 1000000 --max_jobs 8
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+import warnings
+import matplotlib
+import pandas as pd
+
+from src import clean
+from benchmarks.bench_clean import COLUMNS, make_raw_data
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt  # pylint: disable=wrong-import-position
+
+def main() -> None:
+    '''Times the serial path and the parallel path for each number of workers'''
+    parser = argparse.ArgumentParser(description='Benchmark the parallel feature steps')
+    parser.add_argument('--n_rows', type=int, default=1_000_000)
+    parser.add_argument('--max_jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--chart_path', default='figures/parallel_clean_scaling.png')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.simplefilter('ignore')
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = make_raw_data(args.n_rows, directory)
+        data = clean.join_transact_price(paths[0], paths[1])
+        cleaned_path = os.path.join(directory, 'cleaned_data.csv')
+        clean.join_current_price(data, paths[2], cleaned_path)
+        data = pd.read_csv(cleaned_path)
+
+    start = time.perf_counter()
+    clean.impute_missing(clean.drop_dups(clean.filter_df(clean.add_response(data.copy()),
+                                                         COLUMNS)))
+    serial = time.perf_counter() - start
+    print(f"{'workers':>8} {'seconds':>9} {'speed-up':>9}")
+    print(f"{'serial':>8} {serial:>9.2f} {1:>9.2f}")
+
+    jobs, speedups = list(range(1, args.max_jobs + 1)), []
+    for n_jobs in jobs:
+        start = time.perf_counter()
+        clean.add_features_parallel(data.copy(), COLUMNS, n_jobs=n_jobs)
+        seconds = time.perf_counter() - start
+        speedups.append(serial / seconds)
+        print(f'{n_jobs:>8} {seconds:>9.2f} {speedups[-1]:>9.2f}')
+
+    fig, axis = plt.subplots()
+    axis.plot(jobs, speedups, marker='o', label='add_features_parallel')
+    axis.plot(jobs, jobs, linestyle='--', color='grey', label='linear')
+    axis.axhline(1, color='black', linewidth=0.5)
+    axis.set_xlabel('worker processes')
+    axis.set_ylabel('speed-up vs serial')
+    axis.set_title(f'Feature steps on {args.n_rows:,} rows')
+    axis.legend()
+    fig.savefig(args.chart_path)
+    plt.close(fig)
+    print(f'Chart saved to {args.chart_path}')
+
+if __name__ == '__main__':
+    main()
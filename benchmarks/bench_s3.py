@@ -0,0 +1,64 @@
+"""
+Benchmark of the compression of the files uploaded to S3. Reports, for every available
+compression, the bytes that would be sent and the time taken to compress the file as
+upload_s3 streams it; with --s3_raw, also uploads and downloads the file and reports the
+transfer times against the uncompressed file.
+
+Run from the root of the repo:
+    python -m benchmarks.bench_s3 --local_path data/s3_downloads/stockwatcher.csv
+    python -m benchmarks.bench_s3 --s3_raw s3://<bucket>
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from src import acquire_new
+
+def compress_file(local_path: str, compression: str) -> dict:
+    '''Reads the file through CompressedReader in the parts used by the S3 client'''
+    start = time.perf_counter()
+    with open(local_path, 'rb') as source:
+        reader = acquire_new.CompressedReader(source, compression)
+        while reader.read(8 << 20):
+            pass
+    return {'compression': compression, 'bytes': reader.bytes_in,
+            'bytes_transferred': reader.bytes_out,
+            'seconds': round(time.perf_counter() - start, 3)}
+
+def main() -> None:
+    '''Parses the arguments and prints the bytes and times of every compression'''
+    parser = argparse.ArgumentParser(description='Benchmark the compression of S3 transfers')
+    parser.add_argument('--local_path', default='data/external/stockwatcher.csv')
+    parser.add_argument('--s3_raw', default=None, help='bucket to time real transfers')
+    args = parser.parse_args()
+    compressions = []
+    for compression in acquire_new.COMPRESSIONS:
+        try:
+            acquire_new.make_codec(compression)
+            compressions.append(compression)
+        except ImportError:
+            print(f'{compression}: not installed, skipped')
+    for compression in compressions:
+        result = compress_file(args.local_path, compression)
+        print(f"{compression}: {result['bytes']} -> {result['bytes_transferred']} bytes "
+              f"(ratio {result['bytes'] / result['bytes_transferred']:.1f}) "
+              f"compressed in {result['seconds']:.3f}s")
+    if not args.s3_raw:
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        for compression in [None] + compressions:
+            upload = acquire_new.upload_s3(args.s3_raw, 'stockwatcher', args.local_path,
+                                           compression)
+            download = acquire_new.download_s3(args.s3_raw, 'stockwatcher',
+                                               os.path.join(directory, 'stockwatcher.csv'),
+                                               ',', compression)
+            if upload is None or download is None:
+                print('transfer failed, see the log')
+                return
+            print(f"{compression or 'none'}: upload {upload['bytes_transferred']} bytes in "
+                  f"{upload['seconds']:.2f}s, download {download['bytes_transferred']} bytes "
+                  f"in {download['seconds']:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark of serve.py with an increasing number of pre-forked workers. Reports the
+memory of every worker (RSS, the pages shared with the master, and PSS, which splits the
+shared pages between the processes that map them) and the prediction requests served
+per second by concurrent client processes.
+
+Run from the root of the repo (after get_model, with the app database available):
+    python -m benchmarks.bench_serve --workers 1 2 4 --clients 8 --seconds 10
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+import typing
+import urllib.parse
+
+FORM = urllib.parse.urlencode({'representative': 'Hon. Nancy Pelosi', 'ticker': 'MSFT',
+                               'owner': 'self', 'type': 'purchase',
+                               'amount': '$1,001 - $15,000', 'trans_price': '250.5',
+                               'transaction_date': ''})
+
+def free_port() -> int:
+    '''Returns a port that nothing listens on'''
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def memory(pid: int) -> typing.Dict[str, float]:
+    '''
+    Reads the memory of a process from /proc (Linux only)
+
+    Returns:
+        memory (typing.Dict[str, float]): RSS, shared and PSS in MB
+    '''
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup', 'r', encoding='utf8') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {'rss': values['Rss'],
+            'shared': values['Shared_Clean'] + values['Shared_Dirty'],
+            'pss': values['Pss']}
+
+def client(port: int, seconds: float) -> int:
+    '''Posts predictions for `seconds` and returns the number of responses'''
+    served = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        connection.request('POST', '/', FORM,
+                           {'Content-Type': 'application/x-www-form-urlencoded'})
+        if connection.getresponse().status == 302:
+            served += 1
+        connection.close()
+    return served
+
+def run(n_workers: int, n_clients: int, seconds: float) -> None:
+    '''Starts serve.py, loads it with the clients and prints one result line'''
+    port = free_port()
+    master = subprocess.Popen([sys.executable, 'serve.py', '--workers', str(n_workers),
+                               '--port', str(port), '--host', '127.0.0.1'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(300):
+            try:
+                http.client.HTTPConnection('127.0.0.1', port).request('GET', '/')
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.1)
+        time.sleep(1)
+        with multiprocessing.Pool(n_clients) as pool:
+            counts = pool.starmap(client, [(port, seconds)] * n_clients)
+        with open(f'/proc/{master.pid}/task/{master.pid}/children', 'r',
+                  encoding='utf8') as file:
+            pids = [int(pid) for pid in file.read().split()]
+        workers = [memory(pid) for pid in pids]
+        average = {key: sum(worker[key] for worker in workers) / len(workers)
+                   for key in workers[0]}
+        print(f"{n_workers:>8} {sum(counts) / seconds:>9.1f} {average['rss']:>8.1f} "
+              f"{average['shared']:>10.1f} {average['pss']:>8.1f} "
+              f"{memory(master.pid)['rss']:>10.1f}")
+    finally:
+        master.terminate()
+        master.wait()
+
+def main() -> None:
+    '''Parses the arguments and prints one result line per number of workers'''
+    parser = argparse.ArgumentParser(description='Benchmark the pre-fork server')
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+    print(f"CPUs: {os.cpu_count()}, clients: {args.clients}")
+    print(f"{'workers':>8} {'req/s':>9} {'RSS MB':>8} {'shared MB':>10} {'PSS MB':>8} "
+          f"{'master MB':>10}")
+    for n_workers in args.workers:
+        run(n_workers, args.clients, args.seconds)
+
+if __name__ == '__main__':
+    main()
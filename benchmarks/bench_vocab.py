@@ -0,0 +1,56 @@
+"""
+Benchmark of the cleaned data with the string columns kept as strings, as
+categoricals and as int32 codes into the persisted vocabulary. Reports memory per
+row, csv size and the time to read, deduplicate and group the data.
+
+Run from the root of the repo:
+    python -m benchmarks.bench_vocab --sizes 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import typing
+import pandas as pd
+
+from src import clean, vocab
+from benchmarks.bench_clean import COLUMNS, make_raw_data
+
+def timed(func: typing.Callable, *args) -> typing.Tuple[typing.Any, float]:
+    '''Returns the output of the function and its wall time in seconds'''
+    start = time.perf_counter()
+    output = func(*args)
+    return output, time.perf_counter() - start
+
+def main() -> None:
+    '''Parses the arguments and prints one result line per size and layout'''
+    parser = argparse.ArgumentParser(description='Benchmark the string encodings')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1_000_000])
+    args = parser.parse_args()
+    print(f"{'rows':>10} {'layout':>11} {'B/row':>7} {'csv MB':>7} "
+          f"{'read s':>7} {'dedup s':>8} {'group s':>8}")
+    for n_rows in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = make_raw_data(n_rows, directory)
+            plain_path = os.path.join(directory, 'plain.csv')
+            coded_path = os.path.join(directory, 'coded.csv')
+            vocab_path = os.path.join(directory, 'vocab.json')
+            clean.clean_fused(*paths, COLUMNS, plain_path)
+            clean.clean_fused(*paths, COLUMNS, coded_path, vocab_path=vocab_path)
+            vocab_dict = vocab.load_vocab(vocab_path)
+
+            layouts = [('strings', plain_path, lambda: pd.read_csv(plain_path)),
+                       ('categorical', coded_path,
+                        lambda: vocab.read_encoded(coded_path, vocab_path)),
+                       ('int32 codes', coded_path, lambda: pd.read_csv(coded_path))]
+            for name, path, read in layouts:
+                data, read_s = timed(read)
+                _, dedup_s = timed(data.drop_duplicates)
+                _, group_s = timed(lambda: data.groupby(list(vocab_dict), observed=True)
+                                   ['response'].mean())
+                print(f'{len(data):>10} {name:>11} {vocab.memory_per_row(data):>7.1f} '
+                      f'{os.path.getsize(path) / 1e6:>7.1f} {read_s:>7.2f} '
+                      f'{dedup_s:>8.2f} {group_s:>8.2f}')
+
+if __name__ == '__main__':
+    main()
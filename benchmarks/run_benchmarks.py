@@ -0,0 +1,212 @@
+"""
+Benchmark suite for the hot paths of the cleaning, training and scoring stages.
+Each case is timed on synthetic data at several sizes and compared against the
+baseline stored in benchmarks/baseline.json. The script exits with status 1 when
+a case is slower than its baseline by more than the threshold, and by more than an
+absolute floor, so that noise on sub-millisecond cases never fails the run.
+
+Timings depend on the machine: the baseline must be recorded (--save) on the host
+that runs the comparison, e.g. the CI runner, and recorded again after an intended
+performance change.
+
+Run from the root of the repo:
+    python -m benchmarks.run_benchmarks                  # compare against the baseline
+    python -m benchmarks.run_benchmarks --save           # record a new baseline
+    python -m benchmarks.run_benchmarks --threshold 0.5  # allow 50% slowdown
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import timeit
+import typing
+import warnings
+import yaml
+
+from src import clean, train, synthetic
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# minimum seconds of one timing: fast cases are called as many times as needed
+MIN_TIMING = 0.2
+
+CATEG = ['owner', 'ticker', 'type', 'amount', 'representative']
+COLUMNS = ['transaction_date', 'disclosure_date', 'disclosure_year',
+           'cap_gains_over_200_usd', 'asset_description', 'ptr_link',
+           'date_x', 'date_y', 'district', 'current_price']
+ROW = ['self', 'AAPL', 'purchase', '$1,001 - $15,000', 'Hon. Nancy Pelosi']
+
+def make_cases(n_rows: int, directory: str) -> typing.Dict[str, typing.Callable]:
+    '''
+    Generates the synthetic data for one size and prepares the inputs of every case,
+    so that only the function under test is timed
+
+    Args:
+        n_rows (int): number of synthetic transactions
+        directory (str): folder for the synthetic and intermediate files
+    Returns:
+        cases (dict): case name mapped to a function without arguments
+    '''
+    with open('config/test.yaml', 'r', encoding='utf8') as file:
+        conf = yaml.safe_load(file)['synthetic']
+    paths = {name: os.path.join(directory, name + '.csv')
+             for name in ['stockwatcher', 'transact_price', 'current_price',
+                          'cleaned_data', 'features']}
+    conf.update(stockwatcher_path=paths['stockwatcher'],
+                transact_price_path=paths['transact_price'],
+                current_price_path=paths['current_price'],
+                recent_path=None, price_history_path=None, n_rows=n_rows)
+    synthetic.generate_data(**conf)
+
+    joined = clean.join_transact_price(paths['stockwatcher'], paths['transact_price'])
+    clean.join_current_price(joined, paths['current_price'], paths['cleaned_data'])
+    with_response = clean.add_response(paths['cleaned_data'])
+    filtered = clean.filter_df(with_response, COLUMNS)
+    clean.impute_missing(clean.drop_dups(filtered), paths['features'])
+
+    model_paths = [os.path.join(directory, name) for name in ['model.pkl', 'enc.pkl', 'sc.pkl']]
+    train_args = dict(local_path=paths['features'], categ=CATEG, response='response',
+                      results_path=None, matrix_path=None, roc_path=None,
+                      test_size=0.2, random_state=29, max_iter=5000,
+                      output_data_path=None, pred_path_1=None, pred_path_2=None)
+    train.train(**dict(train_args, model_path=model_paths[0], encoder_path=model_paths[1],
+                       scaler_path=model_paths[2]))
+    model, enc, scaler = train.get_model(*model_paths)
+    no_artifacts = dict(train_args, model_path=None, encoder_path=None, scaler_path=None)
+
+    def pipeline() -> None:
+        data = clean.join_transact_price(paths['stockwatcher'], paths['transact_price'])
+        clean.join_current_price(data, paths['current_price'], paths['cleaned_data'])
+        data = clean.add_response(paths['cleaned_data'])
+        data = clean.drop_dups(clean.filter_df(data, COLUMNS))
+        clean.impute_missing(data, paths['features'])
+        train.train(**no_artifacts)
+
+    return {'join_transact_price': lambda: clean.join_transact_price(
+                                       paths['stockwatcher'], paths['transact_price']),
+            'join_current_price': lambda: clean.join_current_price(
+                                      joined, paths['current_price'], None),
+            'add_response': lambda: clean.add_response(with_response),
+            'drop_dups': lambda: clean.drop_dups(filtered),
+            'impute_missing': lambda: clean.impute_missing(filtered.copy()),
+            'train': lambda: train.train(**no_artifacts),
+            'transform': lambda: train.transform(enc, scaler, ROW, 150.0),
+            'predict_ind': lambda: train.predict_ind(model, enc, scaler, ROW, 150.0),
+            'pipeline': pipeline}
+
+def calibrate(timer: timeit.Timer) -> int:
+    '''
+    Finds the number of calls whose total time is at least MIN_TIMING seconds
+
+    Args:
+        timer (timeit.Timer): timer of the case
+    Returns:
+        number (int): calls per timing
+    '''
+    number = 1
+    while True:
+        if timer.timeit(number) >= MIN_TIMING:
+            return number
+        number *= 2
+
+def run(sizes: typing.List[int], repeat: int) -> typing.Dict[str, typing.Dict[str, float]]:
+    '''
+    Times every case at every size, keeping the best of `repeat` timings. Each timing
+    calls the case as many times as needed to last at least MIN_TIMING seconds, and the
+    cases are timed in turns
+
+    Args:
+        sizes (typing.List[int]): numbers of synthetic transactions
+        repeat (int): number of timings per case
+    Returns:
+        results (dict): case name mapped to {size: seconds per call}
+    '''
+    results = {}
+    for n_rows in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            timers = {name: timeit.Timer(func)
+                      for name, func in make_cases(n_rows, directory).items()}
+            numbers = {name: calibrate(timer) for name, timer in timers.items()}
+            best = dict.fromkeys(timers, float('inf'))
+            # the cases take turns, so a slow spell of the host does not hit one case only
+            for _ in range(repeat):
+                for name, timer in timers.items():
+                    best[name] = min(best[name], timer.timeit(numbers[name]) / numbers[name])
+            for name, seconds in best.items():
+                results.setdefault(name, {})[str(n_rows)] = round(seconds, 7)
+                print(f'{name:>20} {n_rows:>9} {seconds:>12.6f}s')
+    return results
+
+def compare(results: dict,
+            baseline: dict,
+            threshold: float,
+            floor: float = 0.001) -> typing.List[str]:
+    '''
+    Lists the cases that are slower than the baseline by more than the threshold and by
+    more than the floor
+
+    Args:
+        results (dict): timings of this run
+        baseline (dict): stored timings
+        threshold (float): allowed relative slowdown (0.25 means 25% slower)
+        floor (float): allowed absolute slowdown in seconds per call, below which the
+        difference is treated as noise
+    Returns:
+        regressions (typing.List[str]): one message per regressed case and size
+    '''
+    regressions = []
+    for name, timings in results.items():
+        for size, seconds in timings.items():
+            reference = baseline.get(name, {}).get(size)
+            if reference and seconds > reference * (1 + threshold) \
+                    and seconds - reference > floor:
+                regressions.append(f'{name} at {size} rows: {seconds:.6f}s vs '
+                                   f'{reference:.6f}s baseline (+{seconds / reference - 1:.0%})')
+    return regressions
+
+def main() -> None:
+    '''Parses the arguments, runs the suite and saves or checks the baseline'''
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline hot paths')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed relative slowdown before failing')
+    parser.add_argument('--floor', type=float, default=0.001,
+                        help='Allowed absolute slowdown in seconds per call before failing')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help='Store the results as baseline')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    warnings.simplefilter('ignore')
+
+    results = run(args.sizes, args.repeat)
+    host = {'machine': platform.machine(), 'processor': platform.processor(),
+            'cpus': os.cpu_count(),
+            'python': platform.python_version()}
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf8') as file:
+            json.dump(dict(results, _host=host), file, indent=2, sort_keys=True)
+        print(f'Baseline saved to {args.baseline}')
+        return
+
+    try:
+        with open(args.baseline, 'r', encoding='utf8') as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        print(f'No baseline at {args.baseline}. Run with --save first')
+        sys.exit(1)
+    if baseline.get('_host') != host:
+        print(f"WARNING: the baseline was recorded on {baseline.get('_host', 'another host')}, "
+              f"not on {host}. Record it again on this host with --save")
+    regressions = compare(results, baseline, args.threshold, args.floor)
+    for message in regressions:
+        print('REGRESSION', message)
+    if regressions:
+        sys.exit(1)
+    print(f'No regression above {args.threshold:.0%}')
+
+if __name__ == '__main__':
+    main()
@@ -10,9 +10,30 @@ SQLALCHEMY_TRACK_MODIFICATIONS = True
 HOST = '0.0.0.0'
 SQLALCHEMY_ECHO = False  # If true, SQL for queries made will be printed
 MAX_ROWS_SHOW = 100
+SUMMARY_CACHE_TTL = 30  # seconds between checks for re-ingested data
+PAGE_CACHE_MAX_ENTRIES = 256  # rendered pages kept in memory
+GZIP_MIN_SIZE = 500  # responses smaller than this (in bytes) are not compressed
+SEND_FILE_MAX_AGE_DEFAULT = 3600  # seconds browsers may reuse the static files
+PREDICTION_LOG_BATCH_SIZE = 100  # predictions inserted at once
+PREDICTION_LOG_FLUSH_SECONDS = 0.5  # maximum delay before a prediction is written
+PREDICTION_LOG_MAX_QUEUE = 10000  # predictions waiting in memory before backpressure
+PREDICTION_LOG_POLICY = 'drop'  # 'drop' or 'block' when the queue is full
 MODEL_PATH = './models/model.pkl'
 ENCODER_PATH = './models/encoder.pkl'
 SCALER_PATH = './models/scaler.pkl'
+PRICE_STORE_DIR = './data/price_store'
+PRICE_INDEX_REFRESH_SECONDS = 300  # seconds between checks for a rebuilt price store
+MODEL_RELOAD = True  # check the model artifacts before each request (disabled by serve.py)
+WORKERS = 2  # worker processes forked by serve.py
+MODEL_RELOAD_SECONDS = 5  # seconds between two checks of the artifacts by the serve.py master
+REGISTRY_DIR = './models/registry'
+SHADOW_MODEL_VERSION = os.environ.get('SHADOW_MODEL_VERSION')  # e.g. 'latest' or '3', unset to disable
+SHADOW_FRACTION = 0.1  # share of the predictions scored again by the candidate model
+SHADOW_MAX_QUEUE = 1000  # predictions waiting for the candidate before new ones are skipped
+SHADOW_LOG_EVERY = 100  # candidate predictions between two agreement summaries in the log
+DRIFT_PROFILE_PATH = './models/training_profile.json'  # saved by get_model
+DRIFT_WINDOW = 1000  # predictions compared at once with the training profile
+DRIFT_MIN_PREDICTIONS = 100  # predictions needed before the inputs get a drift status
 
 # Connection string
 SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_DATABASE_URI')
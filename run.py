@@ -4,6 +4,10 @@ This is the calling script that leverages modules in the src folder
 
 import logging.config
 import argparse
+import copy
+import os
+import shlex
+import typing
 import yaml
 
 from src.createdb    import (create_db,
@@ -13,15 +17,33 @@ from src.clean       import (join_current_price,
                              add_response,
                              filter_df,
                              drop_dups,
-                             impute_missing)
-from src.train       import (train)
+                             impute_missing,
+                             clean_fused,
+                             add_features_parallel)
+from src.train       import (train,
+                             train_incremental,
+                             train_sharded,
+                             retrain_warm,
+                             tune)
+from src.synthetic   import (generate_data)
+from src.labels      import (add_horizon_labels)
+from src.backtest    import (backtest)
+from src.price_store import (build_price_store)
+from src.registry    import (list_versions,
+                             promote)
+from src.schedule    import (ResourceLocks,
+                             run_schedule,
+                             step_resources)
 from src.acquire_new import (get_stock_price,
+                             get_price_history,
                              get_transactions,
                              upload_s3,
-                             download_s3)
+                             download_s3,
+                             write_transfer_report)
 
 # use the config file for logging purposes
 logging.config.fileConfig('config/logging/local.conf')
+logger = logging.getLogger(__name__)
 
 # define the argument parser
 parser = argparse.ArgumentParser(description='Provide different arguments to run pipeline')
@@ -46,6 +68,16 @@ sb_ingest_new.add_argument('--s3_raw',
                            help='Will load data to specified path',
                            default='')
 
+# subparser for refreshing the prices without downloading the transactions again
+sb_acquire_prices = subparsers.add_parser('acquire_prices',
+                                          description='Download the prices of the known '
+                                                      'transactions and rebuild the price store')
+
+# subparser for saving the price history as memory-mapped arrays
+sb_price_store = subparsers.add_parser('price_store',
+                                       description='Build the price store from the '
+                                                   'price history')
+
 # subparser for downloading raw data from S3 and creating cleaned data
 sb_download = subparsers.add_parser('clean',
                                     description='Download & clean data from s3 bucket')               
@@ -54,13 +86,31 @@ sb_download.add_argument('--s3_raw',
                          help='Will load data from specified path',
                          default='')
 
+# subparser for downloading raw data and creating the features in a single pass
+sb_clean_fused = subparsers.add_parser('clean_fused',
+                                       description='Download data from s3 bucket, then clean '
+                                                   'and create the features in one pass')
+sb_clean_fused.add_argument('--s3_raw',
+                            required=False,
+                            help='Will load data from specified path',
+                            default='')
+
 # subparser for creating features from the cleaned data
 sb_add_features = subparsers.add_parser('add_features',
                                     description='Save the final DataFrame with all features')
+sb_add_features.add_argument('--n_jobs', type=int, required=False, default=None,
+                             help='Process hash partitions of the data with this many workers')
+
+# subparser for creating the response at several horizons from the price history
+sb_add_labels = subparsers.add_parser('add_labels',
+                                      description='Save the final DataFrame with the '
+                                                  'response at every horizon')
 
 # subparser for creating the model object and other artifacts
 sb_get_model = subparsers.add_parser('get_model',
                                     description = 'Save all the modeling artifeacts')
+sb_get_model.add_argument('--horizon', type=int, required=False, default=None,
+                          help='Train on the response at this horizon (see add_labels)')
 
 # subparser for obtaining predictions
 sb_get_preds = subparsers.add_parser('get_preds',
@@ -70,53 +120,145 @@ sb_get_preds = subparsers.add_parser('get_preds',
 sb_get_metrics = subparsers.add_parser('get_metrics',
                                     description = 'Save all the performance metrics')
 
-# parse all the arguments
-args = parser.parse_args()
+# subparser for searching the model hyperparameters
+sb_tune = subparsers.add_parser('tune',
+                                description = 'Search the model hyperparameters in parallel')
 
-# obtain the name of the subparser
-sp_used = args.subparser_name
+# subparser for evaluating the model on rolling windows of transaction dates
+sb_backtest = subparsers.add_parser('backtest',
+                                    description = 'Refit and score the model walking '
+                                                  'forward in time')
 
-if __name__ == '__main__':
-    with open(args.config, 'r', encoding='utf8') as f:
-        y_conf = yaml.load(f, Loader=yaml.FullLoader)
+# subparser for training the model on chunks of the cleaned data
+sb_get_model_inc = subparsers.add_parser('get_model_incremental',
+                                    description = 'Save the modeling artifacts without '
+                                                  'loading all the data in memory')
+
+# subparser for training one model per ticker
+sb_get_model_sharded = subparsers.add_parser('get_model_sharded',
+                                    description = 'Save one model per ticker in a single bundle')
+
+# subparser for retraining the saved model from its prior coefficients
+sb_retrain = subparsers.add_parser('retrain',
+                                   description = 'Warm-start the saved model on new transactions')
+
+# subparser for listing the versions of the model registry
+sb_list_models = subparsers.add_parser('list_models',
+                                       description = 'List the registered model versions')
+
+# subparser for serving a registered version
+sb_promote = subparsers.add_parser('promote_model',
+                                   description = 'Copy a registered version to the served paths')
+sb_promote.add_argument('--version', required=False, default='latest',
+                        help='Version number to promote (the latest by default)')
+
+# subparser for running the steps on their configured intervals
+sb_schedule = subparsers.add_parser('schedule',
+                                    description = 'Run the pipeline jobs on their intervals '
+                                                  'until stopped')
+
+# subparser for generating synthetic data without calling the APIs
+sb_synthesize = subparsers.add_parser('synthesize',
+                                      description = 'Save synthetic transaction and price data')
+sb_synthesize.add_argument('--n_rows', type=int, required=False, default=None,
+                           help='Number of transactions (overrides the configuration)')
+
+def run_step(args: argparse.Namespace, y_conf: dict) -> None:
+    '''
+    Runs one step of the pipeline
+
+    Args:
+        args (argparse.Namespace): parsed command line, the subparser name is the step
+        y_conf (dict): configuration of the steps
+    Returns:
+        None
+    '''
+    sp_used = args.subparser_name
 
     if sp_used == 'acquire_new':
         # get data from the APIs
         get_transactions(**y_conf['acquire_new']['get_transactions'])
+        get_price_history(**y_conf['acquire_new']['get_price_history'])
+        build_price_store(**y_conf['price_store'])
         get_stock_price(**y_conf['acquire_new']['get_stock_price'])
 
-        # push the raw data to S3
-        upload_s3(args.s3_raw,**y_conf['acquire_new']['upload_s3']['recent_transactions'])
-        upload_s3(args.s3_raw,**y_conf['acquire_new']['upload_s3']['stockwatcher'])
-        upload_s3(args.s3_raw,**y_conf['acquire_new']['upload_s3']['current_price'])
-        upload_s3(args.s3_raw,**y_conf['acquire_new']['upload_s3']['transact_price'])
+        # push the raw data to S3 and record the bytes sent and the time taken
+        transfers = [upload_s3(args.s3_raw,**y_conf['acquire_new']['upload_s3'][name])
+                     for name in ['recent_transactions', 'stockwatcher',
+                                  'current_price', 'transact_price', 'price_history']]
+        write_transfer_report(transfers, **y_conf['transfer_report'])
+
+    elif sp_used == 'acquire_prices':
+        # refresh the prices of the tickers already downloaded, without the transactions
+        get_price_history(**y_conf['acquire_new']['get_price_history'])
+        build_price_store(**y_conf['price_store'])
+        get_stock_price(**y_conf['acquire_new']['get_stock_price'])
+
+    elif sp_used == 'price_store':
+        # per-ticker closes used by acquire_new and by the app to fill in the price
+        build_price_store(**y_conf['price_store'])
 
     elif sp_used == 'create_table':
         create_db()
 
     elif sp_used == 'ingest_data':
-        add_df(y_conf['create_db']['local_path'])
+        add_df(**y_conf['create_db'])
 
     elif sp_used == 'clean':
-        # download data from S3
-        download_s3(args.s3_raw,**y_conf['clean']['download_s3']['rt'])
-        download_s3(args.s3_raw,**y_conf['clean']['download_s3']['sw'])
-        download_s3(args.s3_raw,**y_conf['clean']['download_s3']['cp'])
-        download_s3(args.s3_raw,**y_conf['clean']['download_s3']['tp'])
+        # download data from S3 (the local files are used if no bucket is given)
+        if args.s3_raw:
+            transfers = [download_s3(args.s3_raw,**y_conf['clean']['download_s3'][name])
+                         for name in ['rt', 'sw', 'cp', 'tp', 'ph']]
+            write_transfer_report(transfers, **y_conf['transfer_report'])
 
         # create the cleaned data
         data = join_transact_price(**y_conf['clean']['transact'])
         join_current_price(data, **y_conf['clean']['current'])
 
+    elif sp_used == 'clean_fused':
+        # download data from S3 (the local files are used if no bucket is given)
+        if args.s3_raw:
+            transfers = [download_s3(args.s3_raw,**y_conf['clean']['download_s3'][name])
+                         for name in ['sw', 'cp', 'tp', 'ph']]
+            write_transfer_report(transfers, **y_conf['transfer_report'])
+
+        # join the prices and create the features without intermediate files
+        clean_fused(**y_conf['clean']['fused'])
+
     elif sp_used == 'add_features':
         # create the features needed for modeling
-        data = add_response(**y_conf['clean']['add_response'])
-        data = filter_df(data, **y_conf['clean']['filter'])
-        data = drop_dups(data)
-        impute_missing(data, **y_conf['clean']['impute_missing'])
+        if args.n_jobs:
+            add_features_parallel(**y_conf['clean']['add_response'],
+                                  **y_conf['clean']['filter'],
+                                  **y_conf['clean']['impute_missing'],
+                                  n_jobs=args.n_jobs)
+        else:
+            data = add_response(**y_conf['clean']['add_response'])
+            data = filter_df(data, **y_conf['clean']['filter'])
+            data = drop_dups(data)
+            impute_missing(data, **y_conf['clean']['impute_missing'])
+
+    elif sp_used == 'add_labels':
+        # label every transaction at each horizon from the local price history
+        add_horizon_labels(**y_conf['clean']['labels'])
 
     elif sp_used == 'get_model':
         # save the model and other required artifacts
+        if args.horizon:
+            # horizon-specific data in, horizon-specific artifacts out (e.g. model_20d.pkl)
+            conf = y_conf['train']['get_model']
+            conf['local_path'] = y_conf['clean']['labels']['save_path'].format(
+                horizon=args.horizon)
+            for key in ['model_path', 'encoder_path', 'scaler_path']:
+                conf[key] = conf[key].replace('.pkl', f'_{args.horizon}d.pkl')
+            if conf.get('registry_dir'):
+                conf['registry_dir'] += f'_{args.horizon}d'
+            if conf.get('results_path'):
+                conf['results_path'] = conf['results_path'].replace('.yaml',
+                                                                    f'_{args.horizon}d.yaml')
+            if conf.get('profile_path'):
+                conf['profile_path'] = conf['profile_path'].replace('.json',
+                                                                    f'_{args.horizon}d.json')
         train(**y_conf['train']['get_model'])
 
     elif sp_used == 'get_preds':
@@ -127,5 +269,80 @@ if __name__ == '__main__':
         # obtain the performance metrics
         train(**y_conf['train']['get_metrics'])
 
+    elif sp_used == 'tune':
+        # search C, penalty and solver with cross-validation
+        tune(**y_conf['train']['tune'])
+
+    elif sp_used == 'backtest':
+        # refit on the trades before each cut-off date and score the trades after it
+        backtest(**y_conf['train']['backtest'])
+
+    elif sp_used == 'get_model_incremental':
+        # stream the cleaned data in chunks and train with partial_fit
+        train_incremental(**y_conf['train']['get_model_incremental'])
+
+    elif sp_used == 'get_model_sharded':
+        # fit the ticker shards in parallel and compare with the single model
+        train_sharded(**y_conf['train']['get_model_sharded'])
+
+    elif sp_used == 'retrain':
+        # continue training the saved model and compare against a cold fit
+        retrain_warm(**y_conf['train']['retrain'])
+
+    elif sp_used == 'list_models':
+        # one line per registered version with its headline metrics
+        for metadata in list_versions(y_conf['train']['promote_model']['registry_dir']):
+            logger.info('v%i created %s, promoted %s: %s %s', metadata['version'],
+                        metadata['created_at'], metadata.get('promoted_at', 'never'),
+                        metadata['model_class'], metadata['metrics'])
+
+    elif sp_used == 'promote_model':
+        # the app reloads the artifacts once they are replaced
+        promote(version=args.version, **y_conf['train']['promote_model'])
+
+    elif sp_used == 'synthesize':
+        # write synthetic raw data where the clean stages expect the S3 downloads
+        if args.n_rows:
+            y_conf['synthetic']['n_rows'] = args.n_rows
+        generate_data(**y_conf['synthetic'])
+
     else:
         parser.print_help()
+
+def scheduled_command(y_conf: dict) -> typing.Callable[[str], None]:
+    '''
+    Parses the commands of the scheduled jobs, so that a mistyped command stops the
+    scheduler when it starts rather than at the first run of its job
+
+    Args:
+        y_conf (dict): configuration with the "schedule" section
+    Returns:
+        run_command (typing.Callable[[str], None]): runs one scheduled command on a copy
+        of the configuration (steps such as get_model --horizon edit it)
+    '''
+    commands = {}
+    for job in y_conf['schedule']['jobs'].values():
+        for command in job['steps']:
+            expanded = os.path.expandvars(command)
+            if '$' in expanded:
+                # an unset variable would only fail when the job runs, e.g. days later
+                logger.error('Set the environment variables of the command "%s"', command)
+                raise ValueError(f'Unset environment variable in "{command}"')
+            commands[command] = parser.parse_args(shlex.split(expanded))
+    return lambda command: run_step(commands[command], copy.deepcopy(y_conf))
+
+if __name__ == '__main__':
+    # parse all the arguments
+    args = parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf8') as f:
+        y_conf = yaml.load(f, Loader=yaml.FullLoader)
+
+    if args.subparser_name == 'schedule':
+        # run the jobs until SIGTERM, with the modules and clients loaded once
+        run_schedule(scheduled_command(y_conf), **y_conf['schedule'])
+    else:
+        # wait for the scheduled jobs writing the same data, and keep them waiting
+        with ResourceLocks(y_conf['schedule'].get('resource_lock_dir'),
+                           step_resources(y_conf['schedule']['jobs'], args.subparser_name)):
+            run_step(args, y_conf)
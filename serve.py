@@ -0,0 +1,167 @@
+"""
+Production entry point of the Flask app. The master process imports app.py once (model,
+encoder, scaler and price index included), binds the port and forks the worker processes,
+which share the loaded artifacts copy-on-write and accept connections on the same socket.
+Database engines and background threads are created again in every worker after the fork.
+
+Run from the root of the repo:
+    python3 serve.py --workers 4
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+import app as web
+
+logger = logging.getLogger(web.app.config["APP_NAME"])
+
+def run_worker(server) -> None:
+    '''
+    Serves requests in a forked worker until SIGTERM, which lets the request in
+    progress finish before the queued predictions are written and the worker exits
+
+    Args:
+        server (werkzeug.serving.BaseWSGIServer): server bound by the master process
+    Returns:
+        None
+    '''
+    # SIGTERM stops the accept loop from another thread (shutdown waits for the loop)
+    signal.signal(signal.SIGTERM,
+                  lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # connections opened by the master must not be shared with the workers
+    with web.app.app_context():
+        web.response_manager.database.engine.dispose(close=False)
+    web.prediction_log.start()
+    web.price_index.start()
+    web.shadow_scorer.start()
+    logger.info("Worker %i serving on port %i", os.getpid(), server.server_port)
+    try:
+        server.serve_forever()
+    finally:
+        web.prediction_log.close()
+        web.price_index.close()
+        web.shadow_scorer.close()
+
+def spawn(server) -> int:
+    '''
+    Forks a worker process
+
+    Args:
+        server (werkzeug.serving.BaseWSGIServer): server bound by the master process
+    Returns:
+        pid (int): process id of the worker
+    '''
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(server)
+        except Exception as error:  # pylint: disable=broad-except
+            logger.error("Worker %i failed: %s", os.getpid(), error)
+            code = 1
+        finally:
+            logging.shutdown()
+            os._exit(code)  # pylint: disable=protected-access
+    return pid
+
+def stop(pids: list, timeout: float = 30.0) -> None:
+    '''
+    Sends SIGTERM to the workers and waits for them to exit
+
+    Args:
+        pids (list): process ids of the workers
+        timeout (float): seconds to wait before the remaining workers are killed
+    Returns:
+        None
+    '''
+    for pid in pids:
+        os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + timeout
+    remaining = set(pids)
+    while remaining and time.monotonic() < deadline:
+        for pid in list(remaining):
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                remaining.discard(pid)
+        time.sleep(0.05)
+    for pid in remaining:
+        logger.warning("Worker %i did not exit in %.0f seconds, killing it", pid, timeout)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+def serve(host: str, port: int, workers: int, reload_seconds: float) -> None:
+    '''
+    Binds the port, forks the workers and supervises them: dead workers are replaced,
+    and when the model artifacts are saved again the master reloads them and replaces
+    the workers one at a time, so that the new artifacts are shared as well
+
+    Args:
+        host (str): address to listen on
+        port (int): port to listen on
+        workers (int): number of worker processes
+        reload_seconds (float): seconds between two checks of the model artifacts
+    Returns:
+        None
+    '''
+    # the workers never reload the model themselves, that would unshare its pages
+    web.app.config["MODEL_RELOAD"] = False
+    server = make_server(host, port, web.app, threaded=False)
+    # the master only supervises: no thread or connection may cross the fork
+    web.prediction_log.close()
+    web.price_index.close()
+    web.shadow_scorer.close()
+    with web.app.app_context():
+        web.response_manager.database.engine.dispose()
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+
+    # objects loaded so far are never collected, so the collector does not touch
+    # (and copy) the pages the workers share
+    gc.freeze()
+    pids = [spawn(server) for _ in range(workers)]
+    logger.info("Master %i forked %i workers on %s:%i", os.getpid(), workers, host, port)
+    next_check = time.monotonic() + reload_seconds
+    while not stopping:
+        time.sleep(0.2)
+        for index, pid in enumerate(pids):
+            if os.waitpid(pid, os.WNOHANG)[0] and not stopping:
+                logger.warning("Worker %i exited, forking a new one", pid)
+                pids[index] = spawn(server)
+        if time.monotonic() >= next_check:
+            next_check = time.monotonic() + reload_seconds
+            try:
+                reloaded = web.reload_artifacts()
+            except Exception as error:  # pylint: disable=broad-except
+                # e.g. a pickle still being written: keep the workers, retry at the next check
+                logger.error("Unable to reload the model artifacts, keeping the current "
+                             "workers: %s", error)
+                reloaded = False
+            if reloaded:
+                logger.info("Model artifacts reloaded, replacing the workers")
+                gc.freeze()
+                for index, pid in enumerate(pids):
+                    pids[index] = spawn(server)
+                    stop([pid])
+    logger.info("Stopping %i workers", len(pids))
+    stop(pids)
+    server.server_close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the app with pre-forked workers")
+    parser.add_argument('--host', default=web.app.config["HOST"])
+    parser.add_argument('--port', type=int, default=web.app.config["PORT"])
+    parser.add_argument('--workers', type=int, default=web.app.config["WORKERS"])
+    parser.add_argument('--reload_seconds', type=float,
+                        default=web.app.config["MODEL_RELOAD_SECONDS"])
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.reload_seconds)
+    sys.exit(0)
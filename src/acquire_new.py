@@ -1,37 +1,172 @@
 """
 This module acquires the data and interacts with S3
 """
+import concurrent.futures
+import functools
+import io
 import typing
 import time
 import logging.config
 import os
 import re
+import zlib
 from datetime import date
 import requests
 import boto3
 import botocore
+import numpy as np
 import pandas as pd
 import yfinance as yf
 
+from src.price_store import PriceStore
+
 logger = logging.getLogger(__name__)
 
 aws_id = os.environ.get('AWS_ACCESS_KEY_ID')  # AWS ID as environment variable
 aws_key = os.environ.get('AWS_SECRET_ACCESS_KEY')  # AWS Key as environment variable
 
-def get_transactions(endpoint:str,
+# columns of the House Stockwatcher API, the layout of stockwatcher.csv
+STOCKWATCHER_COLUMNS = ['disclosure_year', 'disclosure_date', 'transaction_date', 'owner',
+                        'ticker', 'asset_description', 'type', 'amount', 'representative',
+                        'district', 'ptr_link', 'cap_gains_over_200_usd']
+
+# columns identifying a transaction across the feeds
+DEDUP_COLUMNS = ['representative', 'transaction_date', 'owner', 'ticker', 'type', 'amount']
+
+# how each feed differs from the House Stockwatcher layout: renamed columns, date format
+# (None to keep the dates as provided) and values of the owner and type columns
+FEED_SCHEMAS = {'house': {'columns': {}, 'date_format': None, 'values': {}},
+                'senate': {'columns': {'senator': 'representative'},
+                           'date_format': '%m/%d/%Y',
+                           'values': {'owner': {'Self': 'self', 'Spouse': 'spouse',
+                                                'Joint': 'joint', 'Child': 'dependent'},
+                                      'type': {'Purchase': 'purchase',
+                                               'Sale (Full)': 'sale_full',
+                                               'Sale (Partial)': 'sale_partial',
+                                               'Exchange': 'exchange'}}}}
+
+def fetch_feed(endpoint: str,
+               attempts: int = 4,
+               wait: int = 3,
+               wait_multiple: int = 2) -> pd.DataFrame:
+    """
+    Download the transactions of one feed, with exponential backoff between attempts
+    on connection errors and server errors
+
+    Args:
+        endpoint (str): URL of the feed
+        attempts (int): Maximum retry count
+        wait (int): Delay period (start with 3 seconds)
+        wait_multiple (int): Delay increase interval
+    Returns:
+        data (pd.DataFrame): transactions as provided by the feed
+    """
+    # one session per feed, so that the retries reuse the connection
+    with requests.Session() as session:
+        # Run the loop up until the specified limit is reached
+        for i in range(attempts):
+            try:
+                logger.info('Obtaining data from %s', endpoint)
+                response = session.get(endpoint)
+                if response.status_code >= 500:
+                    raise requests.exceptions.ConnectionError(
+                        f'{endpoint} returned {response.status_code}')
+                response.raise_for_status()
+                return pd.DataFrame(response.json())
+            # Try again if more attempts remain
+            except requests.exceptions.ConnectionError as except_1:
+                if i + 1 < attempts:
+                    logger.warning('There was a connection error during attempt %i of %i. '
+                                   'Waiting %i seconds then trying again.',
+                                   i + 1, attempts, wait)
+                    time.sleep(wait)
+                    # Keep increasing the wait times after each attempt
+                    wait = wait * wait_multiple
+                else:
+                    logger.error(
+                        'Connection error. The max number of attempts (%i) have been made to '
+                        'connect to %s. Please check your connection then try again',
+                        attempts, endpoint)
+                    raise except_1
+            # Check for valid url as input
+            except requests.exceptions.MissingSchema as except_2:
+                logger.error('Need to add http:// to beginning of url. Url provided: %s',
+                             endpoint)
+                raise except_2
+    return pd.DataFrame(columns=STOCKWATCHER_COLUMNS)
+
+def normalize_feed(data: pd.DataFrame, schema: str) -> pd.DataFrame:
+    """
+    Convert the transactions of a feed to the House Stockwatcher layout
+
+    Args:
+        data (pd.DataFrame): transactions as provided by the feed
+        schema (str): key of FEED_SCHEMAS describing the feed
+    Returns:
+        data (pd.DataFrame): transactions with the STOCKWATCHER_COLUMNS, dates as
+        YYYY-MM-DD and the owner and type values of the House feed
+    """
+    try:
+        spec = FEED_SCHEMAS[schema]
+    except KeyError as error:
+        logger.error('Unknown feed schema %s, use one of %s', schema, list(FEED_SCHEMAS))
+        raise error
+    data = data.rename(columns=spec['columns'])
+    for col, values in spec['values'].items():
+        if col in data.columns:
+            data[col] = data[col].replace(values)
+    if spec['date_format'] and 'transaction_date' in data.columns:
+        data['transaction_date'] = pd.to_datetime(data['transaction_date'],
+                                                  format=spec['date_format'],
+                                                  errors='coerce').dt.strftime('%Y-%m-%d')
+    data = data.reindex(columns=STOCKWATCHER_COLUMNS)
+    # flags as the True/False text written to the csv file, so that they concatenate
+    # with the empty column of a feed without them
+    flags = data.select_dtypes(bool).columns
+    data[flags] = data[flags].astype(str)
+    return data
+
+def merge_feeds(feeds: typing.List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate the normalized feeds and drop the transactions of a feed that an earlier
+    feed already reported. Repeated rows within a feed are kept, as with a single feed,
+    since a member can report the same trade bracket twice on one day
+
+    Args:
+        feeds (typing.List[pd.DataFrame]): transactions in the House Stockwatcher layout
+    Returns:
+        data (pd.DataFrame): transactions of all the feeds, each kept once
+    """
+    data = pd.concat(feeds, ignore_index=True)
+    if len(feeds) < 2:
+        return data
+    source = np.repeat(np.arange(len(feeds)), [len(feed) for feed in feeds])
+    first_source = pd.Series(source).groupby([data[col] for col in DEDUP_COLUMNS],
+                                             dropna=False).transform('min').to_numpy()
+    duplicated = source != first_source
+    if duplicated.any():
+        logger.info('%i transactions already reported by another feed dropped',
+                    duplicated.sum())
+    return data[~duplicated].reset_index(drop=True)
+
+def get_transactions(endpoint: str,
                      save_path_1: str,
                      save_path_2: str,
                      representatives: typing.List[str],
                      tickers: typing.List[str],
                      attempts: int = 4,
                      wait: int = 3,
-                     wait_multiple: int = 2) -> None:
+                     wait_multiple: int = 2,
+                     sources: typing.List[dict] = None) -> None:
     """
-    Get the Congressional trade data from the House Stockwatcher API.
-    Use exponential backoff while getting the sentiment data from the API.
+    Get the Congressional trade data from the House Stockwatcher API, and from any other
+    feed listed in `sources`. The feeds are downloaded concurrently, converted to the
+    House Stockwatcher layout and merged without the transactions reported twice.
+    Use exponential backoff while getting the data from each feed.
     Convert the downloaded data to a DataFrame and save in specified path.
     Args:
-        endpoint (str): URL to interface with the API
+        endpoint (str): URL to interface with the House Stockwatcher API (used when no
+        sources are given)
         save_path_1 (str): path where the API data will be saved as a DataFrame
         save_path_2 (str): path where the recent_transaction data will be saved as a DataFrame
         representatives (typing.List[str]): List of representatives to keep
@@ -39,80 +174,78 @@ def get_transactions(endpoint:str,
         attempts (int): Maximum retry count
         wait (int): Delay period (start with 3 seconds)
         wait_multiple (int): Delay increase interval
+        sources (typing.List[dict]): feeds to download, each with an "endpoint", a
+        "schema" (key of FEED_SCHEMAS) and optionally its own "representatives" list
+        (null to keep every member of the feed)
     Returns:
         None
     """
-    # Run the loop up until the specified limit is reached
-    for i in range(attempts):
-        try:
-            logger.info('Obtaining data from the Stockwatcher API')
-            url = endpoint
-            response_init = requests.get(url)
-            response = response_init.json()
-            df = pd.DataFrame(response)
-            df = df[df['representative'].isin(representatives)]
-            recent_df = df[['representative','transaction_date',
-                            'ticker','asset_description','amount','type']]
-            df = df[df['ticker'].isin(tickers)]
-            df.to_csv(save_path_1, index=False)
-            recent_df.to_csv(save_path_2, index=False)
-        # Try again if more attempts remain
-        except requests.exceptions.ConnectionError as except_1:
-            if i + 1 < attempts:
-                logger.warning('There was a connection error during attempt %i of %i. '
-                               'Waiting %i seconds then trying again.',
-                               i + 1, attempts, wait)
-                time.sleep(wait)
-                # Keep increasing the wait times after each attempt
-                wait = wait * wait_multiple
-            else:
-                logger.error(
-                    'Connection error. The max number of attempts (%i) have been made to connect.'
-                    'Please check your connection then try again',
-                    attempts)
-                raise except_1
-        # Check for valid url as input
-        except requests.exceptions.MissingSchema as except_2:
-            logger.error('Need to add http:// to beginning of url. Url provided: %s', url)
-            raise except_2
-        else:
-            logger.info('Stockwatcher data saved in %s', save_path_1)
-            logger.info('Recent transaction data saved in %s', save_path_2)
-            break
+    sources = sources or [{'endpoint': endpoint, 'schema': 'house'}]
+    with concurrent.futures.ThreadPoolExecutor(len(sources)) as executor:
+        futures = [executor.submit(fetch_feed, source['endpoint'], attempts, wait,
+                                   wait_multiple) for source in sources]
+        feeds = []
+        for source, future in zip(sources, futures):
+            feed = normalize_feed(future.result(), source['schema'])
+            keep = source.get('representatives', representatives)
+            if keep is not None:
+                feed = feed[feed['representative'].isin(keep)]
+            logger.info('%i transactions kept from %s', len(feed), source['endpoint'])
+            feeds.append(feed)
+    df = merge_feeds(feeds)
+    recent_df = df[['representative','transaction_date',
+                    'ticker','asset_description','amount','type']]
+    df = df[df['ticker'].isin(tickers)]
+    df.to_csv(save_path_1, index=False)
+    recent_df.to_csv(save_path_2, index=False)
+    logger.info('Stockwatcher data saved in %s', save_path_1)
+    logger.info('Recent transaction data saved in %s', save_path_2)
 
 def get_stock_price(input_path:str,
                     output_path_1:str,
                     output_path_2:str,
-                    tickers: typing.List[str]) -> None:
+                    tickers: typing.List[str],
+                    store_dir: str = None) -> None:
     """
     Obtain the stock price data from Yahoo finance API by looping over
     the DataFrame obtained from Stockwatcher API and obtaining the transaction
-    dates
+    dates. When a price store is given (see get_price_history and
+    price_store.build_price_store), the transaction-day prices are read from it
+    in a single lookup instead of one API call per transaction date
 
     Args:
         input_path (str): path to Stockwatcher API data
         output_path_1 (str): path to save historical stock price data
         output_path_2 (str): path to save current stock price data
         tickers (typing.List[str]): list of tickers in the Stockwatcher data
+        store_dir (str): folder of the price store with the daily closes
     Returns:
         None
     """
     df = pd.read_csv(input_path)
     purch_dates = df.groupby(['transaction_date', 'ticker']).size().reset_index(name='freq')
-    purch_dates['trans_date'] = pd.to_datetime(purch_dates['transaction_date'])
-    purch_dates['next_date'] = purch_dates['trans_date'] + pd.Timedelta(days=1)
-    day_price = pd.DataFrame(columns=['ticker', 'date', 'price'])
-    logger.info('Obtaining data from YFinance API. This may take a few minutes')
-
-    for i in range(len(purch_dates)):
-        ticker = yf.Ticker(purch_dates.loc[i,'ticker'])
-
-        val = ticker.history(start = purch_dates.loc[i,'trans_date'],
-                             end   = purch_dates.loc[i,'next_date'])
-        row_1 = pd.DataFrame({'ticker':[purch_dates.loc[i,'ticker']],
-                            'date':[purch_dates.loc[i,'transaction_date']],
-                            'price':[val['Close'].values[0]]})
-        day_price = pd.concat([day_price,row_1], axis = 0)
+    if store_dir:
+        store = PriceStore(store_dir)
+        day_price = pd.DataFrame({'ticker': purch_dates['ticker'],
+                                  'date': purch_dates['transaction_date'],
+                                  'price': store.lookup(purch_dates['ticker'],
+                                                        purch_dates['transaction_date'])})
+        logger.info('Transaction-day prices read from the price store in %s', store_dir)
+    else:
+        purch_dates['trans_date'] = pd.to_datetime(purch_dates['transaction_date'])
+        purch_dates['next_date'] = purch_dates['trans_date'] + pd.Timedelta(days=1)
+        day_price = pd.DataFrame(columns=['ticker', 'date', 'price'])
+        logger.info('Obtaining data from YFinance API. This may take a few minutes')
+
+        for i in range(len(purch_dates)):
+            ticker = yf.Ticker(purch_dates.loc[i,'ticker'])
+
+            val = ticker.history(start = purch_dates.loc[i,'trans_date'],
+                                 end   = purch_dates.loc[i,'next_date'])
+            row_1 = pd.DataFrame({'ticker':[purch_dates.loc[i,'ticker']],
+                                'date':[purch_dates.loc[i,'transaction_date']],
+                                'price':[val['Close'].values[0]]})
+            day_price = pd.concat([day_price,row_1], axis = 0)
 
     current_price = pd.DataFrame(columns=['ticker', 'date','price'])
     for i in tickers:
@@ -130,6 +263,37 @@ def get_stock_price(input_path:str,
     logger.info('YFinance historical stock-price data saved to %s', output_path_1)
     logger.info('YFinance current stock-price data saved to %s', output_path_2)
 
+def get_price_history(input_path: str,
+                      output_path: str,
+                      tickers: typing.List[str],
+                      end: str = None) -> None:
+    """
+    Obtain the full daily closing-price history of every ticker from the Yahoo finance
+    API, with a single request per ticker covering the first transaction date up to
+    `end`, so that the response can be computed at any horizon without further calls
+
+    Args:
+        input_path (str): path to Stockwatcher API data
+        output_path (str): path to save the daily closing prices
+        tickers (typing.List[str]): list of tickers in the Stockwatcher data
+        end (str): last date of the history (today when not provided)
+    Returns:
+        None
+    """
+    df = pd.read_csv(input_path)
+    start = pd.to_datetime(df['transaction_date']).min().strftime('%Y-%m-%d')
+    end = end or date.today().strftime('%Y-%m-%d')
+    history = []
+    logger.info('Obtaining price history from YFinance API for %i tickers', len(tickers))
+    for i in tickers:
+        val = yf.Ticker(i).history(start=start, end=end)
+        history.append(pd.DataFrame({'ticker': i,
+                                     'date': val.index.strftime('%Y-%m-%d'),
+                                     'price': val['Close'].values}))
+    history = pd.concat(history, axis=0).dropna()
+    history.to_csv(output_path, index=False)
+    logger.info('YFinance price history (%s to %s) saved to %s', start, end, output_path)
+
 def parse_s3(s3path:str)->typing.Tuple[str,str]:
     '''
     Parses string to extract bucket name and s3 path
@@ -145,65 +309,237 @@ def parse_s3(s3path:str)->typing.Tuple[str,str]:
     s3path = matched.group(2)
     return s3bucket, s3path
 
-def upload_s3(s3path: str, file_name:str, local_path:str) -> None:
+@functools.lru_cache(maxsize=1)
+def get_s3_client():
+    '''
+    Creates the S3 client once per process, so that a long-running process (e.g. the
+    scheduler of run.py) keeps its connections between uploads
+    Returns:
+        client (botocore.client.S3): S3 client
+    '''
+    session = boto3.Session(aws_access_key_id=aws_id,
+                            aws_secret_access_key=aws_key)
+    return session.client('s3')
+
+# file extension and Content-Encoding of each compression of the S3 objects
+COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+# bytes read from the local file or from S3 at once while streaming
+CHUNK_SIZE = 1 << 20
+
+def make_codec(compression: str) -> typing.Tuple[typing.Callable, typing.Callable]:
+    '''
+    Returns the factories of the streaming compressor and decompressor of a compression
+    (zstd needs the optional zstandard package)
+
+    Args:
+        compression (str): "gzip" or "zstd"
+    Returns:
+        compressor (typing.Callable): returns an object with compress() and flush()
+        decompressor (typing.Callable): returns an object with decompress()
     '''
-    Uploads an input file to the specified S3 Bucket
+    if compression == 'gzip':
+        return (lambda: zlib.compressobj(6, zlib.DEFLATED, 31),
+                lambda: zlib.decompressobj(31))
+    if compression == 'zstd':
+        try:
+            import zstandard  # pylint: disable=import-outside-toplevel
+        except ImportError as error:
+            logger.error('zstd compression needs the zstandard package (pip install zstandard)')
+            raise error
+        return (lambda: zstandard.ZstdCompressor(level=3).compressobj(),
+                lambda: zstandard.ZstdDecompressor().decompressobj())
+    raise ValueError(f'Unknown compression {compression}, use one of {list(COMPRESSIONS)}')
+
+class CompressedReader(io.RawIOBase):
+    '''Class that compresses a file while it is read, so that the S3 client uploads the
+    compressed bytes in parts without the compressed file ever being held in memory'''
+
+    def __init__(self, source, compression):
+        '''Initialize class for CompressedReader
+        Args:
+            self
+            source (typing.BinaryIO): file opened for reading in binary mode
+            compression (str): "gzip" or "zstd"
+        Returns:
+            None
+        '''
+        super().__init__()
+        self.source = source
+        self.compressor = make_codec(compression)[0]()
+        self.buffer = bytearray()
+        self.finished = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def readable(self):
+        '''The reader only supports reading'''
+        return True
+
+    def readinto(self, buffer):
+        '''Fills the buffer with compressed bytes, compressing the next chunks of the
+        source as needed
+        Args:
+            self
+            buffer (bytearray): buffer to fill
+        Returns:
+            size (int): number of bytes written to the buffer (0 at the end)
+        '''
+        while len(self.buffer) < len(buffer) and not self.finished:
+            chunk = self.source.read(CHUNK_SIZE)
+            if chunk:
+                self.bytes_in += len(chunk)
+                self.buffer += self.compressor.compress(chunk)
+            else:
+                self.buffer += self.compressor.flush()
+                self.finished = True
+        size = min(len(buffer), len(self.buffer))
+        buffer[:size] = self.buffer[:size]
+        del self.buffer[:size]
+        self.bytes_out += size
+        return size
+
+def object_path(s3path: str, file_name: str, compression: str = None) -> str:
+    '''
+    Returns the S3 path of a pipeline file under data_new/
+
+    Args:
+        s3path (str): the path to the user's AWS S3 bucket
+        file_name (str): name of the pipeline file (e.g. stockwatcher)
+        compression (str): "gzip", "zstd" or None
+    Returns:
+        s3path (str): full S3 path of the object
+    '''
+    if file_name in ('stockwatcher', 'transact_price', 'current_price', 'recent_transactions',
+                     'price_history'):
+        s3path = s3path + f'/data_new/{file_name}.csv'
+    return s3path + COMPRESSIONS.get(compression, '')
+
+def upload_s3(s3path: str,
+              file_name:str,
+              local_path:str,
+              compression: str = None) -> typing.Optional[dict]:
+    '''
+    Uploads an input file to the specified S3 Bucket, compressed while it is read when a
+    compression is given. The object records its Content-Type, Content-Encoding and
+    uncompressed size
     Args:
         local_path (str): the filepath location of file that will be uploaded
         file_name (str): the name of the input file being uploaded to S3
         s3path (str): the path to the user's AWS S3 bucket
+        compression (str): "gzip", "zstd" or None to upload the file as it is
     Returns:
-        None
+        transfer (dict): file name, direction, compression, bytes of the file, bytes
+        sent and seconds taken (None if the upload failed)
     '''
-    session = boto3.Session(aws_access_key_id=aws_id,
-                            aws_secret_access_key=aws_key)
-    client = session.client('s3')
-    if file_name == 'stockwatcher':
-        s3path = s3path + '/data_new/stockwatcher.csv'
-    elif file_name == 'transact_price':
-        s3path = s3path + '/data_new/transact_price.csv'
-    elif file_name == 'current_price':
-        s3path = s3path + '/data_new/current_price.csv'
-    elif file_name == 'recent_transactions':
-        s3path = s3path + '/data_new/recent_transactions.csv'
+    client = get_s3_client()
+    s3path = object_path(s3path, file_name, compression)
     s3bucket, s3_just_path = parse_s3(s3path)
+    size = os.path.getsize(local_path)
+    extra_args = {'ContentType': 'text/csv', 'Metadata': {'uncompressed-bytes': str(size)}}
+    if compression:
+        extra_args['ContentEncoding'] = compression
 
+    start = time.perf_counter()
     try:
-        client.upload_file(local_path, s3bucket, s3_just_path)
+        with open(local_path, 'rb') as source:
+            body = CompressedReader(source, compression) if compression else source
+            client.upload_fileobj(body, s3bucket, s3_just_path, ExtraArgs=extra_args)
     except botocore.exceptions.NoCredentialsError:
         logger.error('Please provide AWS_ACCESS_KEY_ID & AWS_SECRET_ACCESS_KEY env vars.')
-    except boto3.exceptions.S3UploadFailedError:
+    except (boto3.exceptions.S3UploadFailedError, botocore.exceptions.ClientError):
         logger.error('Please provide a valid S3 bucket name.')
     else:
-        logger.info('Data successfully uploaded from %s to %s', local_path, s3path)
-
+        transfer = {'file_name': file_name, 'direction': 'upload', 'compression': compression,
+                    'bytes': size, 'bytes_transferred': body.bytes_out if compression else size,
+                    'seconds': round(time.perf_counter() - start, 3)}
+        logger.info('Data successfully uploaded from %s to %s (%i of %i bytes sent in %.2fs)',
+                    local_path, s3path, transfer['bytes_transferred'], size, transfer['seconds'])
+        return transfer
+    return None
 
 def download_s3(s3path:str,
                 file_name:str,
                 local_path:str,
-                sep:str) -> None:
-    '''Downloads file from S3
+                sep:str,
+                compression: str = None) -> typing.Optional[dict]:
+    '''Downloads file from S3. A compressed object is decompressed chunk by chunk
+    into a temporary file, which replaces the local file once the whole stream was
+    read, so a truncated object never overwrites the last good file; when it does not
+    exist (e.g. uploaded before compression was enabled), the uncompressed object is
+    downloaded instead
     Args:
         s3path (str): the path where the file will be located on s3
         file_name (str): the name of the file to be downloaded from s3
         local_path (str): the filepath location of file that will be downloaded to
         sep (str): separator for downloaded file
+        compression (str): "gzip", "zstd" or None
     Returns:
-        None
+        transfer (dict): file name, direction, compression, bytes of the file, bytes
+        received and seconds taken (None if the download failed)
     '''
-    if file_name == 'stockwatcher':
-        s3path = s3path + '/data_new/stockwatcher.csv'
-    elif file_name == 'transact_price':
-        s3path = s3path + '/data_new/transact_price.csv'
-    elif file_name == 'current_price':
-        s3path = s3path + '/data_new/current_price.csv'
-    elif file_name == 'recent_transactions':
-        s3path = s3path + '/data_new/recent_transactions.csv'
-
+    start = time.perf_counter()
+    # the last good file stays in place until the new one is complete
+    tmp_path = local_path + '.tmp'
     try:
-        df = pd.read_csv(s3path,sep=sep)
+        if compression:
+            source = object_path(s3path, file_name, compression)
+            s3bucket, s3_just_path = parse_s3(source)
+            decompressor = make_codec(compression)[1]()
+            received = 0
+            body = get_s3_client().get_object(Bucket=s3bucket, Key=s3_just_path)['Body']
+            with open(tmp_path, 'wb') as target:
+                for chunk in body.iter_chunks(CHUNK_SIZE):
+                    received += len(chunk)
+                    target.write(decompressor.decompress(chunk))
+                target.write(decompressor.flush())
+            if not decompressor.eof:
+                logger.error('%s ends before the end of its %s stream', source, compression)
+                raise ValueError(f'{source} is truncated or corrupt')
+        else:
+            source = object_path(s3path, file_name)
+            df = pd.read_csv(source,sep=sep)
+            df.to_csv(tmp_path, sep=sep, index=False)
+            received = os.path.getsize(tmp_path)
+        os.replace(tmp_path, local_path)
     except botocore.exceptions.NoCredentialsError:
         logger.error('Please provide AWS_ACCESS_KEY_ID & AWS_SECRET_ACCESS_KEY env vars.')
-    else:
-        df.to_csv(local_path, sep=sep, index=False)
-        logger.info('Data downloaded from %s to %s', s3path, local_path)
+        return None
+    except botocore.exceptions.ClientError as error:
+        if not compression or \
+                error.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+            raise error
+        logger.warning('No %s object for %s, downloading the uncompressed file',
+                       compression, file_name)
+        return download_s3(s3path, file_name, local_path, sep)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    transfer = {'file_name': file_name, 'direction': 'download', 'compression': compression,
+                'bytes': os.path.getsize(local_path), 'bytes_transferred': received,
+                'seconds': round(time.perf_counter() - start, 3)}
+    logger.info('Data downloaded from %s to %s (%i bytes received for %i in %.2fs)',
+                source, local_path, received, transfer['bytes'], transfer['seconds'])
+    return transfer
+
+def write_transfer_report(transfers: typing.List[typing.Optional[dict]],
+                          report_path: str) -> None:
+    '''
+    Appends the transfers to a csv report, with the compression ratio of each file
+
+    Args:
+        transfers (typing.List[typing.Optional[dict]]): values returned by upload_s3 and
+        download_s3 (the failed transfers are left out)
+        report_path (str): path to the csv report
+    Returns:
+        None
+    '''
+    report = pd.DataFrame([transfer for transfer in transfers if transfer])
+    if report.empty or not report_path:
+        return
+    report.insert(0, 'time', pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S'))
+    report['ratio'] = (report['bytes'] / report['bytes_transferred'].clip(lower=1)).round(2)
+    report.to_csv(report_path, mode='a', index=False, header=not os.path.exists(report_path))
+    logger.info('%i transfers: %i bytes sent or received for %i bytes of files in %.2fs, '
+                'report appended to %s', len(report), report['bytes_transferred'].sum(),
+                report['bytes'].sum(), report['seconds'].sum(), report_path)
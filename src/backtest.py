@@ -0,0 +1,205 @@
+"""
+This module evaluates the classifier with a walk-forward backtest: the model is
+refitted on the trades before each cut-off date and scored on the trades after it
+"""
+import logging
+import time
+import typing
+import warnings
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import roc_auc_score
+from sklearn.metrics import log_loss
+
+from src.clean import add_response, drop_dups, impute_missing
+from src.train import encode_features, read_tuned_params, update_results, use_numeric_amount
+
+logger = logging.getLogger(__name__)
+
+# columns of the metrics returned by backtest, one row per window
+RESULT_COLUMNS = ['Train Start', 'Test Start', 'Test End', 'Train Rows', 'Test Rows', 'AUC',
+                  'Log Loss', 'Seconds']
+
+def make_windows(dates: np.ndarray,
+                 train_days: int,
+                 test_days: int,
+                 step_days: int,
+                 expanding: bool = False) -> typing.List[typing.Tuple[int, int, int]]:
+    '''
+    Splits sorted transaction dates into walk-forward windows. Each window trains on
+    the `train_days` before a cut-off date (or on everything before it if `expanding`)
+    and tests on the `test_days` after it; the cut-off moves by `step_days`
+
+    Args:
+        dates (np.ndarray): sorted datetime64 transaction dates
+        train_days (int): length of the training period in days
+        test_days (int): length of the test period in days
+        step_days (int): days between two consecutive cut-off dates
+        expanding (bool): train on all the trades before the cut-off date
+    Returns:
+        windows (typing.List[typing.Tuple[int, int, int]]): (train start, cut-off, test end)
+        row positions, so that rows [start, cut-off) train and rows [cut-off, end) test
+    '''
+    windows = []
+    if len(dates) == 0:
+        logger.error("No transaction dates to split into windows")
+        return windows
+    cutoff = dates[0] + np.timedelta64(train_days, 'D')
+    while cutoff <= dates[-1]:
+        start = dates[0] if expanding else cutoff - np.timedelta64(train_days, 'D')
+        windows.append((int(np.searchsorted(dates, start)),
+                        int(np.searchsorted(dates, cutoff)),
+                        int(np.searchsorted(dates, cutoff + np.timedelta64(test_days, 'D')))))
+        cutoff += np.timedelta64(step_days, 'D')
+    return windows
+
+def evaluate_window(features: np.ndarray,
+                    response: np.ndarray,
+                    sums: np.ndarray,
+                    squares: np.ndarray,
+                    window: typing.Tuple[int, int, int],
+                    random_state: int,
+                    max_iter: int,
+                    model_params: dict = None) -> dict:
+    '''
+    Fits the Logistic Regression model on the training rows of one window and scores
+    the test rows. The standard scaling of the window comes from the prefix sums of the
+    features, so no scaler has to be fitted on the window
+
+    Args:
+        features (np.ndarray): encoded features of every trade, sorted by date
+        response (np.ndarray): response of every trade, sorted by date
+        sums (np.ndarray): prefix sums of the features (one more row than features)
+        squares (np.ndarray): prefix sums of the squared features
+        window (typing.Tuple[int, int, int]): output of make_windows for one window
+        random_state (int): random state for training model
+        max_iter (int): maximum number of iterations taken for the solvers to converge
+        model_params (dict): extra Logistic Regression arguments (e.g. from `tune`)
+    Returns:
+        result (dict): numbers of rows, AUC, log loss and fit time of the window
+    '''
+    start, cutoff, end = window
+    n_rows = cutoff - start
+    mean = (sums[cutoff] - sums[start]) / n_rows
+    scale = np.sqrt(np.maximum((squares[cutoff] - squares[start]) / n_rows - mean ** 2, 0))
+    scale[scale < 1e-8] = 1.0  # constant features are left unscaled, as in StandardScaler
+
+    timer = time.perf_counter()
+    model = LogisticRegression(max_iter=max_iter, random_state=random_state,
+                               **(model_params or {}))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model.fit((features[start:cutoff] - mean) / scale, response[start:cutoff])
+    proba = model.predict_proba((features[cutoff:end] - mean) / scale)
+    y_test = response[cutoff:end]
+    return {'Train Rows': n_rows,
+            'Test Rows': end - cutoff,
+            'AUC': float(roc_auc_score(y_test, proba[:, 1])) if len(set(y_test)) > 1 else None,
+            'Log Loss': float(log_loss(y_test, proba, labels=model.classes_)),
+            'Seconds': round(time.perf_counter() - timer, 4)}
+
+def backtest(local_path: str,
+             categ: typing.List[str],
+             response: str,
+             results_path: str,
+             output_path: str,
+             train_days: int,
+             test_days: int,
+             step_days: int,
+             random_state: int,
+             max_iter: int,
+             expanding: bool = False,
+             min_train_rows: int = 100,
+             n_jobs: int = -1,
+             model_params: dict = None,
+             amount_numeric: bool = False,
+             tuned_params_path: str = None) -> pd.core.frame.DataFrame:
+    '''
+    Runs a walk-forward backtest on the cleaned data. The trades are sorted by
+    transaction date and encoded once with the categories of the whole period, the
+    prefix sums used for scaling are computed once, and the windows are fitted in
+    parallel across all CPU cores. The per-window metrics and the wall time get
+    written to the results yaml
+
+    Args:
+        local_path (str): path to cleaned data (with the transaction_date column)
+        categ (typing.List[str]): list of column names representing categorical features
+        response (str): column name of response variable
+        results_path (str): path to the yaml file with model evaluation results
+        output_path (str): path to save the metrics of every window as csv
+        train_days (int): length of the training period in days
+        test_days (int): length of the test period in days
+        step_days (int): days between two consecutive cut-off dates
+        random_state (int): random state for training model
+        max_iter (int): maximum number of iterations taken for the solvers to converge
+        expanding (bool): train on all the trades before each cut-off date
+        min_train_rows (int): windows with fewer training rows (or one class) are skipped
+        n_jobs (int): number of worker processes (-1 uses all CPU cores)
+        model_params (dict): extra Logistic Regression arguments (e.g. from `tune`)
+        amount_numeric (bool): use the numeric bounds of the amount brackets instead
+        of One-Hot encoding them
+        tuned_params_path (str): path to the results yaml written by `tune`, whose best
+        configuration is added to model_params
+    Returns:
+        results (pd.core.frame.DataFrame): dates and metrics of every window
+    '''
+    if tuned_params_path:
+        model_params = {**(model_params or {}), **read_tuned_params(tuned_params_path)}
+    data = add_response(local_path)
+    data = data[categ + ['trans_price', 'transaction_date', response]]
+    data = impute_missing(drop_dups(data).copy())
+    data['transaction_date'] = pd.to_datetime(data['transaction_date'])
+    data = data.sort_values('transaction_date', kind='stable', ignore_index=True)
+    dates = data.pop('transaction_date').to_numpy()
+    if data.empty:
+        logger.error("No trades to backtest in %s", local_path)
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    if amount_numeric:
+        data, categ = use_numeric_amount(data, categ)
+
+    _, features, response = encode_features(data, categ, response)
+    features = features.to_numpy(float)
+    sums = np.concatenate([np.zeros((1, features.shape[1])), np.cumsum(features, axis=0)])
+    squares = np.concatenate([np.zeros((1, features.shape[1])),
+                              np.cumsum(features ** 2, axis=0)])
+
+    windows = [window for window in make_windows(dates, train_days, test_days,
+                                                 step_days, expanding)
+               if window[1] - window[0] >= min_train_rows and window[2] > window[1]
+               and len(set(response[window[0]:window[1]])) > 1]
+    if not windows:
+        logger.error("No window of %i trades has %i training rows and both classes",
+                     len(data), min_train_rows)
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    logger.info("Backtesting %i windows on %i trades", len(windows), len(data))
+
+    start = time.perf_counter()
+    scores = Parallel(n_jobs=n_jobs)(delayed(evaluate_window)(features, response, sums,
+                                                              squares, window, random_state,
+                                                              max_iter, model_params)
+                                     for window in windows)
+    wall_time = round(time.perf_counter() - start, 4)
+
+    results = pd.DataFrame(scores, columns=['Train Rows', 'Test Rows', 'AUC',
+                                            'Log Loss', 'Seconds'])
+    results.insert(0, 'Train Start', [str(dates[w[0]])[:10] for w in windows])
+    results.insert(1, 'Test Start', [str(dates[w[1]])[:10] for w in windows])
+    results.insert(2, 'Test End', [str(dates[w[2] - 1])[:10] for w in windows])
+    logger.info("Backtest of %i windows took %.2f seconds (mean AUC %.4f)",
+                len(results), wall_time, results['AUC'].mean())
+
+    if output_path:
+        results.to_csv(output_path, index=False)
+        logger.info("Backtest windows saved to: %s", output_path)
+    if results_path:
+        update_results(results_path,
+                       {'Backtest': {'Windows': results.replace({np.nan: None})
+                                                       .to_dict(orient='records'),
+                                     'Mean AUC': float(results['AUC'].mean()),
+                                     'Mean Log Loss': float(results['Log Loss'].mean()),
+                                     'Fit Seconds': float(results['Seconds'].sum()),
+                                     'Wall Seconds': wall_time}})
+        logger.info("Backtest results written to: %s", results_path)
+    return results
@@ -1,13 +1,21 @@
 """
 This module processes and cleans the raw data to prepare it for modeling
 """
+import functools
 import logging
+import os
 import typing
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 
+from src.vocab import save_encoded
+
 logger = logging.getLogger(__name__)
 
+# numeric columns created from the amount brackets
+AMOUNT_COLUMNS = ['amount_lower', 'amount_upper', 'amount_mid']
+
 # function to join the transaction data with historical stock price data
 def join_transact_price(input_path_1:str,
                         input_path_2:str) -> pd.core.frame.DataFrame:
@@ -170,7 +178,8 @@ def impute_missing(data:pd.core.frame.DataFrame,
                    save_path:str = None,
                    column:str = 'owner',
                    replacement:str = 'undisclosed',
-                   missing_val:str = '--') -> pd.core.frame.DataFrame:
+                   missing_val:str = '--',
+                   vocab_path:str = None) -> pd.core.frame.DataFrame:
     """
     This function identifies all rows with null values or other placeholders
     that indicate missing data. Next, the identified rows are imputed with
@@ -183,6 +192,8 @@ def impute_missing(data:pd.core.frame.DataFrame,
         column (str): column name of feature containing missing values
         replacement (str): value to be used in place of missing data
         missing_val (str): placeholder that indicates missing data
+        vocab_path (str): path to the vocabularies, to save the string columns as
+        integer codes (see src/vocab.py)
 
     Returns:
         data (pd.core.frame.DataFrame) : output DataFrame with imputed values
@@ -194,7 +205,278 @@ def impute_missing(data:pd.core.frame.DataFrame,
     except KeyError:
         logger.warning('The column to be imputed does not exist. Using the original DataFrame')
 
-    if save_path:
+    if save_path and vocab_path:
+        save_encoded(data, save_path, vocab_path)
+    elif save_path:
         data.to_csv(save_path, index = False)
         logger.info('DataFrame with features saved to: %s', save_path)
     return data
+
+# function to parse the disclosed amount brackets into numbers
+def parse_amount(amounts: pd.Series) -> pd.core.frame.DataFrame:
+    """
+    This function turns the amount brackets (e.g. "$1,001 - $15,000") into their
+    lower bound, upper bound and midpoint in dollars. Only the distinct brackets are
+    parsed, then the numbers are spread to every row through the bracket codes.
+    Brackets without an upper bound (e.g. "$1,001 -") use the lower bound for both
+
+    Args:
+        amounts (pd.Series): amount brackets as strings or categories
+    Returns:
+        bounds (pd.core.frame.DataFrame): amount_lower, amount_upper and amount_mid
+        columns with the index of the amounts (NaN where the amount is missing)
+    """
+    codes, brackets = pd.factorize(amounts)
+    numbers = pd.Series(brackets.astype(str)).str.replace(',', '', regex=False)\
+                .str.extract(r'(\d+)(?:\D+(\d+))?').astype(float)
+    unparsed = numbers[0].isna()
+    if unparsed.any():
+        logger.error('Amount brackets could not be parsed: %s', list(brackets[unparsed]))
+        raise ValueError(f'Unexpected amount brackets: {list(brackets[unparsed])}')
+    numbers[1] = numbers[1].fillna(numbers[0])
+    numbers[2] = (numbers[0] + numbers[1]) / 2
+    # one extra row of NaN for the missing amounts (code -1)
+    values = np.vstack([numbers.to_numpy(), np.full((1, 3), np.nan)])
+    return pd.DataFrame(values[codes], index=amounts.index, columns=AMOUNT_COLUMNS)
+
+# function to replace the amount brackets by their numeric bounds
+def split_amount(data: pd.core.frame.DataFrame,
+                 column: str = 'amount') -> pd.core.frame.DataFrame:
+    """
+    This function replaces the amount column by the numeric columns of
+    parse_amount, placed where the amount column was
+
+    Args:
+        data (pd.core.frame.DataFrame): DataFrame with the amount brackets
+        column (str): column name of the amount brackets
+    Returns:
+        new_df (pd.core.frame.DataFrame): DataFrame with the numeric amount columns
+    """
+    try:
+        position = data.columns.get_loc(column)
+    except KeyError as error:
+        logger.error('The column with the amount brackets does not exist: %s', error)
+        raise error
+    bounds = parse_amount(data[column])
+    return pd.concat([data.iloc[:, :position], bounds, data.iloc[:, position + 1:]], axis=1)
+
+@functools.lru_cache(maxsize=64)
+def amount_bounds(amount: str) -> typing.Tuple[float, float, float]:
+    """
+    This function parses a single amount bracket, e.g. the one entered in the app.
+    The few distinct brackets are cached, so repeated requests skip the parsing
+
+    Args:
+        amount (str): amount bracket
+    Returns:
+        bounds (typing.Tuple[float, float, float]): lower bound, upper bound and midpoint
+    """
+    return tuple(parse_amount(pd.Series([amount])).iloc[0])
+
+# function to run the join and feature steps in a single fused pass
+def clean_fused(input_path_1: str,
+                input_path_2: str,
+                input_path_3: str,
+                columns: typing.List[str],
+                save_path: str = None,
+                column: str = 'owner',
+                replacement: str = 'undisclosed',
+                missing_val: str = '--',
+                categ: typing.List[str] = ('ticker', 'representative', 'owner'),
+                vocab_path: str = None) -> pd.core.frame.DataFrame:
+    """
+    This function produces the same output as running join_transact_price,
+    join_current_price, add_response, filter_df, drop_dups and impute_missing
+    one after the other, but reads each input once, keeps the string columns
+    as categoricals, replaces both merges by index-aligned price lookups and
+    builds the output frame with a single copy (no intermediate CSV)
+
+    Note that a (ticker, date) pair with several distinct prices keeps only the
+    first price here, whereas the merge would have duplicated the transaction.
+    Columns to be excluded that are not in the data are simply ignored
+
+    Args:
+        input_path_1 (str): path to the transaction data
+        input_path_2 (str): path to the transaction-day stock price data
+        input_path_3 (str): path to the current-day stock price data
+        columns (typing.List[str]): the list of column names to be excluded
+        save_path (str): path to save the cleaned DataFrame
+        column (str): column name of feature containing missing values
+        replacement (str): value to be used in place of missing data
+        missing_val (str): placeholder that indicates missing data
+        categ (typing.List[str]): columns to be read as categorical dtype
+        vocab_path (str): path to the vocabularies, to save the string columns as
+        integer codes (see src/vocab.py)
+    Returns:
+        data (pd.core.frame.DataFrame): cleaned DataFrame with the response
+    """
+    try:
+        data = pd.read_csv(input_path_1, dtype={col: 'category' for col in categ})
+        transact_price = pd.read_csv(input_path_2)
+        current_price = pd.read_csv(input_path_3)
+    except FileNotFoundError as error:
+        logger.error('File not found')
+        logger.debug('Check path in the configuration file')
+        raise error
+
+    try:
+        transact_price = transact_price.loc[transact_price['price'].notna(),
+                                            ['ticker', 'date', 'price']]
+        current_price = current_price.loc[current_price['price'].notna(),
+                                          ['ticker', 'price']]
+    except KeyError as error:
+        logger.error('The stock-price data does not contain the required columns: %s', error)
+        raise error
+
+    # look up both prices for every transaction through the price indexes
+    transact_price = transact_price.drop_duplicates(['ticker', 'date'])\
+                                   .set_index(['ticker', 'date'])['price']
+    current_price = current_price.drop_duplicates('ticker', keep='last')\
+                                 .set_index('ticker')['price']
+    trans = transact_price.reindex(pd.MultiIndex.from_arrays([data['ticker'],
+                                                              data['transaction_date']]))\
+                          .to_numpy()
+    current = current_price.reindex(data['ticker']).to_numpy()
+    keep = ~(np.isnan(trans) | np.isnan(current))
+
+    missing = [col for col in columns if col not in data.columns]
+    if missing:
+        logger.debug('Columns not in the DataFrame, not excluded: %s', missing)
+    kept_columns = [col for col in data.columns if col not in columns]
+
+    # the merges return the rows grouped by ticker, then by (ticker, date), in order
+    # of first appearance; a stable sort on the factorized keys gives the same order
+    rows = np.flatnonzero(keep)
+    ticker_codes = pd.factorize(data['ticker'].to_numpy()[rows])[0]
+    date_codes = pd.factorize(data['transaction_date'].to_numpy()[rows])[0]
+    pair_codes = pd.factorize(ticker_codes.astype(np.int64) * (date_codes.max(initial=0) + 1)
+                              + date_codes)[0]
+    rows = rows[np.lexsort((pair_codes, ticker_codes))]
+
+    # single copy of the rows and columns to be kept
+    data = data.iloc[rows, [data.columns.get_loc(col) for col in kept_columns]]
+    data['trans_price'] = trans[rows]
+    if 'current_price' not in columns:
+        data['current_price'] = current[rows]
+    data['response'] = (current[rows] > trans[rows]).astype(int)
+    logger.info('Prices joined and response added to %i transactions', len(data))
+
+    duplicated = data.duplicated()
+    if duplicated.any():
+        data = data[~duplicated]
+    data = data.reset_index(drop=True)
+    logger.info('Duplicates dropped successfully. Num of duplicates = %s', duplicated.sum())
+
+    if column in data.columns:
+        values = data[column]
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+        if missing_val in values.cat.categories:
+            values = values.cat.remove_categories([missing_val])
+        if replacement not in values.cat.categories:
+            values = values.cat.add_categories([replacement])
+        data[column] = values.fillna(replacement)
+        logger.info('Missing values imputed successfully')
+    else:
+        logger.warning('The column to be imputed does not exist. Using the original DataFrame')
+
+    if save_path and vocab_path:
+        save_encoded(data, save_path, vocab_path)
+    elif save_path:
+        data.to_csv(save_path, index=False)
+        logger.info('DataFrame with features saved to: %s', save_path)
+    return data
+
+# function to run the feature steps on one partition of the data
+def clean_partition(data: pd.core.frame.DataFrame,
+                    columns: typing.List[str],
+                    column: str = 'owner',
+                    replacement: str = 'undisclosed',
+                    missing_val: str = '--') -> pd.core.frame.DataFrame:
+    """
+    This function applies add_response, filter_df, drop_dups and impute_missing
+    to a partition of the cleaned data (it is executed by the pool workers)
+
+    Args:
+        data (pd.core.frame.DataFrame): partition of the cleaned data
+        columns (typing.List[str]): the list of column names to be excluded
+        column (str): column name of feature containing missing values
+        replacement (str): value to be used in place of missing data
+        missing_val (str): placeholder that indicates missing data
+    Returns:
+        data (pd.core.frame.DataFrame): partition with the features
+    """
+    data = add_response(data)
+    data = filter_df(data, columns)
+    data = drop_dups(data)
+    return impute_missing(data, None, column, replacement, missing_val)
+
+# function to run the feature steps in parallel over hash partitions
+def add_features_parallel(input_data: typing.Union[str, pd.core.frame.DataFrame],
+                          columns: typing.List[str],
+                          save_path: str = None,
+                          column: str = 'owner',
+                          replacement: str = 'undisclosed',
+                          missing_val: str = '--',
+                          n_jobs: int = None,
+                          n_partitions: int = None,
+                          vocab_path: str = None) -> pd.core.frame.DataFrame:
+    """
+    This function produces the same output as add_response, filter_df,
+    drop_dups and impute_missing run one after the other, but splits the rows
+    into partitions that are processed in a pool of worker processes. Rows are
+    assigned to partitions by hashing all the columns that remain after the
+    filter, so that duplicate rows always end up in the same partition and
+    are dropped there. The original row order is restored at the end
+
+    Args:
+        input_data (typing.Union[str,pd.core.frame.DataFrame]): path where the input
+        DataFrame should be obtained from, or alternatively, an actual DataFrame object
+        columns (typing.List[str]): the list of column names to be excluded
+        save_path (str): path to save the cleaned DataFrame
+        column (str): column name of feature containing missing values
+        replacement (str): value to be used in place of missing data
+        missing_val (str): placeholder that indicates missing data
+        n_jobs (int): number of worker processes (all CPU cores if None)
+        n_partitions (int): number of partitions (4 per worker if None)
+        vocab_path (str): path to the vocabularies, to save the string columns as
+        integer codes (see src/vocab.py)
+    Returns:
+        data (pd.core.frame.DataFrame): output DataFrame with the features
+    """
+    if isinstance(input_data, str):
+        try:
+            data = pd.read_csv(input_data)
+        except FileNotFoundError as error:
+            logger.error('File not found')
+            logger.debug('Check path in the configuration file')
+            raise error
+    else:
+        data = input_data
+
+    n_jobs = n_jobs or os.cpu_count()
+    n_partitions = n_partitions or 4 * n_jobs
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        # filter_df keeps every column when one of them is missing
+        if all(col in data.columns for col in columns):
+            key_columns = [col for col in data.columns if col not in columns]
+        else:
+            key_columns = data.columns.tolist()
+        partition = pd.util.hash_pandas_object(data[key_columns], index=False)\
+                      .to_numpy() % n_partitions
+        rows = np.argsort(partition, kind='stable')
+        bounds = np.searchsorted(partition[rows], np.arange(1, n_partitions))
+        parts = [data.iloc[part] for part in np.split(rows, bounds) if len(part)]
+        logger.info('Processing %i partitions with %i workers', len(parts), n_jobs)
+        results = list(executor.map(clean_partition, parts,
+                                    [columns]*len(parts), [column]*len(parts),
+                                    [replacement]*len(parts), [missing_val]*len(parts)))
+
+    data = pd.concat(results).sort_index()
+    logger.info('Features added to %i rows', len(data))
+    if save_path and vocab_path:
+        save_encoded(data, save_path, vocab_path)
+    elif save_path:
+        data.to_csv(save_path, index=False)
+        logger.info('DataFrame with features saved to: %s', save_path)
+    return data
@@ -1,15 +1,25 @@
 """
 This module writes data to RDS or local SQLite database
 """
+import functools
 import logging.config
 import os
+import json
+import queue
+import threading
+import time
+import typing
+from datetime import datetime
 from sqlalchemy.orm import sessionmaker
+import numpy as np
 import pandas as pd
 from flask_sqlalchemy import SQLAlchemy
 import sqlalchemy as sql
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Float, Integer, String, Text
 from config.flaskconfig import SQLALCHEMY_DATABASE_URI
+from src.clean import impute_missing
+from src.price_store import PriceStore, INDEX_FILE
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +43,73 @@ class Transaction(Base):
     def __repr__(self):
         return f'<Transaction {self.id}>'
 
+# Define the schema for a table that contains a summary per representative
+class RepresentativeSummary(Base):
+    """Create a table with the pre-computed trade summary of each representative
+    """
+
+    __tablename__ = 'representative_summary'
+
+    representative = Column(String(200), primary_key=True)
+    n_trades = Column(Integer, unique=False, nullable=False)
+    counts = Column(Text, unique=False, nullable=False)
+    latest = Column(Text, unique=False, nullable=False)
+    ingested_at = Column(String(32), unique=False, nullable=False)
+
+    def __repr__(self):
+        return f'<RepresentativeSummary {self.representative}>'
+
+# Define the schema for a table with the model scores of the recent transactions
+class TransactionScore(Base):
+    """Create a table with the probability predicted for every ingested transaction
+    """
+
+    __tablename__ = 'transaction_score'
+
+    transaction_id = Column(Integer, primary_key=True)
+    representative = Column(String(200), unique=False, nullable=False, index=True)
+    transaction_date = Column(String(200), unique=False, nullable=False)
+    ticker = Column(String(200), unique=False, nullable=False)
+    amount = Column(String(200), unique=False, nullable=False)
+    type = Column(String(200), unique=False, nullable=False)
+    trans_price = Column(Float, unique=False, nullable=False)
+    probability = Column(Float, unique=False, nullable=False)
+    model_version = Column(String(32), unique=False, nullable=False)
+
+    def __repr__(self):
+        return f'<TransactionScore {self.transaction_id}>'
+
+# Define the schema for a table that logs the predictions served by the app
+class PredictionLog(Base):
+    """Create a table to be set up for auditing the predictions of the app
+    """
+
+    __tablename__ = 'prediction_log'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_at = Column(String(32), unique=False, nullable=False)
+    representative = Column(String(200), unique=False, nullable=False)
+    ticker = Column(String(200), unique=False, nullable=False)
+    owner = Column(String(200), unique=False, nullable=False)
+    type = Column(String(200), unique=False, nullable=False)
+    amount = Column(String(200), unique=False, nullable=False)
+    trans_price = Column(Float, unique=False, nullable=False)
+    probability = Column(Float, unique=False, nullable=False)
+
+    def __repr__(self):
+        return f'<PredictionLog {self.id}>'
+
+@functools.lru_cache(maxsize=None)
+def get_engine(engine_string: str) -> sql.engine.Engine:
+    '''Returns one engine per connection string, so that a long-running process
+    (e.g. the scheduler of run.py) reuses its pooled connections between runs
+    Args:
+        engine_string (str): engine string to connect to databases
+    Returns:
+        engine (sql.engine.Engine): engine of the database
+    '''
+    return sql.create_engine(engine_string)
+
 # Create the table with correct schema in RDS or SQLite
 def create_db():
     '''Create the database and tables either locally or in AWS RDS'''
@@ -46,7 +123,7 @@ def create_db():
         logger.info('Database location: Local')
         logger.debug('Set MYSQL_HOST variable for AWS RDS instead of local')
     # set up mysql connection
-    engine = sql.create_engine(SQLALCHEMY_DATABASE_URI)
+    engine = get_engine(SQLALCHEMY_DATABASE_URI)
 
     try:
         Base.metadata.create_all(engine)
@@ -58,9 +135,121 @@ def create_db():
     else:
         logger.info('Recent Transaction table created successfully.')
 
+# Summarize the transactions of every representative
+def build_summary(dataframe: pd.DataFrame,
+                  top_n: int = 50,
+                  columns: typing.Tuple[str] = ('ticker', 'type', 'amount')) -> pd.DataFrame:
+    '''Builds one summary row per representative with the number of trades,
+    the count of trades by ticker/type/amount bracket, and the top_n latest trades
+
+    Args:
+        dataframe (pd.DataFrame): recent transactions
+        top_n (int): number of latest trades kept per representative
+        columns (typing.Tuple[str]): columns whose values get counted
+    Returns:
+        summary (pd.DataFrame): DataFrame with the RepresentativeSummary columns
+    '''
+    ingested_at = datetime.utcnow().isoformat(timespec='microseconds')
+    dataframe = dataframe.sort_values('transaction_date', ascending=False, kind='stable')
+    rows = []
+    for representative, group in dataframe.groupby('representative', sort=False):
+        counts = {col: group[col].value_counts().to_dict() for col in columns}
+        latest = group.head(top_n).drop(columns=['id'], errors='ignore')
+        rows.append({'representative': representative,
+                     'n_trades': len(group),
+                     'counts': json.dumps(counts),
+                     'latest': latest.to_json(orient='records'),
+                     'ingested_at': ingested_at})
+    return pd.DataFrame(rows, columns=['representative', 'n_trades', 'counts',
+                                       'latest', 'ingested_at'])
+
+def build_scores(dataframe: pd.DataFrame,
+                 model_path: str,
+                 encoder_path: str,
+                 scaler_path: str,
+                 store_dir: str,
+                 owner: str = 'undisclosed') -> pd.DataFrame:
+    '''Scores all the transactions with the saved model in one batch. The price on the
+    transaction day (or the last trading day before it) comes from the price store.
+    Transactions without a stored price, or with a value the encoder has not seen, are
+    left out
+
+    Args:
+        dataframe (pd.DataFrame): recent transactions with an id column
+        model_path (str): path to pickled model
+        encoder_path (str): path to pickled encoder
+        scaler_path (str): path to pickled standard scaler
+        store_dir (str): folder written by build_price_store
+        owner (str): owner of the transactions whose owner is missing, or of every
+        transaction when the feed has no owner column
+    Returns:
+        scores (pd.DataFrame): DataFrame with the TransactionScore columns
+    '''
+    # the modeling stack (sklearn, matplotlib) is only imported when scoring
+    from src.train import get_model, predict_batch  # pylint: disable=import-outside-toplevel
+    model, enc, scaler = get_model(model_path, encoder_path, scaler_path)
+    version = datetime.utcfromtimestamp(max(os.path.getmtime(path) for path in
+                                            [model_path, encoder_path, scaler_path]))
+    data = dataframe.copy() if 'owner' in dataframe else dataframe.assign(owner=owner)
+    data = impute_missing(data, replacement=owner)
+    data['trans_price'] = PriceStore(store_dir).lookup(data['ticker'], data['transaction_date'],
+                                                       asof=True)
+    scorable = data['trans_price'].notna().to_numpy()
+    for col, categories in zip(enc.feature_names_in_, enc.categories_):
+        scorable &= data[col].isin(categories).to_numpy()
+    data = data[scorable]
+    logger.info('Scoring %i of %i transactions (the others have no price or unseen values)',
+                len(data), len(dataframe))
+    probabilities = predict_batch(model, enc, scaler, data) if len(data) else np.empty(0)
+    return pd.DataFrame({'transaction_id': data['id'],
+                         'representative': data['representative'],
+                         'transaction_date': data['transaction_date'],
+                         'ticker': data['ticker'],
+                         'amount': data['amount'],
+                         'type': data['type'],
+                         'trans_price': data['trans_price'],
+                         'probability': probabilities.round(3),
+                         'model_version': version.isoformat(timespec='seconds')})
+
+def get_scores(session, representative: str) -> typing.Dict[typing.Tuple[str], float]:
+    '''Reads the scores of a representative's transactions with one indexed query
+
+    Args:
+        session (sqlalchemy.orm.Session): session used to query the score table
+        representative (str): name of the representative
+    Returns:
+        scores (typing.Dict[typing.Tuple[str], float]): probability keyed by transaction
+        date, ticker, amount and type (equal keys always get the same score)
+    '''
+    rows = session.query(TransactionScore.transaction_date, TransactionScore.ticker,
+                         TransactionScore.amount, TransactionScore.type,
+                         TransactionScore.probability)\
+                  .filter(TransactionScore.representative == representative)
+    return {tuple(row[:4]): row[4] for row in rows}
+
+def add_scores(dataframe, engine, model_path, encoder_path, scaler_path, store_dir):
+    '''Replaces the transaction_score table with the scores of the transactions. The
+    transactions are ingested without scores if the model or price store is missing'''
+    missing = [path for path in [model_path, encoder_path, scaler_path,
+                                 os.path.join(store_dir, INDEX_FILE)]
+               if not os.path.exists(path)]
+    if missing:
+        logger.error('Transactions not scored, run get_model and price_store first '
+                     '(missing %s)', missing)
+        return
+    scores = build_scores(dataframe, model_path, encoder_path, scaler_path, store_dir)
+    # recreate the table so that the index on representative is kept
+    TransactionScore.__table__.drop(engine, checkfirst=True)
+    TransactionScore.__table__.create(engine)
+    scores.to_sql('transaction_score', engine, if_exists='append', index=False)
+    logger.info('Scores of %i transactions added to "transaction_score" table', len(scores))
+
 # Push the locally stored data to RDS or SQLite
-def add_df(local_path):
-    '''Adds clean dataframe to database either locally or in AWS RDS'''
+def add_df(local_path, top_n=50, model_path=None, encoder_path=None, scaler_path=None,
+           store_dir=None):
+    '''Adds clean dataframe to database either locally or in AWS RDS, along with
+    the materialized summary of each representative used by the response page, and the
+    scores of every transaction if the model paths are given'''
     if os.environ.get('SQLALCHEMY_DATABASE_URI') is None:
         logger.info('Database location: Local')
         logger.debug('Set MYSQL_HOST variable for AWS RDS instead of local')
@@ -71,7 +260,7 @@ def add_df(local_path):
         logger.info('Database location: Local')
         logger.debug('Set MYSQL_HOST variable for AWS RDS instead of local')
     # set up mysql connection
-    engine = sql.create_engine(SQLALCHEMY_DATABASE_URI)
+    engine = get_engine(SQLALCHEMY_DATABASE_URI)
 
     dataframe = pd.read_csv(local_path)
     dataframe = dataframe.reset_index()
@@ -79,6 +268,15 @@ def add_df(local_path):
     try:
         dataframe.to_sql('transaction', engine, if_exists='replace', index=False)
         logger.info('Recent transaction data added to "transaction" table')
+        summary = build_summary(dataframe, top_n)
+        # recreate the table so that the primary key on representative is kept
+        RepresentativeSummary.__table__.drop(engine, checkfirst=True)
+        RepresentativeSummary.__table__.create(engine)
+        summary.to_sql('representative_summary', engine, if_exists='append', index=False)
+        logger.info('Summary of %i representatives added to "representative_summary" table',
+                    len(summary))
+        if model_path and encoder_path and scaler_path and store_dir:
+            add_scores(dataframe, engine, model_path, encoder_path, scaler_path, store_dir)
     except sql.exc.OperationalError as error_name:
         logger.debug('Make sure you are connected to the VPN')
         logger.error('Error with sql functionality: %s', str(error_name))
@@ -105,3 +303,202 @@ class ResponseManager:
             self.session = session()
         else:
             raise ValueError('Need either an engine string or a Flask app to initialize')
+
+
+# In-process cache of the representative summaries for the Flask app
+class SummaryCache:
+    '''Class that serves the materialized representative summaries from memory.
+    The cache is emptied when the data gets re-ingested (checked every `ttl` seconds),
+    and the functions in `listeners` are then called with the new ingestion time'''
+
+    def __init__(self, session, ttl=30):
+        '''Initialize class for SummaryCache
+        Args:
+            self
+            session (sqlalchemy.orm.Session): session used to query the summary table
+            ttl (int): seconds between two checks of the ingestion time
+        Returns:
+            None
+        '''
+        self.session = session
+        self.ttl = ttl
+        self.version = None
+        self.checked_at = 0.0
+        self.entries = {}
+        self.listeners = []
+
+    def refresh(self):
+        '''Empties the cache if the summary table was re-ingested since the last check'''
+        now = time.monotonic()
+        if now - self.checked_at < self.ttl:
+            return
+        self.checked_at = now
+        version = self.session.query(sql.func.max(RepresentativeSummary.ingested_at)).scalar()
+        if version != self.version:
+            logger.info('Summary cache invalidated (data ingested at %s)', version)
+            self.entries = {}
+            self.version = version
+            for listener in self.listeners:
+                listener(version)
+
+    def get(self, representative):
+        '''Returns the summary of a representative, or None if it is not available
+        Args:
+            self
+            representative (str): name of the representative
+        Returns:
+            summary (dict): n_trades, counts by column and latest trades
+        '''
+        self.refresh()
+        if representative not in self.entries:
+            row = self.session.get(RepresentativeSummary, representative)
+            if row is None:
+                return None
+            self.entries[representative] = {'n_trades': row.n_trades,
+                                            'counts': json.loads(row.counts),
+                                            'latest': json.loads(row.latest)}
+        return self.entries[representative]
+
+
+# Background writer of the prediction log for the Flask app
+class PredictionLogWriter:
+    '''Class that buffers the prediction records in a bounded queue and inserts them
+    in bulk from a background thread, every `batch_size` records or `flush_interval`
+    seconds. When the queue is full, records are dropped (policy "drop") or the caller
+    waits up to `block_timeout` seconds for space (policy "block")'''
+
+    def __init__(self, engine_string, batch_size=100, flush_interval=0.5,
+                 max_queue=10000, policy='drop', block_timeout=1.0):
+        '''Initialize class for PredictionLogWriter and start the writer thread
+        Args:
+            self
+            engine_string (str): engine string to connect to databases
+            batch_size (int): number of records inserted at once
+            flush_interval (float): maximum seconds a record waits before being inserted
+            max_queue (int): maximum number of records waiting in memory
+            policy (str): "drop" or "block", what to do when the queue is full
+            block_timeout (float): seconds to wait for space with the "block" policy
+        Returns:
+            None
+        '''
+        if policy not in ('drop', 'block'):
+            raise ValueError(f'Unknown backpressure policy {policy}, use "drop" or "block"')
+        self.engine_string = engine_string
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.closed = True
+        self.start()
+
+    def start(self):
+        '''Opens a new engine, queue and writer thread. Called by __init__, and again in
+        a forked worker process after the parent closed the writer, so that no connection,
+        lock or thread is shared across the fork
+        Args:
+            self
+        Returns:
+            None
+        '''
+        if not self.closed:
+            return
+        self.engine = sql.create_engine(self.engine_string)
+        PredictionLog.__table__.create(self.engine, checkfirst=True)
+        self.records = queue.Queue(maxsize=self.max_queue)
+        self.stopping = threading.Event()
+        self.written = 0
+        self.dropped = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name='prediction-log', daemon=True)
+        self.thread.start()
+
+    def log(self, record):
+        '''Queues a prediction record without waiting for the database
+        Args:
+            self
+            record (dict): values of the PredictionLog columns (created_at is optional)
+        Returns:
+            queued (bool): False if the record was dropped
+        '''
+        if self.closed:
+            return False
+        record = dict(record)
+        record.setdefault('created_at', datetime.utcnow().isoformat(timespec='microseconds'))
+        try:
+            if self.policy == 'block':
+                self.records.put(record, timeout=self.block_timeout)
+            else:
+                self.records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning('Prediction log queue full, %i records dropped', self.dropped)
+            return False
+        return True
+
+    def flush(self, batch):
+        '''Inserts a batch of records in a single statement
+        Args:
+            self
+            batch (typing.List[dict]): prediction records
+        Returns:
+            None
+        '''
+        if not batch:
+            return
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(PredictionLog.__table__.insert(), batch)
+            self.written += len(batch)
+            logger.debug('%i predictions written to "prediction_log" table', len(batch))
+        except sql.exc.SQLAlchemyError as error_name:
+            self.dropped += len(batch)
+            logger.error('Unable to write %i predictions: %s', len(batch), str(error_name))
+
+    def run(self):
+        '''Collects the queued records into batches until close() sets the stop event'''
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while not self.stopping.is_set():
+            try:
+                record = self.records.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                record = None
+            if record:
+                batch.append(record)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self.flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+        # write what is left after the stop signal
+        while True:
+            try:
+                record = self.records.get_nowait()
+            except queue.Empty:
+                break
+            if record:
+                batch.append(record)
+        self.flush(batch)
+
+    def close(self, timeout=10.0):
+        '''Stops accepting records and waits until the queued ones are written
+        Args:
+            self
+            timeout (float): maximum seconds to wait for the writer thread
+        Returns:
+            None
+        '''
+        if self.closed:
+            return
+        self.closed = True
+        self.stopping.set()
+        try:
+            # wakes up the writer if it waits for a record
+            self.records.put_nowait(None)
+        except queue.Full:
+            # a full queue never makes the writer wait, it sees the event at once
+            pass
+        self.thread.join(timeout)
+        self.engine.dispose()
+        logger.info('Prediction log closed: %i written, %i dropped', self.written, self.dropped)
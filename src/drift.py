@@ -0,0 +1,224 @@
+"""
+This module monitors the drift of the app inputs: train() saves a profile of the
+training data, and the values of the last predictions are counted into fixed-size
+counters, which are compared with the profile by population stability index (PSI). The
+counters live in shared memory, so the worker processes forked by serve.py all count
+into the same windows
+"""
+import bisect
+import json
+import logging
+import multiprocessing
+import os
+import typing
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# PSI above which a feature is reported as drifting (common rule of thumb)
+PSI_WARNING = 0.1
+PSI_ALERT = 0.25
+
+# share given to the empty buckets so the PSI stays finite
+EPSILON = 1e-4
+
+def build_profile(data: pd.core.frame.DataFrame,
+                  categ: typing.List[str],
+                  price_column: str = 'trans_price',
+                  max_values: int = 50,
+                  bins: int = 20) -> dict:
+    '''
+    Summarizes the training distribution of the app inputs
+
+    Args:
+        data (pd.core.frame.DataFrame): training data
+        categ (typing.List[str]): categorical columns filled in the app form
+        price_column (str): numeric column filled in the app form
+        max_values (int): most frequent values kept per categorical column, the
+        others share one bucket
+        bins (int): number of quantile bins of the price
+    Returns:
+        profile (dict): for each categorical column the kept values, every value seen
+        and the bucket shares; for the price the bin edges and bin shares
+    '''
+    profile = {'rows': int(len(data)), 'categorical': {}}
+    for col in categ:
+        counts = data[col].astype(str).value_counts()
+        top = counts.iloc[:max_values]
+        shares = (top / len(data)).tolist() + [float(counts.iloc[max_values:].sum() / len(data))]
+        profile['categorical'][col] = {'values': top.index.tolist(),
+                                       'known': sorted(counts.index.tolist()),
+                                       'shares': shares}
+    prices = data[price_column].dropna().to_numpy(dtype=float)
+    edges = np.unique(np.quantile(prices, np.linspace(0, 1, bins + 1)[1:-1]))
+    counts = np.bincount(np.searchsorted(edges, prices, side='right'), minlength=len(edges) + 1)
+    profile['price'] = {'column': price_column, 'edges': edges.tolist(),
+                        'shares': (counts / max(len(prices), 1)).tolist()}
+    return profile
+
+def save_profile(profile: dict, profile_path: str) -> None:
+    '''
+    Writes the training profile to a json file
+
+    Args:
+        profile (dict): profile returned by build_profile
+        profile_path (str): path to the json file
+    Returns:
+        None
+    '''
+    with open(profile_path, 'w', encoding='utf8') as file:
+        json.dump(profile, file)
+    logger.info('Training profile saved to: %s', profile_path)
+
+def psi(expected: typing.List[float], actual: typing.List[float]) -> float:
+    '''
+    Population stability index between two distributions over the same buckets
+
+    Args:
+        expected (typing.List[float]): training shares
+        actual (typing.List[float]): live shares
+    Returns:
+        psi (float): sum of (actual - expected) * ln(actual / expected)
+    '''
+    expected = np.maximum(np.asarray(expected, dtype=float), EPSILON)
+    actual = np.maximum(np.asarray(actual, dtype=float), EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+class DriftMonitor:
+    '''Class that counts the app inputs in fixed-size counters and compares them with the
+    training profile. update() only increments counters; the PSI is computed by scores(),
+    over the last complete window of `window_size` predictions (or the current one until
+    a window is complete). The counters are flat arrays in shared memory guarded by a
+    lock, allocated before serve.py forks its workers, so every worker counts into them'''
+
+    def __init__(self, profile_path, window_size=1000, min_predictions=100):
+        '''Initialize class for DriftMonitor and load the training profile
+        Args:
+            self
+            profile_path (str): path to the json file written by train()
+            window_size (int): number of predictions compared at once with the profile
+            min_predictions (int): predictions needed before a feature gets a status,
+            the PSI of a few predictions being mostly noise
+        Returns:
+            None
+        '''
+        self.profile_path = profile_path
+        self.window_size = window_size
+        self.min_predictions = min_predictions
+        self.profile = None
+        self.mtime = None
+        self.load()
+
+    def load(self):
+        '''Loads the training profile if it was saved again since it was loaded, and
+        starts new windows. Without a profile, update() does nothing
+        Args:
+            self
+        Returns:
+            None
+        '''
+        try:
+            mtime = os.path.getmtime(self.profile_path)
+        except (FileNotFoundError, TypeError):
+            if self.profile is None:
+                logger.warning('No training profile at %s, drift is not monitored',
+                               self.profile_path)
+            return
+        if mtime == self.mtime:
+            return
+        with open(self.profile_path, 'r', encoding='utf8') as file:
+            self.profile = json.load(file)
+        self.mtime = mtime
+        self.columns = list(self.profile['categorical'])
+        # value -> bucket position, the last bucket holds the other values
+        self.index = {col: {value: position for position, value in enumerate(summary['values'])}
+                      for col, summary in self.profile['categorical'].items()}
+        self.known = {col: set(summary['known'])
+                      for col, summary in self.profile['categorical'].items()}
+        self.edges = self.profile['price']['edges']
+        # layout of a window: the count, then the buckets of every categorical column,
+        # the unseen values of every column and the price bins
+        self.offsets, size = {}, 1
+        for col, index in self.index.items():
+            self.offsets[col] = size
+            size += len(index) + 1
+        self.unseen = {col: size + position for position, col in enumerate(self.columns)}
+        self.price_offset = size + len(self.columns)
+        size = self.price_offset + len(self.edges) + 1
+        self.lock = multiprocessing.Lock()
+        self.window = multiprocessing.RawArray('q', size)
+        # count of 0 until a window is complete
+        self.previous = multiprocessing.RawArray('q', size)
+        logger.info('Training profile loaded from %s', self.profile_path)
+
+    def update(self, cat_inputs, trans_price):
+        '''Counts the inputs of one prediction (a few dictionary lookups and increments
+        under the lock)
+        Args:
+            self
+            cat_inputs (typing.Dict[str, str]): categorical inputs keyed by column name
+            trans_price (float): price of stock on day of trade
+        Returns:
+            None
+        '''
+        if self.profile is None:
+            return
+        positions = [self.price_offset + bisect.bisect_right(self.edges, trans_price)]
+        for col in self.columns:
+            value = cat_inputs.get(col)
+            position = self.index[col].get(value)
+            positions.append(self.offsets[col] + (len(self.index[col]) if position is None
+                                                  else position))
+            if value not in self.known[col]:
+                positions.append(self.unseen[col])
+        window = self.window
+        # a worker killed while holding the lock must not block the predictions
+        if not self.lock.acquire(timeout=1):
+            logger.warning('Drift counters locked, prediction not counted')
+            return
+        try:
+            for position in positions:
+                window[position] += 1
+            window[0] += 1
+            if window[0] >= self.window_size:
+                self.previous[:] = window[:]
+                window[:] = [0] * len(window)
+        finally:
+            self.lock.release()
+
+    def scores(self) -> dict:
+        '''Compares the last complete window (or the current one) with the profile
+        Args:
+            self
+        Returns:
+            scores (dict): number of predictions compared, and per feature the PSI, a
+            status ("stable", "warning", "alert", or "insufficient" below min_predictions)
+            and the share of values never seen in training
+        '''
+        if self.profile is None:
+            return {'predictions': 0, 'features': {}}
+        with self.lock:
+            complete = self.previous[0] > 0
+            window = self.previous[:] if complete else self.window[:]
+        count = window[0]
+        features = {}
+        if count:
+            for col in self.columns:
+                start = self.offsets[col]
+                shares = [value / count
+                          for value in window[start:start + len(self.index[col]) + 1]]
+                features[col] = {'psi': psi(self.profile['categorical'][col]['shares'], shares),
+                                 'unseen_share': window[self.unseen[col]] / count}
+            shares = [value / count for value in window[self.price_offset:]]
+            features[self.profile['price']['column']] = {
+                'psi': psi(self.profile['price']['shares'], shares)}
+        for name, feature in features.items():
+            feature['psi'] = round(feature['psi'], 4)
+            feature['status'] = ('insufficient' if count < self.min_predictions else
+                                 'alert' if feature['psi'] > PSI_ALERT else
+                                 'warning' if feature['psi'] > PSI_WARNING else 'stable')
+            if feature['status'] == 'alert':
+                logger.warning('Input "%s" drifted from the training data (PSI %.3f)',
+                               name, feature['psi'])
+        return {'predictions': count, 'complete_window': complete, 'features': features}
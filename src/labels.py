@@ -0,0 +1,128 @@
+"""
+This module creates the response at several horizons from a local store of daily
+closing prices, instead of comparing against a single current-day price snapshot
+"""
+import logging
+import typing
+import numpy as np
+import pandas as pd
+
+from src.clean import filter_df, drop_dups, impute_missing
+
+logger = logging.getLogger(__name__)
+
+def load_price_history(price_path: str) -> pd.core.frame.DataFrame:
+    '''
+    Reads the daily closing prices and sorts them by ticker and date
+
+    Args:
+        price_path (str): path to the price history with ticker, date and price columns
+    Returns:
+        prices (pd.core.frame.DataFrame): sorted prices without missing values or duplicates
+    '''
+    try:
+        prices = pd.read_csv(price_path, usecols=['ticker', 'date', 'price'])
+    except ValueError as error:
+        logger.error('The price history does not contain the required columns: %s', error)
+        raise error
+    prices = prices.dropna().drop_duplicates(['ticker', 'date'])
+    prices['date'] = pd.to_datetime(prices['date'])
+    return prices.sort_values(['ticker', 'date'], ignore_index=True)
+
+def forward_returns(data: pd.core.frame.DataFrame,
+                    prices: pd.core.frame.DataFrame,
+                    horizons: typing.List[int],
+                    date_column: str = 'transaction_date') -> pd.core.frame.DataFrame:
+    '''
+    Computes the return from the close on (or before) the transaction date to the close
+    `h` trading days later for every horizon `h`. The prices of all tickers are laid out
+    in one array sorted by (ticker, date), so that every transaction is located with a
+    single searchsorted call and the forward close is found by moving `h` positions
+
+    Args:
+        data (pd.core.frame.DataFrame): transactions with ticker and date columns
+        prices (pd.core.frame.DataFrame): output of load_price_history
+        horizons (typing.List[int]): numbers of trading days to look ahead
+        date_column (str): column with the transaction date
+    Returns:
+        returns (pd.core.frame.DataFrame): one return_{h}d column per horizon (NaN when
+        the ticker has no close before the transaction or not enough closes after it)
+    '''
+    tickers = pd.Index(prices['ticker'].unique())
+    price_codes = tickers.get_indexer(prices['ticker'])
+    price_days = prices['date'].to_numpy('datetime64[D]').astype(np.int64)
+    closes = prices['price'].to_numpy(float)
+
+    codes = tickers.get_indexer(data['ticker'])
+    days = pd.to_datetime(data[date_column]).to_numpy('datetime64[D]').astype(np.int64)
+
+    # combine ticker and day in one sorted key (days since 1970 fit in 2**20)
+    price_keys = price_codes * (1 << 20) + price_days
+    keys = codes * (1 << 20) + days
+    position = np.searchsorted(price_keys, keys, side='right') - 1
+    found = (codes >= 0) & (position >= 0)
+    found[found] = price_codes[position[found]] == codes[found]
+    base = np.where(found, closes[np.maximum(position, 0)], np.nan)
+
+    returns = pd.DataFrame(index=data.index)
+    for horizon in horizons:
+        ahead = position + horizon
+        valid = found & (ahead < len(closes))
+        valid[valid] = price_codes[ahead[valid]] == codes[valid]
+        forward = np.where(valid, closes[np.minimum(ahead, len(closes) - 1)], np.nan)
+        returns[f'return_{horizon}d'] = forward / base - 1
+    logger.info('Forward returns computed for %i transactions at horizons %s',
+                len(data), horizons)
+    return returns
+
+def add_horizon_labels(input_data: typing.Union[str, pd.core.frame.DataFrame],
+                       price_path: str,
+                       horizons: typing.List[int],
+                       columns: typing.List[str],
+                       save_path: str = None,
+                       column: str = 'owner',
+                       replacement: str = 'undisclosed',
+                       missing_val: str = '--',
+                       vocab_path: str = None) -> typing.Dict[int, pd.core.frame.DataFrame]:
+    '''
+    Creates one modeling DataFrame per horizon, where the response is 1 if the
+    close `h` trading days after the transaction is higher than on the transaction day.
+    Transactions without enough price history for a horizon are left out of it. The
+    remaining steps are the ones of the add_features stage, so each output has the
+    same columns as the cleaned data with features
+
+    Args:
+        input_data (typing.Union[str,pd.core.frame.DataFrame]): cleaned data (with the
+        transaction_date column) or the path to it
+        price_path (str): path to the daily closing prices
+        horizons (typing.List[int]): numbers of trading days to look ahead
+        columns (typing.List[str]): columns excluded from the modeling data
+        save_path (str): path template with a {horizon} field to save each DataFrame
+        column (str): column name of feature containing missing values
+        replacement (str): value to be used in place of missing data
+        missing_val (str): placeholder that indicates missing data
+        vocab_path (str): path to the vocabularies, to save the string columns as
+        integer codes (see src/vocab.py)
+    Returns:
+        labeled (typing.Dict[int, pd.core.frame.DataFrame]): modeling data by horizon
+    '''
+    if isinstance(input_data, str):
+        data = pd.read_csv(input_data)
+    else:
+        data = input_data
+    returns = forward_returns(data, load_price_history(price_path), horizons)
+
+    labeled = {}
+    for horizon in horizons:
+        ret = returns[f'return_{horizon}d']
+        horizon_data = data[ret.notna()].copy()
+        horizon_data['response'] = (ret[ret.notna()] > 0).astype(int)
+        logger.info('%i of %i transactions labeled at %i trading days (%.1f%% positive)',
+                    len(horizon_data), len(data), horizon,
+                    100 * horizon_data['response'].mean() if len(horizon_data) else 0)
+        horizon_data = drop_dups(filter_df(horizon_data, columns))
+        labeled[horizon] = impute_missing(horizon_data,
+                                          save_path.format(horizon=horizon) if save_path
+                                          else None,
+                                          column, replacement, missing_val, vocab_path)
+    return labeled
@@ -0,0 +1,104 @@
+"""
+This module caches the pages rendered by the Flask app and adds the HTTP caching
+(ETag, Last-Modified, Cache-Control) and gzip compression to its responses
+"""
+import collections
+import gzip
+import logging
+import threading
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+# content types worth compressing
+COMPRESSIBLE_TYPES = ('text/html', 'text/css', 'text/plain', 'application/json',
+                      'application/javascript', 'text/javascript')
+
+class PageCache:
+    '''Class that keeps the rendered pages in memory, keyed by route and route arguments.
+    The least recently used pages are dropped once `max_entries` is reached. A lock
+    guards the entries, which the threads of the dev server read and update together'''
+
+    def __init__(self, max_entries=256):
+        '''Initialize class for PageCache
+        Args:
+            self
+            max_entries (int): maximum number of pages kept in memory
+        Returns:
+            None
+        '''
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.updated_at = time.time()
+
+    def get(self, key: typing.Tuple) -> typing.Optional[str]:
+        '''Returns the cached page, or None if it was not rendered since the last invalidation
+        Args:
+            self
+            key (typing.Tuple): route name followed by the route arguments
+        Returns:
+            page (str): rendered html
+        '''
+        with self.lock:
+            page = self.entries.get(key)
+            if page is not None:
+                self.entries.move_to_end(key)
+        return page
+
+    def set(self, key: typing.Tuple, page: str) -> str:
+        '''Stores a rendered page and returns it
+        Args:
+            self
+            key (typing.Tuple): route name followed by the route arguments
+            page (str): rendered html
+        Returns:
+            page (str): the same rendered html
+        '''
+        with self.lock:
+            self.entries[key] = page
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return page
+
+    def clear(self, reason: str = '') -> None:
+        '''Drops every cached page, e.g. after the data was ingested or the model reloaded
+        Args:
+            self
+            reason (str): logged reason of the invalidation
+        Returns:
+            None
+        '''
+        with self.lock:
+            self.entries.clear()
+            self.updated_at = time.time()
+        logger.info('Page cache cleared %s', reason)
+
+def gzip_response(response, accept_encoding: str, min_size: int = 500, level: int = 6):
+    '''Compresses the body of a response with gzip when the client accepts it
+
+    Args:
+        response (flask.Response): response to compress in place
+        accept_encoding (str): Accept-Encoding header of the request
+        min_size (int): bodies smaller than this number of bytes are left as they are
+        level (int): gzip compression level
+    Returns:
+        response (flask.Response): the same response
+    '''
+    if (response.status_code != 200 or response.mimetype not in COMPRESSIBLE_TYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+    # the identity response varies as well, so that caches never serve it for gzip
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in accept_encoding.lower():
+        return response
+    # static files are streamed from disk, read them so that they can be compressed
+    response.direct_passthrough = False
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=level, mtime=0))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
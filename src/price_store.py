@@ -0,0 +1,209 @@
+"""
+This module stores the daily closing prices as contiguous per-ticker arrays on disk
+and looks up the prices of many (ticker, date) pairs at once through np.memmap
+"""
+import json
+import logging
+import os
+import threading
+import typing
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# files making up a price store folder
+DAYS_FILE = 'days.bin'
+CLOSES_FILE = 'closes.bin'
+INDEX_FILE = 'index.json'
+
+def to_days(dates: typing.Union[typing.List[str], pd.Series, np.ndarray]) -> np.ndarray:
+    '''
+    Converts dates to the number of days since 1970-01-01
+
+    Args:
+        dates (typing.Union[typing.List[str], pd.Series, np.ndarray]): dates or date strings
+    Returns:
+        days (np.ndarray): int32 day numbers
+    '''
+    return pd.to_datetime(np.asarray(dates)).to_numpy('datetime64[D]').astype(np.int32)
+
+def build_price_store(price_path: str, store_dir: str) -> None:
+    '''
+    Writes the daily closes as two flat binary files (int32 day numbers and float64
+    closes) sorted by ticker and date, so that each ticker occupies a contiguous
+    slice, plus an index with the offset and length of every ticker
+
+    Args:
+        price_path (str): path to the price history with ticker, date and price columns
+        store_dir (str): folder to save the price store
+    Returns:
+        None
+    '''
+    try:
+        prices = pd.read_csv(price_path, usecols=['ticker', 'date', 'price'])
+    except ValueError as error:
+        logger.error('The price history does not contain the required columns: %s', error)
+        raise error
+    prices = prices.dropna().drop_duplicates(['ticker', 'date'])
+    prices['day'] = to_days(prices['date'])
+    prices = prices.sort_values(['ticker', 'day'], ignore_index=True)
+
+    os.makedirs(store_dir, exist_ok=True)
+    prices['day'].to_numpy(np.int32).tofile(os.path.join(store_dir, DAYS_FILE))
+    prices['price'].to_numpy(np.float64).tofile(os.path.join(store_dir, CLOSES_FILE))
+    lengths = prices.groupby('ticker', sort=True).size()
+    offsets = np.concatenate([[0], np.cumsum(lengths.to_numpy())[:-1]])
+    with open(os.path.join(store_dir, INDEX_FILE), 'w', encoding='utf8') as file:
+        json.dump({'tickers': lengths.index.tolist(),
+                   'offsets': offsets.tolist(),
+                   'lengths': lengths.tolist()}, file)
+    logger.info('Price store with %i closes of %i tickers saved to %s',
+                len(prices), len(lengths), store_dir)
+
+class PriceStore:
+    '''Class that opens a price store folder with np.memmap (only the pages that are
+    read get loaded) and resolves arrays of (ticker, date) pairs in one call'''
+
+    def __init__(self, store_dir, in_memory=False):
+        '''Initialize class for PriceStore
+        Args:
+            self
+            store_dir (str): folder written by build_price_store
+            in_memory (bool): read the whole arrays into memory instead of mapping them
+        Returns:
+            None
+        '''
+        with open(os.path.join(store_dir, INDEX_FILE), 'r', encoding='utf8') as file:
+            index = json.load(file)
+        self.tickers = pd.Index(index['tickers'])
+        self.offsets = np.asarray(index['offsets'], dtype=np.int64)
+        self.lengths = np.asarray(index['lengths'], dtype=np.int64)
+        if in_memory:
+            self.days = np.fromfile(os.path.join(store_dir, DAYS_FILE), dtype=np.int32)
+            self.closes = np.fromfile(os.path.join(store_dir, CLOSES_FILE), dtype=np.float64)
+        elif self.lengths.sum():
+            self.days = np.memmap(os.path.join(store_dir, DAYS_FILE), dtype=np.int32, mode='r')
+            self.closes = np.memmap(os.path.join(store_dir, CLOSES_FILE),
+                                    dtype=np.float64, mode='r')
+        else:
+            self.days = np.empty(0, dtype=np.int32)
+            self.closes = np.empty(0, dtype=np.float64)
+
+    def lookup(self, tickers, dates, asof=False):
+        '''Returns the close of every (ticker, date) pair
+        Args:
+            self
+            tickers (typing.List[str]): ticker of every pair
+            dates (typing.List[str]): date of every pair
+            asof (bool): use the last close on or before the date when the date itself
+            has no close (e.g. weekends and holidays)
+        Returns:
+            closes (np.ndarray): float64 closes, NaN where the price is not available
+        '''
+        codes = self.tickers.get_indexer(np.asarray(tickers, dtype=object))
+        days = to_days(dates)
+        closes = np.full(len(codes), np.nan)
+        # group the pairs by ticker, then binary search inside each ticker's slice
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(self.tickers) + 1))
+        for code in np.flatnonzero(np.diff(bounds)):
+            rows = order[bounds[code]:bounds[code + 1]]
+            start = self.offsets[code]
+            segment = self.days[start:start + self.lengths[code]]
+            position = np.searchsorted(segment, days[rows], side='right') - 1
+            found = position >= 0
+            if not asof:
+                found &= segment[np.maximum(position, 0)] == days[rows]
+            closes[rows[found]] = self.closes[start + position[found]]
+        return closes
+
+    def latest(self, ticker, date=None):
+        '''Returns the last close of a ticker on or before a date
+        Args:
+            self
+            ticker (str): ticker symbol
+            date (str): date of the price (the last stored close when not provided)
+        Returns:
+            close (float): closing price, NaN if the ticker is not in the store
+        '''
+        if date is None:
+            code = self.tickers.get_indexer([ticker])[0]
+            if code < 0 or self.lengths[code] == 0:
+                return np.nan
+            return float(self.closes[self.offsets[code] + self.lengths[code] - 1])
+        return float(self.lookup([ticker], [date], asof=True)[0])
+
+class PriceIndex:
+    '''Class that serves the price store from memory for the Flask app. A background
+    thread reloads the store every `refresh_interval` seconds if it was rebuilt, so
+    that a prediction never waits for the disk or the price API'''
+
+    def __init__(self, store_dir, refresh_interval=300):
+        '''Initialize class for PriceIndex, load the store and start the refresh thread
+        Args:
+            self
+            store_dir (str): folder written by build_price_store
+            refresh_interval (float): seconds between two checks for a rebuilt store
+        Returns:
+            None
+        '''
+        self.store_dir = store_dir
+        self.refresh_interval = refresh_interval
+        self.store = None
+        self.version = None
+        self.refresh()
+        self.thread = None
+        self.start()
+
+    def start(self):
+        '''Starts the refresh thread, e.g. again in a forked worker process after the
+        parent called close()'''
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='price-index', daemon=True)
+        self.thread.start()
+
+    def refresh(self):
+        '''Reloads the store if its index file changed since the last load
+        Returns:
+            reloaded (bool): True if a new store was loaded
+        '''
+        try:
+            version = os.path.getmtime(os.path.join(self.store_dir, INDEX_FILE))
+            if version == self.version:
+                return False
+            store = PriceStore(self.store_dir, in_memory=True)
+        except (OSError, ValueError) as error:
+            logger.warning('Price store in %s could not be loaded: %s', self.store_dir, error)
+            return False
+        # replace the whole store at once so that lookups never see a partial reload
+        self.store, self.version = store, version
+        logger.info('Price index loaded with %i closes of %i tickers',
+                    len(store.closes), len(store.tickers))
+        return True
+
+    def run(self):
+        '''Checks for a rebuilt store until close() is called'''
+        while not self.stopped.wait(self.refresh_interval):
+            self.refresh()
+
+    def price(self, ticker, date=None):
+        '''Returns the last close of a ticker on or before a date
+        Args:
+            self
+            ticker (str): ticker symbol
+            date (str): date of the price (the last stored close when not provided)
+        Returns:
+            close (float): closing price, NaN if the ticker or the store is not available
+        '''
+        store = self.store
+        if store is None:
+            return np.nan
+        return store.latest(ticker, date)
+
+    def close(self):
+        '''Stops the refresh thread'''
+        self.stopped.set()
+        self.thread.join()
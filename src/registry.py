@@ -0,0 +1,217 @@
+"""
+This module keeps a local registry of the trained models: every registered model gets a
+numbered version folder with its artifacts, the training metrics and metadata, and any
+version can be promoted to the paths served by the app
+"""
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import typing
+from datetime import datetime
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# files making up a version folder
+ARTIFACT_FILES = ['model.pkl', 'encoder.pkl', 'scaler.pkl']
+METADATA_FILE = 'metadata.json'
+# training profile of the drift monitor, promoted with the artifacts
+PROFILE_FILE = 'training_profile.json'
+
+def read_metrics(results_path: str) -> dict:
+    '''
+    Reads the headline metrics written by the train function
+
+    Args:
+        results_path (str): path to the yaml file with model evaluation results
+    Returns:
+        metrics (dict): AUC, log loss and accuracy (empty if the file does not exist)
+    '''
+    try:
+        with open(results_path, 'r', encoding='utf8') as file:
+            results = yaml.load(file, Loader=yaml.FullLoader) or []
+    except (FileNotFoundError, TypeError):
+        return {}
+    metrics = {}
+    for item in results:
+        if isinstance(item, dict) and 'AUC' in item:
+            metrics['AUC'] = float(item['AUC'])
+            metrics['Log Loss'] = float(item['Log Loss'])
+        elif isinstance(item, dict) and 'accuracy' in item:
+            metrics['Accuracy'] = float(item['accuracy'])
+    return metrics
+
+def list_versions(registry_dir: str) -> typing.List[dict]:
+    '''
+    Reads the metadata of every registered version
+
+    Args:
+        registry_dir (str): folder of the registry
+    Returns:
+        versions (typing.List[dict]): metadata of the versions, oldest first
+    '''
+    if not os.path.isdir(registry_dir):
+        return []
+    versions = []
+    for name in sorted(os.listdir(registry_dir)):
+        path = os.path.join(registry_dir, name, METADATA_FILE)
+        if name.startswith('v') and os.path.exists(path):
+            with open(path, 'r', encoding='utf8') as file:
+                versions.append(json.load(file))
+    return sorted(versions, key=lambda metadata: metadata['version'])
+
+def version_dir(registry_dir: str, version: typing.Union[int, str] = 'latest') -> str:
+    '''
+    Finds the folder of a version
+
+    Args:
+        registry_dir (str): folder of the registry
+        version (typing.Union[int, str]): version number, or "latest"
+    Returns:
+        path (str): folder with the artifacts of the version
+    '''
+    if version == 'latest':
+        versions = list_versions(registry_dir)
+        if not versions:
+            raise FileNotFoundError(f'No model registered in {registry_dir}')
+        version = versions[-1]['version']
+    path = os.path.join(registry_dir, f'v{int(version):04d}')
+    if not os.path.exists(os.path.join(path, METADATA_FILE)):
+        raise FileNotFoundError(f'Version {version} is not registered in {registry_dir}')
+    return path
+
+def register_model(registry_dir: str,
+                   model: typing.Any,
+                   encoder: typing.Any,
+                   scaler: typing.Any,
+                   results_path: str = None,
+                   params: dict = None,
+                   profile: dict = None) -> int:
+    '''
+    Saves the artifacts in a new version folder. The folder is written under a
+    temporary name and renamed once complete, so a version is never seen half-written
+
+    Args:
+        registry_dir (str): folder of the registry
+        model (typing.Any): fitted classifier
+        encoder (typing.Any): fitted One-Hot encoder
+        scaler (typing.Any): fitted Standard Scaler
+        results_path (str): path to the yaml file with the metrics of the model
+        params (dict): training settings kept in the metadata
+        profile (dict): distribution of the app inputs in the training data (see
+        drift.build_profile)
+    Returns:
+        version (int): number of the new version
+    '''
+    os.makedirs(registry_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.staging-', dir=registry_dir)
+    for name, artifact in zip(ARTIFACT_FILES, [model, encoder, scaler]):
+        with open(os.path.join(staging, name), 'wb') as file:
+            pickle.dump(artifact, file)
+    if profile is not None:
+        with open(os.path.join(staging, PROFILE_FILE), 'w', encoding='utf8') as file:
+            json.dump(profile, file)
+    versions = list_versions(registry_dir)
+    version = versions[-1]['version'] + 1 if versions else 1
+    while True:
+        metadata = {'version': version,
+                    'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+                    'model_class': type(model).__name__,
+                    'n_features': int(getattr(scaler, 'n_features_in_', 0)),
+                    'metrics': read_metrics(results_path),
+                    'params': params or {}}
+        with open(os.path.join(staging, METADATA_FILE), 'w', encoding='utf8') as file:
+            json.dump(metadata, file, indent=1, default=str)
+        try:
+            # another run may have taken the number meanwhile, then take the next one
+            os.rename(staging, os.path.join(registry_dir, f'v{version:04d}'))
+            break
+        except OSError:
+            version += 1
+    logger.info('Model registered as version %i in %s', version, registry_dir)
+    return version
+
+def load_version(registry_dir: str,
+                 version: typing.Union[int, str] = 'latest') -> typing.Tuple[typing.Any,
+                                                                             typing.Any,
+                                                                             typing.Any,
+                                                                             dict]:
+    '''
+    Loads the artifacts of a version
+
+    Args:
+        registry_dir (str): folder of the registry
+        version (typing.Union[int, str]): version number, or "latest"
+    Returns:
+        model (typing.Any): fitted classifier
+        encoder (typing.Any): fitted One-Hot encoder
+        scaler (typing.Any): fitted Standard Scaler
+        metadata (dict): metadata of the version
+    '''
+    path = version_dir(registry_dir, version)
+    artifacts = []
+    for name in ARTIFACT_FILES + [METADATA_FILE]:
+        if name == METADATA_FILE:
+            with open(os.path.join(path, name), 'r', encoding='utf8') as file:
+                artifacts.append(json.load(file))
+        else:
+            with open(os.path.join(path, name), 'rb') as file:
+                artifacts.append(pickle.load(file))
+    return tuple(artifacts)
+
+def promote(registry_dir: str,
+            version: typing.Union[int, str],
+            model_path: str,
+            encoder_path: str,
+            scaler_path: str,
+            profile_path: str = None) -> int:
+    '''
+    Copies the artifacts of a version to the paths served by the app, with its training
+    profile so that the drift monitor compares the inputs with the data of the served
+    model. Every file is copied next to its target first and then renamed over it, so
+    the app never reads a partially written file
+
+    Args:
+        registry_dir (str): folder of the registry
+        version (typing.Union[int, str]): version number, or "latest"
+        model_path (str): path of the served model
+        encoder_path (str): path of the served encoder
+        scaler_path (str): path of the served scaler
+        profile_path (str): path of the training profile read by the app
+    Returns:
+        version (int): number of the promoted version
+    '''
+    path = version_dir(registry_dir, version)
+    names = list(ARTIFACT_FILES)
+    targets = [model_path, encoder_path, scaler_path]
+    if profile_path and os.path.exists(os.path.join(path, PROFILE_FILE)):
+        names.append(PROFILE_FILE)
+        targets.append(profile_path)
+    elif profile_path:
+        logger.warning('Version %s has no training profile, %s is left as it is',
+                       version, profile_path)
+    served = [os.stat(target).st_mtime_ns for target in targets[:3] if os.path.exists(target)]
+    for name, target in zip(names, targets):
+        shutil.copyfile(os.path.join(path, name), target + '.promote')
+    # the app reloads when the newest artifact changes: the copies keep the time of the
+    # served files, so no reload starts before all of them are replaced
+    for target in targets[:3]:
+        if served:
+            os.utime(target + '.promote', ns=(max(served), max(served)))
+    # the profile goes first, it is read again when the artifacts are reloaded
+    for target in targets[3:] + targets[:3]:
+        os.replace(target + '.promote', target)
+    now = time.time_ns()
+    for target in targets[:3]:
+        os.utime(target, ns=(now, now))
+    with open(os.path.join(path, METADATA_FILE), 'r', encoding='utf8') as file:
+        metadata = json.load(file)
+    metadata['promoted_at'] = datetime.utcnow().isoformat(timespec='seconds')
+    with open(os.path.join(path, METADATA_FILE), 'w', encoding='utf8') as file:
+        json.dump(metadata, file, indent=1, default=str)
+    logger.info('Version %i promoted to %s', metadata['version'], model_path)
+    return metadata['version']
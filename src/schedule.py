@@ -0,0 +1,324 @@
+"""
+This module runs the pipeline steps on configured intervals from a single long-running
+process: every job is a list of run.py commands run in order, jobs that are due run
+concurrently unless they share a resource, and a lock file keeps a second scheduler
+from running the same jobs at the same time. One lock file per resource also keeps the
+steps started from the command line (e.g. by run-pipeline.sh) from overlapping a job
+"""
+import concurrent.futures
+import fcntl
+import json
+import logging
+import os
+import signal
+import threading
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+# seconds per interval unit, e.g. "30m", "1h", "1d", "1w"
+INTERVAL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+def parse_interval(every: typing.Union[int, float, str]) -> float:
+    '''
+    Converts an interval to seconds
+
+    Args:
+        every (typing.Union[int, float, str]): seconds, or a number followed by one of
+        s, m, h, d, w (e.g. "6h")
+    Returns:
+        seconds (float): length of the interval in seconds
+    '''
+    if isinstance(every, (int, float)):
+        seconds = float(every)
+    else:
+        every = str(every).strip()
+        try:
+            seconds = float(every[:-1]) * INTERVAL_UNITS[every[-1]]
+        except (KeyError, ValueError) as error:
+            logger.error('Unable to parse the interval "%s"', every)
+            raise ValueError(f'Interval "{every}" is not a number of '
+                             f'{", ".join(INTERVAL_UNITS)}') from error
+    if seconds <= 0:
+        raise ValueError(f'Interval "{every}" must be positive')
+    return seconds
+
+class PipelineLock:
+    '''Class that holds an exclusive lock on a file while the scheduler runs, so that a
+    second scheduler started on the same data stops instead of running the same jobs.
+    The lock is released by the operating system if the process dies'''
+
+    def __init__(self, lock_path):
+        '''Initialize class for PipelineLock
+        Args:
+            self
+            lock_path (str): path to the lock file
+        Returns:
+            None
+        '''
+        self.lock_path = lock_path
+        self.file = None
+
+    def __enter__(self):
+        '''Takes the lock, or raises RuntimeError if another process holds it'''
+        directory = os.path.dirname(self.lock_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.lock_path, 'a+', encoding='utf8')  # pylint: disable=consider-using-with
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError as error:
+            self.file.seek(0)
+            holder = self.file.read().strip() or 'unknown'
+            self.file.close()
+            logger.error('Lock %s is held by process %s', self.lock_path, holder)
+            raise RuntimeError(f'Another scheduler (pid {holder}) holds {self.lock_path}') \
+                from error
+        self.file.truncate(0)
+        self.file.write(str(os.getpid()))
+        self.file.flush()
+        return self
+
+    def __exit__(self, *exc):
+        '''Releases the lock'''
+        self.file.truncate(0)
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+class ResourceLocks:
+    '''Class that holds exclusive locks on one file per resource, taken by the scheduled
+    jobs and by the steps run from the command line, so that a step never runs over a
+    job writing the same data. The locks are taken in sorted order, waiting for the
+    process holding them, and released by the operating system if the process dies'''
+
+    def __init__(self, lock_dir, resources):
+        '''Initialize class for ResourceLocks
+        Args:
+            self
+            lock_dir (str): folder of the lock files (None to take no lock)
+            resources (typing.Iterable[str]): names of the resources to lock
+        Returns:
+            None
+        '''
+        self.lock_dir = lock_dir
+        self.resources = sorted(set(resources)) if lock_dir else []
+        self.files = []
+
+    def __enter__(self):
+        '''Takes the locks, waiting while another process holds one of them'''
+        if self.resources:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        for resource in self.resources:
+            path = os.path.join(self.lock_dir, f'{resource}.lock')
+            file = open(path, 'a+', encoding='utf8')  # pylint: disable=consider-using-with
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                file.seek(0)
+                logger.info('Waiting for "%s", in use by process %s', resource,
+                            file.read().strip() or 'unknown')
+                fcntl.flock(file, fcntl.LOCK_EX)
+            file.truncate(0)
+            file.write(str(os.getpid()))
+            file.flush()
+            self.files.append(file)
+        return self
+
+    def __exit__(self, *exc):
+        '''Releases the locks'''
+        for file in reversed(self.files):
+            file.truncate(0)
+            fcntl.flock(file, fcntl.LOCK_UN)
+            file.close()
+        self.files = []
+
+def step_resources(jobs: dict, step: str) -> typing.List[str]:
+    '''
+    Finds the resources used by a step, i.e. those of every job running the step
+
+    Args:
+        jobs (dict): jobs as described in Scheduler
+        step (str): name of the run.py step (e.g. "clean")
+    Returns:
+        resources (typing.List[str]): sorted names of the resources (empty if no job
+        runs the step)
+    '''
+    return sorted({resource for job in jobs.values()
+                   if any(command.split()[0] == step for command in job['steps'])
+                   for resource in job.get('resources', [])})
+
+class Scheduler:
+    '''Class that starts the jobs when they are due. The jobs run in a thread pool of the
+    scheduler process, so the imported modules and the database and S3 clients stay
+    loaded between runs. A job is never started while its previous run is in progress,
+    and jobs sharing a resource (e.g. the cleaned data) run one after the other'''
+
+    def __init__(self, jobs, run_command, state_path=None, max_workers=4,
+                 resource_lock_dir=None):
+        '''Initialize class for Scheduler
+        Args:
+            self
+            jobs (dict): for every job name, "every" (interval), "steps" (list of run.py
+            commands), and optionally "resources" (list of names) and "run_at_start"
+            (run when the scheduler starts instead of one interval later)
+            run_command (typing.Callable[[str], None]): runs one run.py command
+            state_path (str): path to the json file with the last start of every job,
+            so that a restarted scheduler keeps the intervals
+            max_workers (int): maximum number of jobs running at once
+            resource_lock_dir (str): folder of the lock files shared with the steps run
+            from the command line (None to lock the resources within this process only)
+        Returns:
+            None
+        '''
+        self.resource_lock_dir = resource_lock_dir
+        self.jobs = {name: dict(job, every=parse_interval(job['every']),
+                                resources=sorted(job.get('resources', [])))
+                     for name, job in jobs.items()}
+        self.run_command = run_command
+        self.state_path = state_path
+        self.resource_locks = {resource: threading.Lock() for job in self.jobs.values()
+                               for resource in job['resources']}
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers,
+                                                              thread_name_prefix='job')
+        self.running = {}
+        self.state_lock = threading.Lock()
+        self.state = self.load_state()
+        now = time.time()
+        self.next_run = {}
+        for name, job in self.jobs.items():
+            last_start = self.state.get(name, {}).get('last_start')
+            if last_start is not None:
+                self.next_run[name] = last_start + job['every']
+            else:
+                self.next_run[name] = now if job.get('run_at_start') else now + job['every']
+
+    def load_state(self) -> dict:
+        '''Reads the last runs saved by save_state (empty if there is no state file)'''
+        try:
+            with open(self.state_path, 'r', encoding='utf8') as file:
+                return json.load(file)
+        except (FileNotFoundError, TypeError):
+            return {}
+
+    def save_state(self) -> None:
+        '''Writes the last runs, renamed into place so a crash never leaves half a file'''
+        if not self.state_path:
+            return
+        with open(self.state_path + '.tmp', 'w', encoding='utf8') as file:
+            json.dump(self.state, file, indent=1)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def run_job(self, name: str) -> bool:
+        '''
+        Runs the steps of a job in order, once the resources of the job are free. A
+        failed step stops the job until its next run
+
+        Args:
+            name (str): name of the job
+        Returns:
+            succeeded (bool): False if a step raised an error
+        '''
+        job = self.jobs[name]
+        locks = [self.resource_locks[resource] for resource in job['resources']]
+        for lock in locks:
+            lock.acquire()
+        start = time.time()
+        status = 'ok'
+        command = None
+        try:
+            with ResourceLocks(self.resource_lock_dir, job['resources']):
+                logger.info('Job "%s" started', name)
+                for command in job['steps']:
+                    step_start = time.perf_counter()
+                    self.run_command(command)
+                    logger.info('Job "%s": "%s" done in %.1fs', name, command,
+                                time.perf_counter() - step_start)
+        except Exception as error:  # pylint: disable=broad-except
+            status = 'failed'
+            logger.exception('Job "%s" failed at "%s": %s', name, command, error)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        with self.state_lock:
+            self.state[name] = {'last_start': start, 'status': status,
+                                'seconds': round(time.time() - start, 3)}
+            self.save_state()
+        logger.info('Job "%s" %s in %.1fs', name, status, time.time() - start)
+        return status == 'ok'
+
+    def run_pending(self, now: float = None) -> typing.List[str]:
+        '''
+        Starts the jobs that are due and not running
+
+        Args:
+            now (float): current time (time.time() when not provided)
+        Returns:
+            started (typing.List[str]): names of the jobs started
+        '''
+        now = time.time() if now is None else now
+        started = []
+        for name, job in self.jobs.items():
+            if self.next_run[name] > now:
+                continue
+            if name in self.running and not self.running[name].done():
+                logger.warning('Job "%s" is due but its previous run is in progress', name)
+            else:
+                self.running[name] = self.executor.submit(self.run_job, name)
+                started.append(name)
+            # keep the schedule: skip the runs missed while the job was running or down
+            while self.next_run[name] <= now:
+                self.next_run[name] += job['every']
+        return started
+
+    def run_forever(self, stop: threading.Event, tick: float = 1.0) -> None:
+        '''
+        Starts the due jobs every `tick` seconds until `stop` is set, then waits for the
+        running jobs to finish
+
+        Args:
+            stop (threading.Event): set to stop the scheduler
+            tick (float): seconds between two checks of the due jobs
+        Returns:
+            None
+        '''
+        while not stop.is_set():
+            self.run_pending()
+            stop.wait(tick)
+        logger.info('Scheduler stopping, waiting for %i running jobs',
+                    sum(not future.done() for future in self.running.values()))
+        self.executor.shutdown(wait=True)
+
+def run_schedule(run_command: typing.Callable[[str], None],
+                 jobs: dict,
+                 lock_path: str,
+                 state_path: str = None,
+                 max_workers: int = 4,
+                 tick: float = 1.0,
+                 resource_lock_dir: str = None) -> None:
+    '''
+    Runs the jobs on their intervals until SIGTERM or SIGINT, holding the lock file
+
+    Args:
+        run_command (typing.Callable[[str], None]): runs one run.py command
+        jobs (dict): jobs as described in Scheduler
+        lock_path (str): path to the lock file
+        state_path (str): path to the json file with the last start of every job
+        max_workers (int): maximum number of jobs running at once
+        tick (float): seconds between two checks of the due jobs
+        resource_lock_dir (str): folder of the lock files shared with the steps run from
+        the command line
+    Returns:
+        None
+    '''
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    with PipelineLock(lock_path):
+        scheduler = Scheduler(jobs, run_command, state_path, max_workers, resource_lock_dir)
+        for name, job in scheduler.jobs.items():
+            logger.info('Job "%s" every %.0fs, next run at %s: %s', name, job['every'],
+                        time.strftime('%Y-%m-%d %H:%M:%S',
+                                      time.localtime(scheduler.next_run[name])),
+                        job['steps'])
+        scheduler.run_forever(stop, tick)
@@ -0,0 +1,187 @@
+"""
+This module scores a sample of the app requests against a candidate model of the registry.
+The request only draws the sample and queues the inputs, the candidate is scored by a
+background thread, and the agreement with the served model and the latency of both models
+are logged
+"""
+import collections
+import logging
+import queue
+import random
+import threading
+import time
+import typing
+import numpy as np
+
+from src.registry import load_version
+from src.train import predict_ind
+
+logger = logging.getLogger(__name__)
+
+class ShadowScorer:
+    '''Class that scores a fraction of the predictions again with a candidate model from a
+    background thread. Requests are dropped when more than `max_queue` wait, so the
+    candidate never slows down the served predictions'''
+
+    def __init__(self, registry_dir, version=None, fraction=0.1, max_queue=1000,
+                 log_every=100, threshold=0.5, seed=None):
+        '''Initialize class for ShadowScorer and start the scoring thread
+        Args:
+            self
+            registry_dir (str): folder of the model registry
+            version (typing.Union[int, str]): candidate version, "latest", or None to
+            disable shadow scoring
+            fraction (float): share of the requests scored by the candidate
+            max_queue (int): maximum number of requests waiting to be scored
+            log_every (int): number of scored requests between two summaries in the log
+            threshold (float): probability above which a prediction is an increase
+            seed (int): seed of the sampling, for reproducible tests
+        Returns:
+            None
+        '''
+        self.fraction = fraction
+        self.max_queue = max_queue
+        self.log_every = log_every
+        self.threshold = threshold
+        self.random = random.Random(seed)
+        self.candidate = None
+        self.version = None
+        self.closed = True
+        if version is not None:
+            try:
+                *self.candidate, metadata = load_version(registry_dir, version)
+                self.version = metadata['version']
+                logger.info('Shadow scoring %.0f%% of the requests with version %i',
+                            100 * fraction, self.version)
+            except FileNotFoundError as error:
+                logger.error('Shadow scoring disabled: %s', error)
+        self.start()
+
+    def start(self):
+        '''Opens a new queue and scoring thread. Called by __init__, and again in a forked
+        worker process after the parent closed the scorer
+        Args:
+            self
+        Returns:
+            None
+        '''
+        if not self.closed or self.candidate is None:
+            return
+        self.requests = queue.Queue(maxsize=self.max_queue)
+        self.stopping = threading.Event()
+        # submit() is called from the request threads of the app
+        self.dropped_lock = threading.Lock()
+        self.scored = 0
+        self.agreed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.total_difference = 0.0
+        # latencies of the recent requests, in seconds, for the percentiles
+        self.latencies = {'served': collections.deque(maxlen=1000),
+                          'candidate': collections.deque(maxlen=1000)}
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name='shadow-scorer', daemon=True)
+        self.thread.start()
+
+    def submit(self, cat_inputs, trans_price, probability, seconds):
+        '''Queues a served prediction for the candidate if it is drawn in the sample
+        Args:
+            self
+            cat_inputs (typing.Dict[str, str]): categorical inputs keyed by column name
+            trans_price (float): price of stock on day of trade
+            probability (float): probability returned by the served model
+            seconds (float): time taken by the served model
+        Returns:
+            queued (bool): True if the candidate will score the request
+        '''
+        if self.closed or self.random.random() >= self.fraction:
+            return False
+        try:
+            self.requests.put_nowait((cat_inputs, trans_price, probability, seconds))
+        except queue.Full:
+            with self.dropped_lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def score(self, cat_inputs, trans_price, probability, seconds):
+        '''Scores one request with the candidate and updates the agreement statistics
+        Args:
+            self
+            cat_inputs (typing.Dict[str, str]): categorical inputs keyed by column name
+            trans_price (float): price of stock on day of trade
+            probability (float): probability returned by the served model
+            seconds (float): time taken by the served model
+        Returns:
+            None
+        '''
+        start = time.perf_counter()
+        try:
+            candidate = predict_ind(*self.candidate, cat_inputs, trans_price)
+        except Exception as error:  # pylint: disable=broad-except
+            self.failed += 1
+            logger.debug('Candidate unable to score %s: %s', cat_inputs, error)
+            return
+        self.latencies['candidate'].append(time.perf_counter() - start)
+        self.latencies['served'].append(seconds)
+        self.scored += 1
+        self.agreed += (candidate > self.threshold) == (probability > self.threshold)
+        self.total_difference += abs(candidate - probability)
+        if self.scored % self.log_every == 0:
+            logger.info('Shadow version %i: %s', self.version, self.stats())
+
+    def stats(self) -> typing.Dict[str, float]:
+        '''Summarizes the requests scored so far
+        Args:
+            self
+        Returns:
+            stats (typing.Dict[str, float]): counts, agreement rate, mean absolute
+            difference of the probabilities and latency percentiles in milliseconds
+        '''
+        stats = {'scored': self.scored, 'dropped': self.dropped, 'failed': self.failed,
+                 'agreement': self.agreed / self.scored if self.scored else None,
+                 'mean_abs_difference': (self.total_difference / self.scored
+                                         if self.scored else None)}
+        for name, latencies in self.latencies.items():
+            if latencies:
+                p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+                stats[f'{name}_p50_ms'] = round(float(p50), 3)
+                stats[f'{name}_p95_ms'] = round(float(p95), 3)
+        return stats
+
+    def run(self):
+        '''Scores the queued requests until close() sets the stop event'''
+        while not self.stopping.is_set():
+            request = self.requests.get()
+            if request is not None:
+                self.score(*request)
+        # score what is left after the stop signal, while close() waits
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                self.score(*request)
+
+    def close(self, timeout=10.0):
+        '''Stops sampling and waits until the queued requests are scored, at most
+        `timeout` seconds
+        Args:
+            self
+            timeout (float): maximum seconds to wait for the scoring thread
+        Returns:
+            None
+        '''
+        if self.closed:
+            return
+        self.closed = True
+        self.stopping.set()
+        try:
+            # wakes up the thread if it waits for a request
+            self.requests.put_nowait(None)
+        except queue.Full:
+            # a full queue never makes the thread wait, it sees the event at once
+            pass
+        self.thread.join(timeout)
+        logger.info('Shadow scoring closed: %s', self.stats())
@@ -0,0 +1,202 @@
+"""
+This module generates synthetic Stockwatcher and stock price data, so that the
+cleaning, training and app stages can be exercised at scale without the APIs
+"""
+import logging
+import typing
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# columns of the data returned by the House Stockwatcher API
+STOCKWATCHER_COLUMNS = ['disclosure_year', 'disclosure_date', 'transaction_date', 'owner',
+                        'ticker', 'asset_description', 'type', 'amount', 'representative',
+                        'district', 'ptr_link', 'cap_gains_over_200_usd']
+
+# columns kept for the recent transactions table
+RECENT_COLUMNS = ['representative', 'transaction_date', 'ticker',
+                  'asset_description', 'amount', 'type']
+
+def make_names(given: typing.List[str], count: int, template: str) -> np.ndarray:
+    '''
+    Extends a list of real names with generated names up to the requested count
+
+    Args:
+        given (typing.List[str]): names to use first
+        count (int): total number of names needed
+        template (str): format string used for the generated names
+    Returns:
+        names (np.ndarray): array with `count` names
+    '''
+    names = list(given)[:count]
+    names += [template.format(i) for i in range(len(names), count)]
+    return np.array(names, dtype=object)
+
+def make_prices(tickers: np.ndarray,
+                dates: pd.DatetimeIndex,
+                rng: np.random.Generator,
+                volatility: float = 0.02) -> pd.core.frame.DataFrame:
+    '''
+    Simulates daily closing prices for every ticker as a geometric random walk
+
+    Args:
+        tickers (np.ndarray): ticker symbols
+        dates (pd.DatetimeIndex): trading days
+        rng (np.random.Generator): random number generator
+        volatility (float): standard deviation of the daily log returns
+    Returns:
+        prices (pd.core.frame.DataFrame): DataFrame with ticker, date and price columns
+    '''
+    start = rng.uniform(10, 500, size=(len(tickers), 1))
+    steps = rng.normal(0.0003, volatility, size=(len(tickers), len(dates)))
+    closes = start * np.exp(np.cumsum(steps, axis=1))
+    return pd.DataFrame({'ticker': np.repeat(tickers, len(dates)),
+                         'date': np.tile(dates.strftime('%Y-%m-%d').to_numpy(), len(tickers)),
+                         'price': closes.ravel().round(2)})
+
+def make_transactions(n_rows: int,
+                      tickers: np.ndarray,
+                      representatives: np.ndarray,
+                      dates: pd.DatetimeIndex,
+                      owner_probs: typing.Dict[str, float],
+                      type_probs: typing.Dict[str, float],
+                      amount_probs: typing.Dict[str, float],
+                      missing_owner_frac: float,
+                      dup_frac: float,
+                      rng: np.random.Generator) -> pd.core.frame.DataFrame:
+    '''
+    Draws a chunk of transactions with the layout of the Stockwatcher data
+
+    Args:
+        n_rows (int): number of transactions (duplicates included)
+        tickers (np.ndarray): ticker symbols to draw from
+        representatives (np.ndarray): names of the representatives to draw from
+        dates (pd.DatetimeIndex): possible transaction dates
+        owner_probs (typing.Dict[str, float]): relative frequency of each owner
+        type_probs (typing.Dict[str, float]): relative frequency of each transaction type
+        amount_probs (typing.Dict[str, float]): relative frequency of each amount bracket
+        missing_owner_frac (float): fraction of rows with the '--' owner placeholder
+        dup_frac (float): fraction of rows that are exact copies of another row
+        rng (np.random.Generator): random number generator
+    Returns:
+        data (pd.core.frame.DataFrame): DataFrame with the Stockwatcher columns
+    '''
+    def draw(probs: typing.Dict[str, float]) -> np.ndarray:
+        values = np.array(list(probs), dtype=object)
+        weights = np.array(list(probs.values()), dtype=float)
+        return values[rng.choice(len(values), n_rows, p=weights / weights.sum())]
+
+    # a few representatives and tickers trade much more than the rest
+    rep_weights = rng.pareto(1.5, len(representatives)) + 1
+    ticker_weights = rng.pareto(1.5, len(tickers)) + 1
+    rep_idx = rng.choice(len(representatives), n_rows, p=rep_weights / rep_weights.sum())
+    trans_dates = dates[rng.integers(0, len(dates), n_rows)]
+    disc_dates = trans_dates + pd.to_timedelta(rng.integers(1, 45, n_rows), unit='D')
+
+    owner = draw(owner_probs)
+    owner[rng.random(n_rows) < missing_owner_frac] = '--'
+
+    data = pd.DataFrame({'disclosure_year': disc_dates.year,
+                         'disclosure_date': disc_dates.strftime('%m/%d/%Y'),
+                         'transaction_date': trans_dates.strftime('%Y-%m-%d'),
+                         'owner': owner,
+                         'ticker': tickers[rng.choice(len(tickers), n_rows,
+                                                      p=ticker_weights / ticker_weights.sum())],
+                         'asset_description': 'Common Stock',
+                         'type': draw(type_probs),
+                         'amount': draw(amount_probs),
+                         'representative': representatives[rep_idx],
+                         'district': 'D' + pd.Series(rep_idx % 50).astype(str),
+                         'ptr_link': 'https://disclosures-clerk.house.gov/ptr/' +
+                                     pd.Series(rng.integers(1e7, 1e8, n_rows)).astype(str),
+                         'cap_gains_over_200_usd': False})
+
+    # overwrite a fraction of the rows with copies of other rows
+    n_dups = int(n_rows * dup_frac)
+    if n_dups:
+        rows = np.arange(n_rows)
+        rows[rng.choice(n_rows, n_dups, replace=False)] = rng.integers(0, n_rows, n_dups)
+        data = data.iloc[rows].reset_index(drop=True)
+    return data
+
+def generate_data(stockwatcher_path: str,
+                  transact_price_path: str,
+                  current_price_path: str,
+                  recent_path: str,
+                  n_rows: int,
+                  n_tickers: int,
+                  n_representatives: int,
+                  owner_probs: typing.Dict[str, float],
+                  type_probs: typing.Dict[str, float],
+                  amount_probs: typing.Dict[str, float],
+                  missing_owner_frac: float = 0.1,
+                  dup_frac: float = 0.02,
+                  missing_price_frac: float = 0.0,
+                  tickers: typing.List[str] = (),
+                  representatives: typing.List[str] = (),
+                  start_date: str = '2019-01-01',
+                  end_date: str = '2022-05-31',
+                  current_date: str = '2022-06-01',
+                  chunksize: int = 1_000_000,
+                  seed: int = 29,
+                  price_history_path: str = None) -> None:
+    '''
+    Writes synthetic stockwatcher, transact_price, current_price, recent_transactions
+    and price_history files with the same layout as the files created by the
+    acquire_new stage. The transactions are written in chunks so that millions of rows
+    can be generated without holding them all in memory
+
+    Args:
+        stockwatcher_path (str): path to save the transaction data
+        transact_price_path (str): path to save the transaction-day stock prices
+        current_price_path (str): path to save the current-day stock prices
+        recent_path (str): path to save the recent transactions (None to skip)
+        n_rows (int): number of transactions
+        n_tickers (int): number of distinct tickers
+        n_representatives (int): number of distinct representatives
+        owner_probs (typing.Dict[str, float]): relative frequency of each owner
+        type_probs (typing.Dict[str, float]): relative frequency of each transaction type
+        amount_probs (typing.Dict[str, float]): relative frequency of each amount bracket
+        missing_owner_frac (float): fraction of rows with the '--' owner placeholder
+        dup_frac (float): fraction of rows that are exact copies of another row
+        missing_price_frac (float): fraction of (ticker, date) prices left out
+        tickers (typing.List[str]): real tickers to use before generated ones
+        representatives (typing.List[str]): real names to use before generated ones
+        start_date (str): first possible transaction date
+        end_date (str): last possible transaction date
+        current_date (str): date of the current-day stock prices
+        chunksize (int): number of transactions generated and written at a time
+        seed (int): random seed
+        price_history_path (str): path to save every daily close (None to skip)
+    Returns:
+        None
+    '''
+    rng = np.random.default_rng(seed)
+    tickers = make_names(tickers, n_tickers, 'SYN{}')
+    representatives = make_names(representatives, n_representatives, 'Hon. Synthetic Member {}')
+    dates = pd.bdate_range(start_date, end_date)
+
+    prices = make_prices(tickers, dates.append(pd.DatetimeIndex([current_date])), rng)
+    is_current = prices['date'] == current_date
+    transact_price = prices[~is_current]
+    if missing_price_frac:
+        transact_price = transact_price[rng.random(len(transact_price)) >= missing_price_frac]
+    transact_price.to_csv(transact_price_path, index=False)
+    prices[is_current].to_csv(current_price_path, index=False)
+    logger.info('Synthetic stock prices saved to %s and %s',
+                transact_price_path, current_price_path)
+    if price_history_path:
+        prices.to_csv(price_history_path, index=False)
+        logger.info('Synthetic price history saved to %s', price_history_path)
+
+    for start in range(0, n_rows, chunksize):
+        chunk = make_transactions(min(chunksize, n_rows - start), tickers, representatives,
+                                  dates, owner_probs, type_probs, amount_probs,
+                                  missing_owner_frac, dup_frac, rng)
+        mode, header = ('w', True) if start == 0 else ('a', False)
+        chunk.to_csv(stockwatcher_path, index=False, mode=mode, header=header)
+        if recent_path:
+            chunk[RECENT_COLUMNS].to_csv(recent_path, index=False, mode=mode, header=header)
+        logger.debug('%i of %i synthetic transactions written', start + len(chunk), n_rows)
+    logger.info('Synthetic transaction data saved to %s', stockwatcher_path)
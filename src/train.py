@@ -5,28 +5,128 @@ This module contains functions to:
 3. Get the model, scaler, and encoder from specified paths
 4. Transform user-input into an input accepted by the model
 5. Make prediction on a single row of user input after transforming
+6. Search the Logistic Regression hyperparameters with parallel cross-validation
+7. Train an SGD classifier incrementally on chunks of data that do not fit in memory
+8. Warm-start retraining of a saved model when new transactions arrive
+9. Train one model per ticker in parallel and route the predictions by ticker
+10. Register the trained artifacts as a new version of the local model registry
+11. Save the training distribution of the app inputs for the drift monitor
 """
 import logging
+import multiprocessing
+import os
 import warnings
 import pickle
+import time
 import typing
 import pandas as pd
 import numpy as np
 import yaml
+import matplotlib
+from joblib import Parallel, delayed
+from sklearn.base import clone
 from sklearn.model_selection import train_test_split
+from sklearn.model_selection import StratifiedKFold, ParameterGrid
 from sklearn.preprocessing import OneHotEncoder
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import roc_auc_score
 from sklearn.metrics import log_loss
 from sklearn.metrics import classification_report
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import ConfusionMatrixDisplay, RocCurveDisplay
-import matplotlib.pyplot as plt
-import sklearn.linear_model as sk
-import sklearn.preprocessing as skp
+matplotlib.use('Agg')  # render to files only, no display needed
+import matplotlib.pyplot as plt  # pylint: disable=wrong-import-position
+import sklearn.linear_model as sk  # pylint: disable=wrong-import-position
+import sklearn.preprocessing as skp  # pylint: disable=wrong-import-position
+from src.clean import (split_amount, parse_amount,  # pylint: disable=wrong-import-position
+                       amount_bounds, AMOUNT_COLUMNS)
+from src.vocab import read_encoded  # pylint: disable=wrong-import-position
+from src.registry import register_model  # pylint: disable=wrong-import-position
+from src.drift import build_profile, save_profile  # pylint: disable=wrong-import-position
 
 logger = logging.getLogger(__name__)
 
+# penalties supported by each Logistic Regression solver
+SOLVER_PENALTIES = {'lbfgs': ['l2', 'none'],
+                    'newton-cg': ['l2', 'none'],
+                    'sag': ['l2', 'none'],
+                    'liblinear': ['l1', 'l2'],
+                    'saga': ['l1', 'l2', 'none']}
+
+# category of the missing values of the streamed chunks, the same in every pass
+MISSING_CATEGORY = 'undisclosed'
+
+def encode_features(data: pd.core.frame.DataFrame,
+                    categ: typing.List[str],
+                    response: str,
+                    enc: typing.Optional[skp._encoders.OneHotEncoder] = None
+                    ) -> typing.Tuple[skp._encoders.OneHotEncoder,
+                                      pd.core.frame.DataFrame,
+                                      np.ndarray]:
+    '''
+    One-Hot encodes the categorical columns and appends the remaining
+    (numeric) columns to obtain the feature matrix used for modeling
+
+    Args:
+        data (pd.core.frame.DataFrame): cleaned data with features and response
+        categ (typing.List[str]): list of column names representing categorical features
+        response (str): column name of response variable
+        enc (skp._encoders.OneHotEncoder): already fitted encoder to reuse (fitted on
+        `data` when not provided)
+    Returns:
+        enc (skp._encoders.OneHotEncoder): fitted One-Hot encoder
+        features (pd.core.frame.DataFrame): encoded feature matrix
+        response (np.ndarray): array holding the response for each row
+    '''
+    if enc is None:
+        enc = OneHotEncoder().fit(data[categ])
+    dummy_categ = enc.transform(data[categ])
+    dummy_categ = pd.DataFrame(dummy_categ.toarray(), index=data.index)
+    features = pd.concat([dummy_categ, data.drop(categ+[response], axis=1)], axis=1)
+    features.columns = enc.get_feature_names_out().tolist() +\
+                         data.drop(categ+[response], axis=1).columns.to_list()
+    response = data[response].values.ravel()
+    return enc, features, response
+
+def fill_missing(data: pd.core.frame.DataFrame,
+                 categ: typing.List[str]) -> pd.core.frame.DataFrame:
+    '''
+    Replaces the missing values of the categorical columns by MISSING_CATEGORY, also in
+    the categorical columns decoded from the codes of the vocabulary
+
+    Args:
+        data (pd.core.frame.DataFrame): data with the categorical columns
+        categ (typing.List[str]): list of column names representing categorical features
+    Returns:
+        data (pd.core.frame.DataFrame): data without missing categorical values
+    '''
+    filled = {}
+    for col in categ:
+        column = data[col]
+        if not column.isna().any():
+            continue
+        if isinstance(column.dtype, pd.CategoricalDtype) and \
+                MISSING_CATEGORY not in column.cat.categories:
+            column = column.cat.add_categories([MISSING_CATEGORY])
+        filled[col] = column.fillna(MISSING_CATEGORY)
+    return data.assign(**filled) if filled else data
+
+def use_numeric_amount(data: pd.core.frame.DataFrame,
+                       categ: typing.List[str]) -> typing.Tuple[pd.core.frame.DataFrame,
+                                                                typing.List[str]]:
+    '''
+    Replaces the amount brackets by their numeric lower bound, upper bound and midpoint,
+    so that the amount is no longer One-Hot encoded
+
+    Args:
+        data (pd.core.frame.DataFrame): cleaned data with the amount column
+        categ (typing.List[str]): list of column names representing categorical features
+    Returns:
+        data (pd.core.frame.DataFrame): data with the numeric amount columns
+        categ (typing.List[str]): categorical columns without the amount
+    '''
+    return split_amount(data), [col for col in categ if col != 'amount']
+
 def train(local_path: str,
           categ: typing.List[str],
           response: str,
@@ -41,7 +141,15 @@ def train(local_path: str,
           max_iter: int,
           output_data_path:str,
           pred_path_1:str,
-          pred_path_2:str) -> None:
+          pred_path_2:str,
+          model_params: typing.Optional[dict] = None,
+          plot_async: bool = False,
+          vocab_path: str = None,
+          amount_numeric: bool = False,
+          registry_dir: str = None,
+          promote: bool = True,
+          profile_path: str = None,
+          tuned_params_path: str = None) -> None:
     '''
     This function One-Hot encodes & Standard Scales the data. Next, train-test split
     and model training steps are executed. Finally, all the modeling outputs get written to
@@ -63,24 +171,42 @@ def train(local_path: str,
         output_data_path (str): path to save x_train, x_test, y_train, y_test
         pred_path_1 (str): path to save predicted classes
         pred_path_2 (str): path to save predicted probabilities
+        model_params (dict): additional Logistic Regression arguments (e.g. C, penalty,
+        solver), typically the best configuration found by the tune function
+        plot_async (bool): render the png images in a background process while the
+        other outputs are saved (joined before returning)
+        vocab_path (str): path to the vocabularies when the cleaned data holds integer
+        codes (see src/vocab.py)
+        amount_numeric (bool): use the numeric bounds of the amount brackets instead
+        of One-Hot encoding them
+        registry_dir (str): folder of the model registry, where the artifacts are saved
+        as a new version with the metrics of results_path (see src/registry.py)
+        promote (bool): also overwrite model_path, encoder_path and scaler_path (set it
+        to False to only register a candidate, e.g. for shadow scoring in the app)
+        profile_path (str): path to save the distribution of the app inputs in the
+        training data, used by the drift monitor of the app (see src/drift.py)
+        tuned_params_path (str): path to the results yaml written by the tune function,
+        whose best configuration is added to model_params
 
     Returns:
         None
     '''
+    if tuned_params_path:
+        model_params = {**(model_params or {}), **read_tuned_params(tuned_params_path)}
     try:
-        data = pd.read_csv(local_path)
+        data = read_encoded(local_path, vocab_path)
     except FileNotFoundError:
         logger.error("File %s not found at ", local_path)
         logger.debug("Check path in the configuration file")
-    enc = OneHotEncoder().fit(data[categ])
-    dummy_categ = enc.transform(data[categ])
-    dummy_categ = pd.DataFrame(dummy_categ.toarray())
-    features = pd.concat([dummy_categ, data.drop(categ+[response], axis=1)], axis=1)
-    features.columns = enc.get_feature_names_out().tolist() +\
-                         data.drop(categ+[response], axis=1).columns.to_list()
-    response = data[response].values.ravel()
+    profile = build_profile(data, categ) if profile_path or registry_dir else None
+    if profile_path and promote:
+        # profile of the served model only, a candidate must not replace it
+        save_profile(profile, profile_path)
+    if amount_numeric:
+        data, categ = use_numeric_amount(data, categ)
+    enc, features, response = encode_features(data, categ, response)
 
-    model, scaler, x_train, x_test, y_train, y_test = train_evaluate(features,
+    model, scaler, x_train, x_test, y_train, y_test, plotter = train_evaluate(features,
                                    response,
                                    results_path,
                                    matrix_path,
@@ -89,7 +215,9 @@ def train(local_path: str,
                                    random_state,
                                    max_iter,
                                    pred_path_1,
-                                   pred_path_2)
+                                   pred_path_2,
+                                   model_params,
+                                   plot_async)
 
     if output_data_path:
         pd.DataFrame(x_train).to_csv(output_data_path+"/x_train.csv", index=False)
@@ -98,7 +226,13 @@ def train(local_path: str,
         pd.DataFrame(y_test).to_csv(output_data_path+"/y_test.csv", index=False)
         logger.info("Data after train/test split saved in %s folder", output_data_path)
 
-    if model_path and encoder_path and scaler_path:
+    if registry_dir:
+        register_model(registry_dir, model, enc, scaler, results_path,
+                       {'local_path': local_path, 'categ': categ, 'model_params': model_params,
+                        'amount_numeric': amount_numeric, 'random_state': random_state},
+                       profile)
+
+    if model_path and encoder_path and scaler_path and promote:
         pickle.dump(model, open(model_path, "wb"))
         logger.info("Model saved to: %s", model_path)
         pickle.dump(enc, open(encoder_path, "wb"))
@@ -106,6 +240,12 @@ def train(local_path: str,
         pickle.dump(scaler, open(scaler_path, "wb"))
         logger.info("StandardScaler saved to: %s", scaler_path)
 
+    # the plots were rendered while the artifacts were saved, wait for them
+    if plotter is not None:
+        plotter.join()
+        if plotter.exitcode:
+            logger.error("Rendering the plots failed (exit code %i)", plotter.exitcode)
+
 def train_evaluate(features: pd.core.frame.DataFrame,
                    response: np.ndarray,
                    results_path: str,
@@ -115,9 +255,13 @@ def train_evaluate(features: pd.core.frame.DataFrame,
                    random_state: int,
                    max_iter: int,
                    pred_path_1: str,
-                   pred_path_2: str) -> typing.Tuple[typing.Union[sk._logistic.LogisticRegression,
-                                                   skp._data.StandardScaler,
-                                                   np.ndarray]]:
+                   pred_path_2: str,
+                   model_params: typing.Optional[dict] = None,
+                   plot_async: bool = False
+                   ) -> typing.Tuple[typing.Union[sk._logistic.LogisticRegression,
+                                                  skp._data.StandardScaler,
+                                                  np.ndarray,
+                                                  multiprocessing.Process]]:
     '''
     This function train-test splits the data, builds the model, evaluates the
     model performance, then outputs the ROCAUC Curve png, Confusion Matrix png,
@@ -134,6 +278,9 @@ def train_evaluate(features: pd.core.frame.DataFrame,
         max_iter (int): maximum number of iterations taken for the solvers to converge
         pred_path_1 (str): path for saving predicted classes
         pred_path_2 (str): path for saving predicted probabilities
+        model_params (dict): additional Logistic Regression arguments (e.g. C, penalty, solver)
+        plot_async (bool): render the png images in a background process, so that the
+        evaluation metrics yaml is available without waiting for the plots
 
     Returns:
         log_reg (sk._logistic.LogisticRegression): binary logistic regression classifier object
@@ -142,11 +289,14 @@ def train_evaluate(features: pd.core.frame.DataFrame,
         x_test (np.ndarray): independent variables in the test data
         y_train (np.ndarray): dependent variable in the training data
         y_test (np.ndarray): dependent variable in the test data
+        plotter (multiprocessing.Process): process rendering the plots with plot_async,
+        to be joined by the caller (None otherwise)
     '''
     x_train, x_test, y_train, y_test = train_test_split(features, response,
                                                         test_size=test_size,
                                                         random_state=random_state)
-    model = LogisticRegression(max_iter=max_iter,random_state=random_state)
+    model = LogisticRegression(max_iter=max_iter,random_state=random_state,
+                               **(model_params or {}))
     logger.debug("Model training")
     scaler = StandardScaler()
     scaled_x_train = scaler.fit_transform(x_train)
@@ -169,25 +319,60 @@ def train_evaluate(features: pd.core.frame.DataFrame,
     loss = log_loss(y_test, ypred_proba_test)
     creport = classification_report(y_test, ypred_bin_test,output_dict=True)
 
-    if matrix_path:
-        ConfusionMatrixDisplay.from_estimator(log_reg, x_test, y_test)
-        plt.savefig(matrix_path)
-        logger.info("Confusion matrix saved to: %s", matrix_path)
-    if roc_path:
-        RocCurveDisplay.from_estimator(log_reg, x_test, y_test)
-        plt.savefig(roc_path)
-        logger.info("AUCROC curve saved to: %s", roc_path)
-
     flat_list = [item for items in model.coef_.tolist() for item in items]
     coeffs = dict(zip(x_train.columns.tolist(), flat_list))
-    results = [creport,{"AUC": str(auc), "Log Loss": str(loss),"Coefficients" : coeffs}]
 
     if results_path:
-        with open(results_path, "w",encoding="utf8") as file:
-            yaml.dump(results, file)
+        # the entries of tune, backtest, etc. written to the same file are kept
+        update_results(results_path, creport)
+        update_results(results_path, {"AUC": str(auc), "Log Loss": str(loss),
+                                      "Coefficients" : coeffs})
         logger.info("Model results written to: %s", results_path)
 
-    return log_reg, scaler, x_train, x_test, y_train, y_test
+    # the plots reuse the test-set predictions computed above (no re-prediction)
+    plotter = None
+    if matrix_path or roc_path:
+        plot_args = (y_test, ypred_bin_test, ypred_proba_test[:, 1],
+                     matrix_path, roc_path, type(log_reg).__name__)
+        if plot_async:
+            plotter = multiprocessing.Process(target=save_plots, args=plot_args)
+            plotter.start()
+            logger.info("Rendering plots in a background process")
+        else:
+            save_plots(*plot_args)
+
+    return log_reg, scaler, x_train, x_test, y_train, y_test, plotter
+
+def save_plots(y_test: np.ndarray,
+               ypred_bin_test: np.ndarray,
+               ypred_proba_test: np.ndarray,
+               matrix_path: str,
+               roc_path: str,
+               name: str = None) -> None:
+    '''
+    Saves the Confusion Matrix and AUCROC Curve png images from already computed
+    test-set predictions. Figures are closed once saved so they do not accumulate
+
+    Args:
+        y_test (np.ndarray): dependent variable in the test data
+        ypred_bin_test (np.ndarray): predicted classes for the test data
+        ypred_proba_test (np.ndarray): predicted probability of the positive class
+        matrix_path (str): path to write png image with confusion matrix
+        roc_path (str): path to write png image with AUCROC curve
+        name (str): name of the classifier shown in the AUCROC curve legend
+    Returns:
+        None
+    '''
+    if matrix_path:
+        display = ConfusionMatrixDisplay.from_predictions(y_test, ypred_bin_test)
+        display.figure_.savefig(matrix_path)
+        plt.close(display.figure_)
+        logger.info("Confusion matrix saved to: %s", matrix_path)
+    if roc_path:
+        display = RocCurveDisplay.from_predictions(y_test, ypred_proba_test, name=name)
+        display.figure_.savefig(roc_path)
+        plt.close(display.figure_)
+        logger.info("AUCROC curve saved to: %s", roc_path)
 
 def get_model(model_path:str,
               encoder_path:str,
@@ -224,24 +409,36 @@ def get_model(model_path:str,
 
 def transform(encoder:skp._encoders.OneHotEncoder,
               scaler:skp._data.StandardScaler,
-              cat_inputs:typing.List[str],
+              cat_inputs:typing.Union[typing.List[str], typing.Dict[str, str]],
               trans_price:float) -> typing.List[typing.Union[int,float]]:
     '''
     Transforms raw input into one-hot encoded and standard scaled input for making
-    predictions using the Logistic Regression model
+    predictions using the Logistic Regression model. When the categorical inputs are
+    given by column name, the inputs are ordered as the encoder expects them, and the
+    amount is turned into its numeric bounds if the model was trained with them
 
     Args:
         encoder (skp._encoders.OneHotEncoder): encoder for categorical variables
         scaler (skp._data.StandardScaler): standard scaler for preprocessing
-        cat_inputs (typing.List[str]): categorical inputs of transaction
+        cat_inputs (typing.Union[typing.List[str], typing.Dict[str, str]]): categorical
+        inputs of transaction, in the order of the encoder or keyed by column name
         trans_price (float): stock price on the day of transaction
     Returns:
         test_new (typing.List[Union[int,float]]): encoded inputs for model prediction
     '''
+    numeric = {'trans_price': trans_price}
+    names = getattr(scaler, 'feature_names_in_', None)
+    if isinstance(cat_inputs, dict):
+        if names is not None and AMOUNT_COLUMNS[0] in names:
+            numeric.update(zip(AMOUNT_COLUMNS, amount_bounds(cat_inputs['amount'])))
+        cat_inputs = [cat_inputs[col] for col in encoder.feature_names_in_]
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
         test_new = encoder.transform([cat_inputs]).toarray()  # needs 2d array
-        test_new = np.append(test_new[0], trans_price)  # encoder returns 2d array, need element inside
+        # the numeric features follow the one-hot columns in the order the scaler saw
+        numeric = ([numeric[name] for name in names[test_new.shape[1]:]]
+                   if names is not None else [trans_price])
+        test_new = np.append(test_new[0], numeric)  # encoder returns 2d array, need element inside
         test_new = [test_new]  # predict function expects 2d arrray
         test_new = scaler.transform(test_new)
     return test_new
@@ -249,7 +446,7 @@ def transform(encoder:skp._encoders.OneHotEncoder,
 def predict_ind(model:sk._logistic.LogisticRegression,
                 encoder:skp._encoders.OneHotEncoder,
                 scaler:skp._data.StandardScaler,
-                cat_inputs: typing.List[str],
+                cat_inputs: typing.Union[typing.List[str], typing.Dict[str, str]],
                 trans_price:float) -> np.ndarray:
     '''
     Predicts the probabilities for a new row of input data provided by the user
@@ -258,12 +455,698 @@ def predict_ind(model:sk._logistic.LogisticRegression,
         model (sk._logistic.LogisticRegression): binary logistic regression model
         encoder (skp._encoders.OneHotEncoder): one-hot encoder for categorical variables
         scaler (skp._data.StandardScaler): standard scaler for preprocessing
-        cat_inputs (typing.List[str]): categorical inputs of stock transaction
+        cat_inputs (typing.Union[typing.List[str], typing.Dict[str, str]]): categorical
+        inputs of stock transaction, in the order of the encoder or keyed by column name
         trans_price (float): price of stock on day of trade
     Returns:
         prediction (numpy.ndarray): probability of short term increase in stock price
     '''
     test_new = transform(encoder, scaler, cat_inputs, trans_price)
+    if isinstance(model, ShardedModel):
+        ticker = (cat_inputs['ticker'] if isinstance(cat_inputs, dict) else
+                  cat_inputs[list(encoder.feature_names_in_).index('ticker')])
+        model = model.route(ticker)
     prediction = model.predict_proba(test_new)
     prediction = round(float(prediction[0][1]), 3)
     return prediction
+
+def predict_batch(model:sk._logistic.LogisticRegression,
+                  encoder:skp._encoders.OneHotEncoder,
+                  scaler:skp._data.StandardScaler,
+                  data:pd.core.frame.DataFrame) -> np.ndarray:
+    '''
+    Predicts the probabilities for many rows at once, with the same encoding as
+    transform: One-Hot columns first, then the numeric columns in the order the
+    scaler was fitted with
+
+    Args:
+        model (sk._logistic.LogisticRegression): binary logistic regression model
+        encoder (skp._encoders.OneHotEncoder): one-hot encoder for categorical variables
+        scaler (skp._data.StandardScaler): standard scaler for preprocessing
+        data (pd.core.frame.DataFrame): categorical columns of the encoder, amount and
+        trans_price (every category must be known to the encoder)
+    Returns:
+        probabilities (np.ndarray): probability of short term increase in stock price
+    '''
+    dummies = encoder.transform(data[list(encoder.feature_names_in_)]).toarray()
+    numeric = data[['trans_price']]
+    names = getattr(scaler, 'feature_names_in_', None)
+    if names is not None:
+        if AMOUNT_COLUMNS[0] in names:
+            numeric = pd.concat([numeric, parse_amount(data['amount'])], axis=1)
+        numeric = numeric[list(names[dummies.shape[1]:])]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        features = scaler.transform(np.hstack([dummies, numeric.to_numpy(float)]))
+        if isinstance(model, ShardedModel):
+            return model.predict_proba(features, data['ticker'].to_numpy())[:, 1]
+        return model.predict_proba(features)[:, 1]
+
+def cache_folds(features: pd.core.frame.DataFrame,
+                response: np.ndarray,
+                n_folds: int,
+                random_state: int) -> typing.List[typing.Tuple[np.ndarray]]:
+    '''
+    Splits the data into stratified cross-validation folds and standard scales
+    each fold once, so that the scaled arrays can be shared by every candidate
+    evaluated during the hyperparameter search
+
+    Args:
+        features (pd.core.frame.DataFrame): DataFrame holding encoded feature variables
+        response (np.ndarray): array holding responses for each row
+        n_folds (int): number of cross-validation folds
+        random_state (int): random state for shuffling the folds
+    Returns:
+        folds (typing.List[typing.Tuple[np.ndarray]]): list of
+        (x_train, y_train, x_valid, y_valid) tuples with scaled features
+    '''
+    folds = []
+    x_all = np.asarray(features, dtype=float)
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+    for train_idx, valid_idx in splitter.split(x_all, response):
+        scaler = StandardScaler().fit(x_all[train_idx])
+        folds.append((scaler.transform(x_all[train_idx]), response[train_idx],
+                      scaler.transform(x_all[valid_idx]), response[valid_idx]))
+    return folds
+
+def evaluate_candidate(params: dict,
+                       folds: typing.List[typing.Tuple[np.ndarray]],
+                       random_state: int,
+                       max_iter: int) -> dict:
+    '''
+    Fits a Logistic Regression model with the given hyperparameters on every
+    cached fold and returns the averaged validation metrics and the timing
+
+    Args:
+        params (dict): Logistic Regression arguments (C, penalty, solver)
+        folds (typing.List[typing.Tuple[np.ndarray]]): output of the cache_folds function
+        random_state (int): random state for training model
+        max_iter (int): maximum number of iterations taken for the solvers to converge
+    Returns:
+        result (dict): hyperparameters, mean AUC, mean log loss and fit time in seconds
+    '''
+    aucs, losses = [], []
+    start = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for x_train, y_train, x_valid, y_valid in folds:
+            model = LogisticRegression(max_iter=max_iter, random_state=random_state, **params)
+            model.fit(x_train, y_train)
+            proba = model.predict_proba(x_valid)
+            aucs.append(roc_auc_score(y_valid, proba[:, 1]))
+            losses.append(log_loss(y_valid, proba, labels=model.classes_))
+    return {'params': params,
+            'AUC': float(np.mean(aucs)),
+            'Log Loss': float(np.mean(losses)),
+            'Seconds': round(time.perf_counter() - start, 4)}
+
+def tune(local_path: str,
+         categ: typing.List[str],
+         response: str,
+         results_path: str,
+         test_size: float,
+         random_state: int,
+         max_iter: int,
+         param_grid: dict,
+         n_folds: int = 5,
+         n_jobs: int = -1,
+         vocab_path: str = None,
+         amount_numeric: bool = False) -> dict:
+    '''
+    Searches the C, penalty and solver of the Logistic Regression model with
+    cross-validation on the training split. The folds are encoded and scaled once
+    and the candidates are evaluated in parallel across all CPU cores. The best
+    configuration and the timing of every candidate get written to the results yaml
+
+    Args:
+        local_path (str): path to cleaned data
+        categ (typing.List[str]): list of column names representing categorical features
+        response (str): column name of response variable
+        results_path (str): path to the yaml file with model evaluation results
+        test_size (float): fraction of original data held out (never used for tuning)
+        random_state (int): random state for splitting data and training model
+        max_iter (int): maximum number of iterations taken for the solvers to converge
+        param_grid (dict): lists of values to search for C, penalty and solver
+        n_folds (int): number of cross-validation folds
+        n_jobs (int): number of worker processes (-1 uses all CPU cores)
+        vocab_path (str): path to the vocabularies when the cleaned data holds integer
+        codes (see src/vocab.py)
+        amount_numeric (bool): use the numeric bounds of the amount brackets instead
+        of One-Hot encoding them
+    Returns:
+        best (dict): best Logistic Regression arguments found by the search
+    '''
+    try:
+        data = read_encoded(local_path, vocab_path)
+    except FileNotFoundError:
+        logger.error("File %s not found at ", local_path)
+        logger.debug("Check path in the configuration file")
+    if amount_numeric:
+        data, categ = use_numeric_amount(data, categ)
+    _, features, response = encode_features(data, categ, response)
+    x_train, _, y_train, _ = train_test_split(features, response,
+                                              test_size=test_size,
+                                              random_state=random_state)
+    folds = cache_folds(x_train, y_train, n_folds, random_state)
+
+    # skip the penalty/solver combinations that sklearn does not support
+    candidates = [params for params in ParameterGrid(param_grid)
+                  if params.get('penalty', 'l2') in
+                  SOLVER_PENALTIES.get(params.get('solver', 'lbfgs'), [])]
+    logger.info("Evaluating %i candidates on %i folds", len(candidates), n_folds)
+
+    start = time.perf_counter()
+    results = Parallel(n_jobs=n_jobs)(delayed(evaluate_candidate)(params, folds,
+                                                                  random_state, max_iter)
+                                      for params in candidates)
+    wall_time = round(time.perf_counter() - start, 4)
+    best = max(results, key=lambda result: result['AUC'])
+    logger.info("Best parameters %s with AUC %.4f (search took %.2f seconds)",
+                best['params'], best['AUC'], wall_time)
+
+    if results_path:
+        update_results(results_path, {'Tuning': {'Best': best,
+                                                 'Candidates': results,
+                                                 'Wall Seconds': wall_time}})
+        logger.info("Tuning results written to: %s", results_path)
+    return best['params']
+
+def read_tuned_params(results_path: str) -> dict:
+    '''
+    Reads the best Logistic Regression arguments written by the tune function
+
+    Args:
+        results_path (str): path to the yaml file with model evaluation results
+    Returns:
+        params (dict): best configuration of the last search (empty without one)
+    '''
+    try:
+        with open(results_path, "r", encoding="utf8") as file:
+            results = yaml.load(file, Loader=yaml.FullLoader) or []
+    except FileNotFoundError:
+        results = []
+    for item in results:
+        if isinstance(item, dict) and 'Tuning' in item:
+            params = item['Tuning']['Best']['params']
+            logger.info("Using the tuned parameters %s from %s", params, results_path)
+            return params
+    logger.warning("No tuning results in %s, run tune first. Using model_params only",
+                   results_path)
+    return {}
+
+def update_results(results_path: str, entry: dict) -> None:
+    '''
+    Adds an entry to the model results yaml, replacing any previous entry with
+    the same key and keeping the other results already present in the file
+
+    Args:
+        results_path (str): path to the yaml file with model evaluation results
+        entry (dict): single-key dictionary to be added to the results
+    Returns:
+        None
+    '''
+    try:
+        with open(results_path, "r", encoding="utf8") as file:
+            results = yaml.load(file, Loader=yaml.FullLoader) or []
+    except FileNotFoundError:
+        results = []
+    results = [item for item in results
+               if not (isinstance(item, dict) and set(item) == set(entry))]
+    results.append(entry)
+    with open(results_path, "w", encoding="utf8") as file:
+        yaml.dump(results, file)
+
+def train_incremental(local_path: str,
+                      categ: typing.List[str],
+                      response: str,
+                      model_path: str,
+                      encoder_path: str,
+                      scaler_path: str,
+                      results_path: str,
+                      chunksize: int,
+                      n_epochs: int,
+                      random_state: int,
+                      alpha: float = 0.0001,
+                      vocab_path: str = None,
+                      amount_numeric: bool = False) -> None:
+    '''
+    Trains a logistic SGD classifier without loading the full cleaned data in memory.
+    The data is streamed in chunks: a first pass collects the categories for the
+    One-Hot encoder (missing values become MISSING_CATEGORY in every pass), a second
+    pass fits the Standard Scaler with partial_fit, and the remaining passes train the
+    model with partial_fit. The saved artifacts are compatible with the get_model and
+    predict_ind functions
+
+    Args:
+        local_path (str): path to cleaned data
+        categ (typing.List[str]): list of column names representing categorical features
+        response (str): column name of response variable
+        model_path (str): path to write pickle object with the SGD classifier
+        encoder_path (str): path to write pickle object with fitted One-Hot encoder
+        scaler_path (str): path to write pickle object with fitted Standard Scaler
+        results_path (str): path to write yaml file with progressive validation results
+        chunksize (int): number of rows read from the cleaned data at a time
+        n_epochs (int): number of passes over the data while training the model
+        random_state (int): random state for shuffling the chunks and training model
+        alpha (float): regularization strength of the SGD classifier
+        vocab_path (str): path to the vocabularies when the cleaned data holds integer
+        codes (see src/vocab.py)
+        amount_numeric (bool): use the numeric bounds of the amount brackets instead
+        of One-Hot encoding them
+    Returns:
+        None
+    '''
+    if amount_numeric:
+        categ = [col for col in categ if col != 'amount']
+    # pass 1: collect the categories of every categorical column
+    categories = {col: set() for col in categ}
+    try:
+        for chunk in read_encoded(local_path, vocab_path, usecols=categ, chunksize=chunksize):
+            chunk = fill_missing(chunk, categ)
+            for col in categ:
+                categories[col].update(chunk[col].unique())
+    except FileNotFoundError as error:
+        logger.error("File %s not found at ", local_path)
+        logger.debug("Check path in the configuration file")
+        raise error
+    categories = [sorted(categories[col]) for col in categ]
+    seed_row = pd.DataFrame({col: [cats[0]] for col, cats in zip(categ, categories)})
+    enc = OneHotEncoder(categories=categories).fit(seed_row)
+    logger.info("OneHotEncoder fitted with %i categories",
+                sum(len(cats) for cats in categories))
+
+    # pass 2: fit the scaler on the encoded chunks
+    scaler = StandardScaler()
+    for chunk in read_encoded(local_path, vocab_path, chunksize=chunksize):
+        chunk = fill_missing(chunk, categ)
+        if amount_numeric:
+            chunk = split_amount(chunk)
+        scaler.partial_fit(encode_features(chunk, categ, response, enc)[1])
+    logger.info("StandardScaler fitted on %i rows", scaler.n_samples_seen_)
+
+    # remaining passes: train the model, tracking the progressive validation loss
+    # (each chunk is scored before the model learns from it)
+    model = SGDClassifier(loss='log_loss', alpha=alpha, random_state=random_state)
+    rng = np.random.default_rng(random_state)
+    classes = np.array([0, 1])
+    epochs = []
+    for epoch in range(n_epochs):
+        start = time.perf_counter()
+        seen, loss_sum = 0, 0.0
+        for chunk in read_encoded(local_path, vocab_path, chunksize=chunksize):
+            chunk = fill_missing(chunk.iloc[rng.permutation(len(chunk))], categ)
+            if amount_numeric:
+                chunk = split_amount(chunk)
+            _, features, labels = encode_features(chunk, categ, response, enc)
+            scaled = scaler.transform(features)
+            if hasattr(model, 'coef_'):
+                loss_sum += log_loss(labels, model.predict_proba(scaled),
+                                     labels=classes) * len(labels)
+                seen += len(labels)
+            model.partial_fit(scaled, labels, classes=classes)
+        epochs.append({'Epoch': epoch + 1,
+                       'Progressive Log Loss': float(loss_sum / seen) if seen else None,
+                       'Seconds': round(time.perf_counter() - start, 4)})
+        logger.info("Epoch %i of %i completed", epoch + 1, n_epochs)
+
+    if results_path:
+        update_results(results_path, {'Incremental': epochs})
+        logger.info("Incremental training results written to: %s", results_path)
+
+    if model_path and encoder_path and scaler_path:
+        pickle.dump(model, open(model_path, "wb"))
+        logger.info("Model saved to: %s", model_path)
+        pickle.dump(enc, open(encoder_path, "wb"))
+        logger.info("OneHotEncoder saved to: %s", encoder_path)
+        pickle.dump(scaler, open(scaler_path, "wb"))
+        logger.info("StandardScaler saved to: %s", scaler_path)
+
+def extend_encoder(encoder: skp._encoders.OneHotEncoder,
+                   data: pd.core.frame.DataFrame,
+                   categ: typing.List[str]) -> skp._encoders.OneHotEncoder:
+    '''
+    Creates a One-Hot encoder that keeps the categories (and their order) of a
+    previously fitted encoder and appends the new values found in the data (missing
+    values count as MISSING_CATEGORY)
+
+    Args:
+        encoder (skp._encoders.OneHotEncoder): previously fitted encoder
+        data (pd.core.frame.DataFrame): new data with the categorical columns
+        categ (typing.List[str]): list of column names representing categorical features
+    Returns:
+        enc (skp._encoders.OneHotEncoder): encoder fitted with the extended categories
+    '''
+    data = fill_missing(data, categ)
+    categories = []
+    for col, known in zip(categ, encoder.categories_):
+        known = list(known)
+        new = sorted(set(data[col].unique()) - set(known))
+        if new:
+            logger.info("Adding %i new categories to the '%s' column", len(new), col)
+        categories.append(known + new)
+    return OneHotEncoder(categories=categories).fit(data[categ])
+
+def transfer_coefficients(model: typing.Union[sk._logistic.LogisticRegression,
+                                              sk._stochastic_gradient.SGDClassifier],
+                          old_scaler: skp._data.StandardScaler,
+                          new_scaler: skp._data.StandardScaler,
+                          feature_names: typing.List[str]) -> typing.Tuple[np.ndarray,
+                                                                           np.ndarray]:
+    '''
+    Maps the coefficients of a saved model onto the feature layout and scaling of
+    the new training data. The coefficients are first expressed on the unscaled
+    features, then rescaled with the new scaler; new features start at zero
+
+    Args:
+        model (sk._logistic.LogisticRegression): previously trained model
+        old_scaler (skp._data.StandardScaler): scaler the model was trained with
+        new_scaler (skp._data.StandardScaler): scaler fitted on the new training data
+        feature_names (typing.List[str]): names of the features in the new layout
+    Returns:
+        coef (np.ndarray): initial coefficients with shape (1, n_features)
+        intercept (np.ndarray): initial intercept with shape (1,)
+    '''
+    raw_coef = model.coef_[0] / old_scaler.scale_
+    raw_intercept = model.intercept_[0] - np.sum(raw_coef * old_scaler.mean_)
+    old_index = {name: i for i, name in enumerate(old_scaler.feature_names_in_)}
+    new_raw_coef = np.array([raw_coef[old_index[name]] if name in old_index else 0.0
+                             for name in feature_names])
+    coef = new_raw_coef * new_scaler.scale_
+    intercept = raw_intercept + np.sum(new_raw_coef * new_scaler.mean_)
+    return coef.reshape(1, -1), np.array([intercept])
+
+def retrain_warm(local_path: str,
+                 categ: typing.List[str],
+                 response: str,
+                 model_path: str,
+                 encoder_path: str,
+                 scaler_path: str,
+                 results_path: str,
+                 test_size: float,
+                 random_state: int,
+                 max_iter: int,
+                 compare_cold: bool = True,
+                 vocab_path: str = None,
+                 amount_numeric: bool = False) -> None:
+    '''
+    Retrains the saved model on the latest cleaned data, continuing the optimization
+    from the prior coefficients instead of starting from scratch. The encoder is
+    extended with any new tickers/representatives. Optionally, a cold fit is run on
+    the same split so that the iterations and time saved can be reported along with
+    the AUC and log loss of both models
+
+    Args:
+        local_path (str): path to cleaned data
+        categ (typing.List[str]): list of column names representing categorical features
+        response (str): column name of response variable
+        model_path (str): path of the pickled model (read, then overwritten)
+        encoder_path (str): path of the pickled One-Hot encoder (read, then overwritten)
+        scaler_path (str): path of the pickled Standard Scaler (read, then overwritten)
+        results_path (str): path to the yaml file with model evaluation results
+        test_size (float): fraction of original data to split into test set
+        random_state (int): random state for training model
+        max_iter (int): maximum number of iterations taken for the solvers to converge
+        compare_cold (bool): whether to also fit a model from scratch for comparison
+        vocab_path (str): path to the vocabularies when the cleaned data holds integer
+        codes (see src/vocab.py)
+        amount_numeric (bool): use the numeric bounds of the amount brackets instead
+        of One-Hot encoding them
+    Returns:
+        None
+    '''
+    if not os.path.exists(model_path):
+        logger.error("No prior model found at %s. Run get_model first", model_path)
+        raise FileNotFoundError(model_path)
+    prior_model, prior_enc, prior_scaler = get_model(model_path, encoder_path, scaler_path)
+    if isinstance(prior_model, ShardedModel):
+        logger.error("The model at %s is sharded. Run get_model_sharded instead", model_path)
+        raise ValueError("Warm start is not supported for sharded models")
+    if getattr(prior_model, 'solver', None) == 'liblinear':
+        # liblinear ignores warm_start, the "warm" fit would silently start from scratch
+        logger.error("The model at %s uses the liblinear solver, which cannot be warm "
+                     "started. Select another solver in model_params", model_path)
+        raise ValueError("Warm start is not supported by the liblinear solver")
+    try:
+        data = read_encoded(local_path, vocab_path)
+    except FileNotFoundError:
+        logger.error("File %s not found at ", local_path)
+        logger.debug("Check path in the configuration file")
+    if amount_numeric:
+        data, categ = use_numeric_amount(data, categ)
+    if list(getattr(prior_enc, 'feature_names_in_', categ)) != categ:
+        logger.error("The saved encoder was fitted on %s, not on %s. Check amount_numeric",
+                     list(prior_enc.feature_names_in_), categ)
+        raise ValueError("Categorical columns differ from the ones of the saved model")
+    data = fill_missing(data, categ)
+    enc = extend_encoder(prior_enc, data, categ)
+    _, features, response = encode_features(data, categ, response, enc)
+    x_train, x_test, y_train, y_test = train_test_split(features, response,
+                                                        test_size=test_size,
+                                                        random_state=random_state)
+    scaler = StandardScaler().fit(x_train)
+    x_train = pd.DataFrame(scaler.transform(x_train), index=x_train.index,
+                           columns=x_train.columns)
+    x_test = pd.DataFrame(scaler.transform(x_test), index=x_test.index,
+                          columns=x_test.columns)
+    coef, intercept = transfer_coefficients(prior_model, prior_scaler, scaler,
+                                            x_train.columns.tolist())
+
+    def fit(warm: bool) -> typing.Tuple[typing.Any, dict]:
+        model = clone(prior_model)
+        start = time.perf_counter()
+        if isinstance(model, SGDClassifier):
+            model.set_params(max_iter=max_iter)
+            if warm:
+                model.fit(x_train, y_train, coef_init=coef, intercept_init=intercept)
+            else:
+                model.fit(x_train, y_train)
+        else:
+            model.set_params(max_iter=max_iter, warm_start=warm)
+            if warm:
+                model.coef_, model.intercept_ = coef, intercept
+            model.fit(x_train, y_train)
+        seconds = time.perf_counter() - start
+        proba = model.predict_proba(x_test)
+        return model, {'Iterations': int(np.max(model.n_iter_)),
+                       'Seconds': round(seconds, 4),
+                       'AUC': str(roc_auc_score(y_test, proba[:, 1])),
+                       'Log Loss': str(log_loss(y_test, proba, labels=model.classes_))}
+
+    model, warm_report = fit(warm=True)
+    report = {'Warm': warm_report}
+    logger.info("Warm-start fit converged in %i iterations", warm_report['Iterations'])
+    if compare_cold:
+        _, cold_report = fit(warm=False)
+        report['Cold'] = cold_report
+        report['Iterations Saved'] = cold_report['Iterations'] - warm_report['Iterations']
+        report['Seconds Saved'] = round(cold_report['Seconds'] - warm_report['Seconds'], 4)
+        logger.info("Warm start saved %i iterations and %.3f seconds vs a cold fit",
+                    report['Iterations Saved'], report['Seconds Saved'])
+
+    if results_path:
+        update_results(results_path, {'Warm Start': report})
+        logger.info("Warm-start results written to: %s", results_path)
+
+    pickle.dump(model, open(model_path, "wb"))
+    logger.info("Model saved to: %s", model_path)
+    pickle.dump(enc, open(encoder_path, "wb"))
+    logger.info("OneHotEncoder saved to: %s", encoder_path)
+    pickle.dump(scaler, open(scaler_path, "wb"))
+    logger.info("StandardScaler saved to: %s", scaler_path)
+
+class ShardedModel:
+    '''Class that holds one classifier per ticker plus a default classifier for the
+    tickers without a shard. The shards share the encoder and scaler of the default
+    classifier, so a prediction is routed to its shard with one dictionary lookup'''
+
+    def __init__(self, models, default):
+        '''Initialize class for ShardedModel
+        Args:
+            self
+            models (dict): classifier of each ticker
+            default (sk._logistic.LogisticRegression): classifier for the other tickers
+        Returns:
+            None
+        '''
+        self.models = models
+        self.default = default
+        self.classes_ = default.classes_
+
+    def route(self, ticker):
+        '''Returns the classifier of a ticker
+        Args:
+            self
+            ticker (str): ticker symbol
+        Returns:
+            model (sk._logistic.LogisticRegression): shard of the ticker, or the default
+        '''
+        return self.models.get(ticker, self.default)
+
+    def predict_proba(self, features, tickers=None):
+        '''Predicts the class probabilities, routing every row to the shard of its ticker
+        Args:
+            self
+            features (np.ndarray): encoded and scaled features
+            tickers (np.ndarray): ticker of every row (the default classifier is used for
+            every row when not provided)
+        Returns:
+            probabilities (np.ndarray): probabilities of both classes for every row
+        '''
+        if tickers is None:
+            return self.default.predict_proba(features)
+        features = np.asarray(features)
+        probabilities = np.empty((len(features), len(self.classes_)))
+        values, codes = np.unique(np.asarray(tickers, dtype=object), return_inverse=True)
+        for code, ticker in enumerate(values):
+            rows = codes == code
+            probabilities[rows] = self.route(ticker).predict_proba(features[rows])
+        return probabilities
+
+def fit_shard(features: np.ndarray,
+              response: np.ndarray,
+              random_state: int,
+              max_iter: int,
+              model_params: dict = None) -> typing.Tuple[sk._logistic.LogisticRegression, float]:
+    '''
+    Fits the Logistic Regression model of one shard
+
+    Args:
+        features (np.ndarray): scaled features of the shard's training rows
+        response (np.ndarray): response of the shard's training rows
+        random_state (int): random state for training model
+        max_iter (int): maximum number of iterations taken for the solvers to converge
+        model_params (dict): additional Logistic Regression arguments
+    Returns:
+        model (sk._logistic.LogisticRegression): fitted model
+        seconds (float): fit time in seconds
+    '''
+    start = time.perf_counter()
+    model = LogisticRegression(max_iter=max_iter, random_state=random_state,
+                               **(model_params or {}))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model.fit(features, response)
+    return model, round(time.perf_counter() - start, 4)
+
+def score_rows(y_true: np.ndarray, proba: np.ndarray) -> dict:
+    '''Returns the AUC (None with a single class) and log loss of predicted probabilities'''
+    return {'AUC': float(roc_auc_score(y_true, proba[:, 1])) if len(set(y_true)) > 1 else None,
+            'Log Loss': float(log_loss(y_true, proba, labels=[0, 1]))}
+
+def train_sharded(local_path: str,
+                  categ: typing.List[str],
+                  response: str,
+                  results_path: str,
+                  model_path: str,
+                  encoder_path: str,
+                  scaler_path: str,
+                  test_size: float,
+                  random_state: int,
+                  max_iter: int,
+                  min_rows: int = 200,
+                  n_jobs: int = -1,
+                  model_params: dict = None,
+                  vocab_path: str = None,
+                  amount_numeric: bool = False) -> None:
+    '''
+    Trains one Logistic Regression model per ticker in parallel worker processes, plus
+    the single model over all tickers, which serves the tickers with fewer than
+    `min_rows` training rows. The data is encoded and scaled once for all the shards.
+    The fit times of both paths and the test metrics of every shard are written to the
+    results yaml, and the bundle is saved where get_model and the app expect the model
+
+    Args:
+        local_path (str): path to cleaned data
+        categ (typing.List[str]): list of column names representing categorical features
+        response (str): column name of response variable
+        results_path (str): path to the yaml file with model evaluation results
+        model_path (str): path to write pickle object with the ShardedModel bundle
+        encoder_path (str): path to write pickle object with fitted One-Hot encoder
+        scaler_path (str): path to write pickle object with fitted Standard Scaler
+        test_size (float): fraction of original data to split into test set
+        random_state (int): random state for splitting data and training model
+        max_iter (int): maximum number of iterations taken for the solvers to converge
+        min_rows (int): tickers with fewer training rows (or one class) get no shard
+        n_jobs (int): number of worker processes (-1 uses all CPU cores)
+        model_params (dict): additional Logistic Regression arguments
+        vocab_path (str): path to the vocabularies when the cleaned data holds integer
+        codes (see src/vocab.py)
+        amount_numeric (bool): use the numeric bounds of the amount brackets instead
+        of One-Hot encoding them
+    Returns:
+        None
+    '''
+    try:
+        data = read_encoded(local_path, vocab_path)
+    except FileNotFoundError as error:
+        logger.error("File %s not found at ", local_path)
+        logger.debug("Check path in the configuration file")
+        raise error
+    if amount_numeric:
+        data, categ = use_numeric_amount(data, categ)
+    tickers = data['ticker'].astype(object).to_numpy()
+    enc, features, response = encode_features(data, categ, response)
+    x_train, x_test, y_train, y_test, t_train, t_test = train_test_split(
+        features, response, tickers, test_size=test_size, random_state=random_state)
+    scaler = StandardScaler().fit(x_train)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        x_train = scaler.transform(x_train)
+        x_test = scaler.transform(x_test)
+
+    default, single_seconds = fit_shard(x_train, y_train, random_state, max_iter,
+                                        model_params)
+    logger.info("Single model fitted in %.2f seconds", single_seconds)
+
+    values, counts = np.unique(t_train, return_counts=True)
+    shards = [ticker for ticker, count in zip(values, counts)
+              if count >= min_rows and len(set(y_train[t_train == ticker])) > 1]
+    logger.info("Fitting %i ticker shards (%i tickers use the single model)",
+                len(shards), len(values) - len(shards))
+    start = time.perf_counter()
+    fitted = Parallel(n_jobs=n_jobs)(delayed(fit_shard)(x_train[t_train == ticker],
+                                                        y_train[t_train == ticker],
+                                                        random_state, max_iter, model_params)
+                                     for ticker in shards)
+    shard_wall = round(time.perf_counter() - start, 4)
+    model = ShardedModel({ticker: shard for ticker, (shard, _) in zip(shards, fitted)},
+                         default)
+    logger.info("%i shards fitted in %.2f seconds", len(shards), shard_wall)
+
+    report = []
+    for ticker, (_, seconds) in zip(shards, fitted):
+        rows = t_test == ticker
+        if rows.any():
+            shard_scores = score_rows(y_test[rows],
+                                      model.route(ticker).predict_proba(x_test[rows]))
+            single_scores = score_rows(y_test[rows], default.predict_proba(x_test[rows]))
+            report.append({'Ticker': str(ticker), 'Train Rows': int((t_train == ticker).sum()),
+                           'Test Rows': int(rows.sum()), 'Seconds': seconds,
+                           **shard_scores,
+                           'Single Model AUC': single_scores['AUC'],
+                           'Single Model Log Loss': single_scores['Log Loss']})
+    routed = score_rows(y_test, model.predict_proba(x_test, t_test))
+    single = score_rows(y_test, default.predict_proba(x_test))
+    if routed['AUC'] is None or single['AUC'] is None:
+        logger.info("Test AUC n/a, the test set holds a single class")
+    else:
+        logger.info("Test AUC %.4f with the shards vs %.4f with the single model",
+                    routed['AUC'], single['AUC'])
+
+    if results_path:
+        update_results(results_path, {'Sharded': {'Shards': report,
+                                                  'Routed': routed,
+                                                  'Single Model': single,
+                                                  'Single Model Seconds': single_seconds,
+                                                  'Shard Fit Seconds': float(sum(
+                                                      seconds for _, seconds in fitted)),
+                                                  'Shard Wall Seconds': shard_wall}})
+        logger.info("Sharded training results written to: %s", results_path)
+
+    if model_path and encoder_path and scaler_path:
+        pickle.dump(model, open(model_path, "wb"))
+        logger.info("Sharded model saved to: %s", model_path)
+        pickle.dump(enc, open(encoder_path, "wb"))
+        logger.info("OneHotEncoder saved to: %s", encoder_path)
+        pickle.dump(scaler, open(scaler_path, "wb"))
+        logger.info("StandardScaler saved to: %s", scaler_path)
@@ -0,0 +1,167 @@
+"""
+This module dictionary-encodes the string columns of the pipeline: every column has a
+persisted vocabulary, and the data is carried as integer codes into that vocabulary
+"""
+import json
+import logging
+import os
+import typing
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# string columns shared by the transactions, the features and the app
+VOCAB_COLUMNS = ['owner', 'ticker', 'type', 'amount', 'representative']
+
+def load_vocab(vocab_path: str) -> typing.Dict[str, typing.List[str]]:
+    '''
+    Reads the vocabularies saved by save_vocab
+
+    Args:
+        vocab_path (str): path to the json file with the vocabularies
+    Returns:
+        vocab (typing.Dict[str, typing.List[str]]): values of each column, where the
+        position of a value is its code (empty when the file does not exist yet)
+    '''
+    try:
+        with open(vocab_path, 'r', encoding='utf8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        logger.debug('No vocabulary at %s yet', vocab_path)
+        return {}
+
+def save_vocab(vocab: typing.Dict[str, typing.List[str]], vocab_path: str) -> None:
+    '''
+    Writes the vocabularies to a json file
+
+    Args:
+        vocab (typing.Dict[str, typing.List[str]]): values of each column
+        vocab_path (str): path to the json file with the vocabularies
+    Returns:
+        None
+    '''
+    directory = os.path.dirname(vocab_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(vocab_path, 'w', encoding='utf8') as file:
+        json.dump(vocab, file, indent=1)
+    logger.info('Vocabulary of %s saved to %s', list(vocab), vocab_path)
+
+def update_vocab(vocab: typing.Dict[str, typing.List[str]],
+                 data: pd.core.frame.DataFrame,
+                 columns: typing.List[str] = None) -> typing.Dict[str, typing.List[str]]:
+    '''
+    Appends the values not seen before to the vocabularies. Existing values keep
+    their position, so codes written earlier stay valid
+
+    Args:
+        vocab (typing.Dict[str, typing.List[str]]): current vocabularies
+        data (pd.core.frame.DataFrame): data with the string columns
+        columns (typing.List[str]): columns to encode (VOCAB_COLUMNS found in the data
+        when not provided)
+    Returns:
+        vocab (typing.Dict[str, typing.List[str]]): extended vocabularies
+    '''
+    if columns is None:
+        columns = [col for col in VOCAB_COLUMNS if col in data.columns]
+    vocab = {col: list(values) for col, values in vocab.items()}
+    for col in columns:
+        known = vocab.setdefault(col, [])
+        new = sorted(set(data[col].dropna().unique()) - set(known))
+        if new:
+            logger.debug('Adding %i values to the "%s" vocabulary', len(new), col)
+            known.extend(str(value) for value in new)
+    return vocab
+
+def encode_frame(data: pd.core.frame.DataFrame,
+                 vocab: typing.Dict[str, typing.List[str]]) -> pd.core.frame.DataFrame:
+    '''
+    Replaces the string columns that have a vocabulary by int32 codes
+    (-1 for missing or unknown values)
+
+    Args:
+        data (pd.core.frame.DataFrame): data with string or categorical columns
+        vocab (typing.Dict[str, typing.List[str]]): values of each column
+    Returns:
+        encoded (pd.core.frame.DataFrame): copy of the data with integer codes
+    '''
+    encoded = data.copy()
+    for col, values in vocab.items():
+        if col in encoded.columns:
+            column = encoded[col]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                # map the few categories, then take the integer codes of every row
+                mapping = pd.Index(values).get_indexer(column.cat.categories)
+                codes = np.append(mapping, -1)[column.cat.codes.to_numpy()]
+            else:
+                codes = pd.Index(values).get_indexer(column)
+            encoded[col] = codes.astype(np.int32)
+    return encoded
+
+def decode_frame(data: pd.core.frame.DataFrame,
+                 vocab: typing.Dict[str, typing.List[str]]) -> pd.core.frame.DataFrame:
+    '''
+    Turns the integer codes back into categorical columns without parsing any string
+
+    Args:
+        data (pd.core.frame.DataFrame): data with integer codes
+        vocab (typing.Dict[str, typing.List[str]]): values of each column
+    Returns:
+        data (pd.core.frame.DataFrame): the same data with categorical columns
+    '''
+    for col, values in vocab.items():
+        if col in data.columns:
+            data[col] = pd.Categorical.from_codes(data[col].to_numpy(), categories=values)
+    return data
+
+def save_encoded(data: pd.core.frame.DataFrame, save_path: str, vocab_path: str) -> None:
+    '''
+    Extends the persisted vocabulary with the data and saves the data as integer codes
+
+    Args:
+        data (pd.core.frame.DataFrame): data with the string columns
+        save_path (str): path to save the encoded DataFrame
+        vocab_path (str): path to the json file with the vocabularies
+    Returns:
+        None
+    '''
+    vocab = update_vocab(load_vocab(vocab_path), data)
+    save_vocab(vocab, vocab_path)
+    encode_frame(data, vocab).to_csv(save_path, index=False)
+    logger.info('Encoded DataFrame saved to: %s', save_path)
+
+def read_encoded(local_path: str,
+                 vocab_path: str = None,
+                 **kwargs) -> typing.Union[pd.core.frame.DataFrame,
+                                           typing.Iterator[pd.core.frame.DataFrame]]:
+    '''
+    Reads a csv file written by save_encoded (or a plain csv file when no
+    vocabulary is given), decoding the codes to categorical columns
+
+    Args:
+        local_path (str): path to the csv file
+        vocab_path (str): path to the json file with the vocabularies
+        **kwargs: arguments passed on to pd.read_csv (e.g. chunksize)
+    Returns:
+        data (pd.core.frame.DataFrame): decoded data, or an iterator of decoded chunks
+        when a chunksize is given
+    '''
+    data = pd.read_csv(local_path, **kwargs)
+    if not vocab_path:
+        return data
+    vocab = load_vocab(vocab_path)
+    if 'chunksize' in kwargs:
+        return (decode_frame(chunk, vocab) for chunk in data)
+    return decode_frame(data, vocab)
+
+def memory_per_row(data: pd.core.frame.DataFrame) -> float:
+    '''
+    Measures the memory held by a DataFrame, strings included, per row
+
+    Args:
+        data (pd.core.frame.DataFrame): data to measure
+    Returns:
+        bytes_per_row (float): bytes used per row
+    '''
+    return float(data.memory_usage(deep=True).sum() / max(len(data), 1))
@@ -0,0 +1,249 @@
+"""
+This module defines the unit tests for acquire_new.py, against local fixture servers
+"""
+import gzip
+import http.server
+import io
+import json
+import socket
+import threading
+import time
+import pandas as pd
+import pytest
+import botocore.exceptions
+import requests
+
+from src import acquire_new
+
+# transactions in the layout of the House Stockwatcher API (the last one is reported twice)
+house_feed = [{'disclosure_year': 2021, 'disclosure_date': '03/02/2021',
+               'transaction_date': '2021-02-10', 'owner': 'joint', 'ticker': 'AAPL',
+               'asset_description': 'Apple Inc.', 'type': 'purchase',
+               'amount': '$1,001 - $15,000', 'representative': 'Hon. Nancy Pelosi',
+               'district': 'CA12', 'ptr_link': 'https://example.com/1',
+               'cap_gains_over_200_usd': False},
+              {'disclosure_year': 2021, 'disclosure_date': '03/05/2021',
+               'transaction_date': '2021-02-12', 'owner': 'self', 'ticker': 'XOM',
+               'asset_description': 'Exxon Mobil', 'type': 'sale_full',
+               'amount': '$15,001 - $50,000', 'representative': 'Hon. Rohit Khanna',
+               'district': 'CA17', 'ptr_link': 'https://example.com/2',
+               'cap_gains_over_200_usd': False}]
+house_feed.append(dict(house_feed[1]))
+
+# transactions in the layout of the Senate Stockwatcher API
+senate_feed = [{'transaction_date': '02/11/2021', 'owner': 'Spouse', 'ticker': 'MSFT',
+                'asset_description': 'Microsoft Corp', 'asset_type': 'Stock',
+                'type': 'Sale (Partial)', 'amount': '$50,001 - $100,000', 'comment': '--',
+                'senator': 'Thomas H Tuberville', 'ptr_link': 'https://example.com/3'},
+               {'transaction_date': '02/15/2021', 'owner': 'Self', 'ticker': 'AAPL',
+                'asset_description': 'Apple Inc.', 'asset_type': 'Stock',
+                'type': 'Purchase', 'amount': '$1,001 - $15,000', 'comment': '--',
+                'senator': 'Thomas H Tuberville', 'ptr_link': 'https://example.com/4'}]
+
+representatives = ['Hon. Nancy Pelosi', 'Hon. Rohit Khanna']
+tickers = ['AAPL', 'MSFT']
+
+@pytest.fixture
+def feed_server():
+    """
+    Starts local servers answering with a payload after a delay, or with errors first
+    """
+    servers = []
+    def start(payload, delay=0.0, failures=0):
+        state = {'failures': failures}
+        class Handler(http.server.BaseHTTPRequestHandler):
+            """Answers every GET with the payload"""
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Sends the payload, or a server error while failures remain"""
+                time.sleep(delay)
+                status = 503 if state['failures'] else 200
+                state['failures'] = max(state['failures'] - 1, 0)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args):
+                """Keeps the test output quiet"""
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f'http://127.0.0.1:{server.server_port}/all_transactions.json'
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_get_transactions_sources(feed_server, tmp_path):
+    """
+    Download both feeds concurrently and normalize the Senate layout
+    """
+    sources = [{'endpoint': feed_server(house_feed, delay=0.5), 'schema': 'house'},
+               {'endpoint': feed_server(senate_feed, delay=0.5), 'schema': 'senate',
+                'representatives': None}]
+    start = time.perf_counter()
+    acquire_new.get_transactions(None, str(tmp_path / 'sw.csv'), str(tmp_path / 'recent.csv'),
+                                 representatives, tickers, attempts=1, sources=sources)
+    assert time.perf_counter() - start < 0.9
+    recent = pd.read_csv(tmp_path / 'recent.csv')
+    assert len(recent) == 5
+    stockwatcher = pd.read_csv(tmp_path / 'sw.csv')
+    assert list(stockwatcher.columns) == acquire_new.STOCKWATCHER_COLUMNS
+    assert sorted(stockwatcher['ticker']) == ['AAPL', 'AAPL', 'MSFT']
+    senate = stockwatcher[stockwatcher['representative'] == 'Thomas H Tuberville']
+    assert senate['transaction_date'].tolist() == ['2021-02-11', '2021-02-15']
+    assert senate['owner'].tolist() == ['spouse', 'self']
+    assert senate['type'].tolist() == ['sale_partial', 'purchase']
+
+def test_merge_feeds_across_sources():
+    """
+    Drop the transactions another feed already reported, and keep the repeats of one feed
+    """
+    house = acquire_new.normalize_feed(pd.DataFrame(house_feed), 'house')
+    senate = pd.concat([house.iloc[[2, 2]], acquire_new.normalize_feed(
+        pd.DataFrame(senate_feed), 'senate')], ignore_index=True)
+    merged = acquire_new.merge_feeds([house, senate])
+    assert len(merged) == 5
+    assert merged['ticker'].tolist() == ['AAPL', 'XOM', 'XOM', 'MSFT', 'AAPL']
+    assert len(acquire_new.merge_feeds([house])) == 3
+
+def test_get_transactions_endpoint(feed_server, tmp_path):
+    """
+    Download the House feed alone from the endpoint, as before the sources
+    """
+    acquire_new.get_transactions(feed_server(house_feed), str(tmp_path / 'sw.csv'),
+                                 str(tmp_path / 'recent.csv'), ['Hon. Nancy Pelosi'],
+                                 tickers, attempts=1)
+    assert pd.read_csv(tmp_path / 'sw.csv')['ticker'].tolist() == ['AAPL']
+    assert pd.read_csv(tmp_path / 'recent.csv')['transaction_date'].tolist() == ['2021-02-10']
+
+def test_fetch_feed_server_error(feed_server):
+    """
+    Retry a feed answering with server errors
+    """
+    data = acquire_new.fetch_feed(feed_server(senate_feed, failures=2), attempts=3, wait=0)
+    assert len(data) == 2
+
+def test_fetch_feed_unreachable():
+    """
+    Give up on a feed nothing listens on
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        acquire_new.fetch_feed(f'http://127.0.0.1:{port}/feed.json', attempts=2, wait=0)
+
+def test_normalize_feed_unknown_schema():
+    """
+    Provide a feed without a schema
+    """
+    with pytest.raises(KeyError):
+        acquire_new.normalize_feed(pd.DataFrame(senate_feed), 'state')
+
+class BucketClient:
+    """
+    Keeps the uploaded objects in memory, with the calls of the S3 client used by
+    upload_s3 and download_s3
+    """
+    def __init__(self):
+        self.objects = {}
+    def upload_fileobj(self, body, bucket, key, ExtraArgs):  # pylint: disable=invalid-name
+        """Reads the body in small parts, as the multipart upload does"""
+        parts = iter(lambda: body.read(1000), b'')
+        self.objects[(bucket, key)] = (b''.join(parts), ExtraArgs)
+    def get_object(self, Bucket, Key):  # pylint: disable=invalid-name
+        """Returns a body streaming the object, or raises NoSuchKey"""
+        if (Bucket, Key) not in self.objects:
+            raise botocore.exceptions.ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        data = self.objects[(Bucket, Key)][0]
+        class Body:
+            """Streaming body of the object"""
+            def iter_chunks(self, chunk_size):
+                """Yields the object in parts"""
+                return (data[i:i + 100] for i in range(0, len(data), 100))
+        return {'Body': Body()}
+
+def test_compressed_reader():
+    """
+    Compress a file while reading it in parts smaller than the compressed chunks
+    """
+    raw = pd.DataFrame(house_feed * 500).to_csv(index=False).encode()
+    reader = acquire_new.CompressedReader(io.BytesIO(raw), 'gzip')
+    compressed = b''.join(iter(lambda: reader.read(700), b''))
+    assert gzip.decompress(compressed) == raw
+    assert reader.bytes_in == len(raw) and reader.bytes_out == len(compressed)
+    assert len(compressed) < len(raw) / 10
+
+def test_s3_compressed_round_trip(monkeypatch, tmp_path):
+    """
+    Upload a file gzipped with its metadata and download it back decompressed
+    """
+    client = BucketClient()
+    monkeypatch.setattr(acquire_new, 'get_s3_client', lambda: client)
+    pd.DataFrame(house_feed * 200).to_csv(tmp_path / 'sw.csv', index=False)
+    upload = acquire_new.upload_s3('s3://bucket', 'stockwatcher', str(tmp_path / 'sw.csv'),
+                                   compression='gzip')
+    body, extra_args = client.objects[('bucket', 'data_new/stockwatcher.csv.gz')]
+    assert extra_args['ContentEncoding'] == 'gzip' and extra_args['ContentType'] == 'text/csv'
+    assert extra_args['Metadata']['uncompressed-bytes'] == str(upload['bytes'])
+    assert upload['bytes_transferred'] == len(body) < upload['bytes']
+    download = acquire_new.download_s3('s3://bucket', 'stockwatcher', str(tmp_path / 'dl.csv'),
+                                       ',', compression='gzip')
+    assert (tmp_path / 'dl.csv').read_bytes() == (tmp_path / 'sw.csv').read_bytes()
+    assert download['bytes_transferred'] == len(body)
+    report_path = tmp_path / 'report.csv'
+    acquire_new.write_transfer_report([upload, None, download], str(report_path))
+    report = pd.read_csv(report_path)
+    assert report['direction'].tolist() == ['upload', 'download']
+    assert (report['ratio'] > 1).all()
+
+def test_s3_download_uncompressed_object(monkeypatch, tmp_path):
+    """
+    Download a file uploaded before compression was enabled
+    """
+    calls = []
+    monkeypatch.setattr(acquire_new, 'get_s3_client', BucketClient)
+    monkeypatch.setattr(pd, 'read_csv', lambda path, sep: calls.append(path) or
+                        pd.DataFrame(house_feed))
+    download = acquire_new.download_s3('s3://bucket', 'stockwatcher', str(tmp_path / 'dl.csv'),
+                                       ',', compression='gzip')
+    assert calls == ['s3://bucket/data_new/stockwatcher.csv']
+    assert download['compression'] is None
+
+def test_s3_download_truncated_object(monkeypatch, tmp_path):
+    """
+    Download a truncated object, which must leave the last good file in place
+    """
+    client = BucketClient()
+    monkeypatch.setattr(acquire_new, 'get_s3_client', lambda: client)
+    raw = pd.DataFrame(house_feed * 200).to_csv(index=False).encode()
+    client.objects[('bucket', 'data_new/stockwatcher.csv.gz')] = (gzip.compress(raw)[:-20], {})
+    (tmp_path / 'dl.csv').write_text('last good file')
+    with pytest.raises(ValueError):
+        acquire_new.download_s3('s3://bucket', 'stockwatcher', str(tmp_path / 'dl.csv'),
+                                ',', compression='gzip')
+    assert (tmp_path / 'dl.csv').read_text() == 'last good file'
+    assert not (tmp_path / 'dl.csv.tmp').exists()
+
+def test_unknown_compression():
+    """
+    Provide a compression that is not supported
+    """
+    with pytest.raises(ValueError):
+        acquire_new.make_codec('bz2')
+    with pytest.raises(ValueError):
+        acquire_new.CompressedReader(io.BytesIO(b'data'), 'bz2')
+
+def test_zstd_not_installed():
+    """
+    Ask for zstd compression without the optional zstandard package
+    """
+    try:
+        import zstandard  # pylint: disable=import-outside-toplevel,unused-import
+        pytest.skip('zstandard is installed')
+    except ImportError:
+        pass
+    with pytest.raises(ImportError):
+        acquire_new.make_codec('zstd')
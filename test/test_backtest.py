@@ -0,0 +1,95 @@
+"""
+This module defines the unit tests for backtest.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from src import backtest
+
+CATEG = ['owner', 'ticker', 'type', 'amount', 'representative']
+
+# create sample cleaned data with one trade per day over two years
+rng = np.random.default_rng(29)
+N_ROWS = 730
+clean_df = pd.DataFrame({'transaction_date': pd.date_range('2020-01-01', periods=N_ROWS)
+                                               .strftime('%Y-%m-%d'),
+                         'owner': rng.choice(['self', 'joint', '--'], N_ROWS),
+                         'ticker': rng.choice(['AAPL', 'MSFT', 'TSLA'], N_ROWS),
+                         'type': rng.choice(['purchase', 'sale_full'], N_ROWS),
+                         'amount': rng.choice(['$1,001 - $15,000', '$15,001 - $50,000'], N_ROWS),
+                         'representative': rng.choice(['Hon. A', 'Hon. B'], N_ROWS),
+                         'district': 'D0',
+                         'trans_price': rng.uniform(50, 150, N_ROWS).round(2),
+                         'current_price': 100.0})
+
+# define tests with happy paths
+def test_make_windows():
+    """
+    Check the row positions of rolling and expanding windows
+    """
+    dates = pd.date_range('2020-01-01', periods=10).to_numpy()
+    assert backtest.make_windows(dates, 4, 2, 3) == [(0, 4, 6), (3, 7, 9)]
+    assert backtest.make_windows(dates, 4, 2, 3, expanding=True) == [(0, 4, 6), (0, 7, 9)]
+
+def test_evaluate_window():
+    """
+    Check whether the prefix-sum scaling gives the same model as a fitted StandardScaler
+    """
+    features = np.column_stack([rng.normal(5, 2, 200), rng.integers(0, 2, 200),
+                                np.ones(200)])
+    response = (features[:, 0] + rng.normal(0, 1, 200) > 5).astype(int)
+    zeros = np.zeros((1, 3))
+    sums = np.concatenate([zeros, np.cumsum(features, axis=0)])
+    squares = np.concatenate([zeros, np.cumsum(features ** 2, axis=0)])
+    result = backtest.evaluate_window(features, response, sums, squares, (20, 150, 200),
+                                      29, 1000)
+
+    scaler = StandardScaler().fit(features[20:150])
+    model = LogisticRegression(max_iter=1000, random_state=29)
+    model.fit(scaler.transform(features[20:150]), response[20:150])
+    proba = model.predict_proba(scaler.transform(features[150:]))
+    expected = backtest.roc_auc_score(response[150:], proba[:, 1])
+    assert result['Train Rows'] == 130 and result['Test Rows'] == 50
+    assert result['AUC'] == pytest.approx(expected)
+
+def test_backtest(tmp_path):
+    """
+    Check whether one row of metrics is saved per window
+    """
+    path = str(tmp_path / 'cleaned_data.csv')
+    clean_df.to_csv(path, index=False)
+    results = backtest.backtest(path, CATEG, 'response', str(tmp_path / 'results.yaml'),
+                                str(tmp_path / 'windows.csv'), train_days=365,
+                                test_days=90, step_days=90, random_state=29,
+                                max_iter=1000, n_jobs=1)
+    assert results['Test Start'].tolist() == ['2020-12-31', '2021-03-31', '2021-06-29',
+                                              '2021-09-27', '2021-12-26']
+    assert (results['Train Rows'] == 365).all()
+    assert results['Test Rows'].tolist() == [90, 90, 90, 90, 5]
+    assert len(pd.read_csv(tmp_path / 'windows.csv')) == 5
+
+# define unhappy path
+def test_backtest_unexpected_columns(tmp_path):
+    """
+    Provide cleaned data without the transaction date
+    """
+    path = str(tmp_path / 'cleaned_data.csv')
+    clean_df.drop(columns='transaction_date').to_csv(path, index=False)
+    with pytest.raises(KeyError):
+        backtest.backtest(path, CATEG, 'response', None, None, 365, 90, 90, 29, 1000)
+
+def test_backtest_no_trades(tmp_path):
+    """
+    Provide cleaned data without any trade, and windows without enough training rows
+    """
+    path = str(tmp_path / 'cleaned_data.csv')
+    clean_df.iloc[:0].to_csv(path, index=False)
+    assert backtest.make_windows(np.array([], dtype='datetime64[ns]'), 365, 90, 90) == []
+    results = backtest.backtest(path, CATEG, 'response', None, None, 365, 90, 90, 29, 1000)
+    assert results.empty and 'AUC' in results.columns
+    clean_df.to_csv(path, index=False)
+    results = backtest.backtest(path, CATEG, 'response', None, None, 365, 90, 90, 29, 1000,
+                                min_train_rows=10000)
+    assert results.empty
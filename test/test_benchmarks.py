@@ -0,0 +1,32 @@
+"""
+This module defines the unit tests for the comparison of benchmarks/run_benchmarks.py
+"""
+from benchmarks import run_benchmarks
+
+baseline = {'train': {'1000': 0.020, '10000': 0.050},
+            'predict_ind': {'1000': 0.0003},
+            '_host': {'cpus': 1}}
+
+def test_compare_regression():
+    """
+    Report a slow case above both the threshold and the floor
+    """
+    results = {'train': {'1000': 0.030, '10000': 0.051}}
+    regressions = run_benchmarks.compare(results, baseline, 0.25)
+    assert len(regressions) == 1
+    assert regressions[0].startswith('train at 1000 rows')
+
+def test_compare_floor():
+    """
+    Ignore a sub-millisecond case that doubled, unless the floor is lowered
+    """
+    results = {'predict_ind': {'1000': 0.0006}}
+    assert run_benchmarks.compare(results, baseline, 0.25) == []
+    assert len(run_benchmarks.compare(results, baseline, 0.25, floor=0.0001)) == 1
+
+def test_compare_missing_baseline():
+    """
+    Provide cases and sizes the baseline does not have
+    """
+    results = {'pipeline': {'1000': 1.0}, 'train': {'100000': 9.0}}
+    assert run_benchmarks.compare(results, baseline, 0.25) == []
@@ -96,3 +96,105 @@ def test_impute_missing_unexpected_column():
     """
     with pytest.raises(TypeError):
         clean.impute_missing(df_orig.copy(),replacement=[3,4,5])
+
+# create sample raw data to check the fused cleaning pass against the stepwise pipeline
+raw_transactions = pd.DataFrame({'transaction_date':['2021-01-04','2021-01-05','2021-01-04',
+                                                     '2021-01-06','2021-01-04','2021-01-07'],
+                                 'owner':['self','--',np.nan,'joint','self','self'],
+                                 'ticker':['AAPL','MSFT','AAPL','TSLA','AAPL','MSFT'],
+                                 'amount':['$1,001 - $15,000']*6,
+                                 'type':['purchase','sale_full','purchase',
+                                         'purchase','purchase','sale_partial'],
+                                 'representative':['Hon. A','Hon. B','Hon. A',
+                                                   'Hon. C','Hon. A','Hon. B'],
+                                 'ptr_link':['l1','l2','l3','l4','l5','l6']})
+raw_transact_price = pd.DataFrame({'ticker':['AAPL','MSFT','TSLA','AAPL','MSFT'],
+                                   'date':['2021-01-04','2021-01-05','2021-01-06',
+                                           '2021-01-04','2021-01-07'],
+                                   'price':[130.0,215.0,np.nan,130.0,212.0]})
+raw_current_price = pd.DataFrame({'ticker':['AAPL','MSFT','TSLA'],
+                                  'date':['2022-06-01']*3,
+                                  'price':[150.0,210.0,700.0]})
+
+def test_clean_fused(tmp_path):
+    """
+    Check whether the fused pass saves the same data as the stepwise functions
+    """
+    paths = [str(tmp_path / name) for name in ['sw.csv', 'tp.csv', 'cp.csv']]
+    raw_transactions.to_csv(paths[0], index=False)
+    raw_transact_price.to_csv(paths[1], index=False)
+    raw_current_price.to_csv(paths[2], index=False)
+    columns = ['transaction_date', 'ptr_link', 'date_x', 'date_y', 'current_price']
+
+    data = clean.join_transact_price(paths[0], paths[1])
+    clean.join_current_price(data, paths[2], str(tmp_path / 'cleaned.csv'))
+    data = clean.add_response(str(tmp_path / 'cleaned.csv'))
+    data = clean.filter_df(data, columns)
+    data = clean.drop_dups(data)
+    clean.impute_missing(data, str(tmp_path / 'expected.csv'))
+
+    clean.clean_fused(*paths, columns, str(tmp_path / 'actual.csv'))
+    expected_df = pd.read_csv(tmp_path / 'expected.csv')
+    actual_df = pd.read_csv(tmp_path / 'actual.csv')
+    assert actual_df.equals(expected_df)
+
+def test_clean_fused_unexpected_price_columns(tmp_path):
+    """
+    Provide stock-price data without the price column to the clean_fused function
+    """
+    paths = [str(tmp_path / name) for name in ['sw.csv', 'tp.csv', 'cp.csv']]
+    raw_transactions.to_csv(paths[0], index=False)
+    raw_transact_price.drop(columns='price').to_csv(paths[1], index=False)
+    raw_current_price.to_csv(paths[2], index=False)
+    with pytest.raises(KeyError):
+        clean.clean_fused(*paths, ['ptr_link'])
+
+def test_add_features_parallel():
+    """
+    Check whether the parallel feature steps return the same DataFrame as the serial steps
+    """
+    rng = np.random.default_rng(3)
+    data = pd.DataFrame({'current_price':rng.integers(1, 5, 400).astype(float),
+                         'trans_price':rng.integers(1, 5, 400).astype(float),
+                         'ticker':rng.choice(['AAPL','GOOG','MSFT'], 400),
+                         'owner':rng.choice(['self','--',np.nan], 400),
+                         'ptr_link':rng.choice(['l1','l2'], 400)})
+    columns = ['current_price', 'ptr_link']
+    expected_df = clean.impute_missing(clean.drop_dups(clean.filter_df(
+        clean.add_response(data.copy()), columns)))
+    actual_df = clean.add_features_parallel(data.copy(), columns, n_jobs=2, n_partitions=5)
+    assert len(actual_df) < len(data)
+    assert actual_df.equals(expected_df)
+
+# create sample amount brackets, including one without upper bound and a missing one
+amounts = pd.Series(['$15,001 - $50,000', '$1,001 -', np.nan, '$15,001 - $50,000'],
+                    index=[3, 5, 7, 9])
+
+def test_parse_amount():
+    """
+    Check whether the brackets are turned into their bounds and midpoint
+    """
+    expected_df = pd.DataFrame({'amount_lower':[15001., 1001., np.nan, 15001.],
+                                'amount_upper':[50000., 1001., np.nan, 50000.],
+                                'amount_mid':[32500.5, 1001., np.nan, 32500.5]},
+                               index=[3, 5, 7, 9])
+    pd.testing.assert_frame_equal(clean.parse_amount(amounts), expected_df)
+    pd.testing.assert_frame_equal(clean.parse_amount(amounts.astype('category')), expected_df)
+    assert clean.amount_bounds('$1,000,001 - $5,000,000') == (1000001., 5000000., 3000000.5)
+
+def test_split_amount():
+    """
+    Check whether the amount column is replaced in place by the numeric columns
+    """
+    data = pd.DataFrame({'owner':['self']*4, 'amount':amounts, 'trans_price':[1., 2., 3., 4.]})
+    new_df = clean.split_amount(data)
+    assert new_df.columns.tolist() == ['owner', 'amount_lower', 'amount_upper',
+                                       'amount_mid', 'trans_price']
+    assert new_df['amount_mid'].tolist()[:2] == [32500.5, 1001.]
+
+def test_parse_amount_unexpected_bracket():
+    """
+    Provide a bracket without any dollar value to the parse_amount function
+    """
+    with pytest.raises(ValueError):
+        clean.parse_amount(pd.Series(['$1,001 - $15,000', 'undisclosed']))
@@ -0,0 +1,209 @@
+"""
+This module defines the unit tests for createdb.py
+"""
+import json
+import os
+import pickle
+import threading
+import time
+import pandas as pd
+import pytest
+import sqlalchemy as sql
+from sqlalchemy.orm import sessionmaker
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from src import createdb, price_store, train
+
+# create sample data to mimic the recent transactions
+recent_df = pd.DataFrame({'id':[0,1,2,3,4],
+                          'representative':['Hon. A','Hon. A','Hon. B','Hon. A','Hon. B'],
+                          'transaction_date':['2021-01-04','2021-03-01','2021-02-01',
+                                              '2021-02-15','2021-01-20'],
+                          'ticker':['AAPL','MSFT','AAPL','AAPL','TSLA'],
+                          'asset_description':['Apple','Microsoft','Apple','Apple','Tesla'],
+                          'amount':['$1,001 - $15,000']*5,
+                          'type':['purchase','sale_full','purchase','purchase','sale_partial']})
+
+def make_session(tmp_path, summary):
+    """
+    Helper that writes the summary to a temporary SQLite database and returns a session
+    """
+    engine = sql.create_engine(f'sqlite:///{tmp_path}/test.db')
+    createdb.RepresentativeSummary.__table__.drop(engine, checkfirst=True)
+    createdb.RepresentativeSummary.__table__.create(engine)
+    summary.to_sql('representative_summary', engine, if_exists='append', index=False)
+    return sessionmaker(bind=engine)()
+
+# define tests with happy paths
+def test_build_summary():
+    """
+    Check whether the summary counts trades and keeps the latest trades first
+    """
+    summary = createdb.build_summary(recent_df, top_n=2).set_index('representative')
+    assert summary.loc['Hon. A', 'n_trades'] == 3
+    assert json.loads(summary.loc['Hon. A', 'counts'])['ticker'] == {'AAPL': 2, 'MSFT': 1}
+    latest = json.loads(summary.loc['Hon. A', 'latest'])
+    assert [row['transaction_date'] for row in latest] == ['2021-03-01', '2021-02-15']
+    assert 'id' not in latest[0]
+
+def test_summary_cache(tmp_path):
+    """
+    Check whether the cache serves the summary and is emptied after re-ingestion
+    """
+    session = make_session(tmp_path, createdb.build_summary(recent_df))
+    cache = createdb.SummaryCache(session, ttl=0)
+    assert cache.get('Hon. B')['n_trades'] == 2
+    assert 'Hon. B' in cache.entries
+    assert cache.get('Hon. C') is None
+
+    session.close()
+    session = make_session(tmp_path, createdb.build_summary(recent_df.iloc[:3]))
+    cache.session = session
+    assert cache.get('Hon. B')['n_trades'] == 1
+
+# define unhappy path
+def test_build_summary_unexpected_columns():
+    """
+    Provide transactions without the representative column
+    """
+    with pytest.raises(KeyError):
+        createdb.build_summary(recent_df.drop(columns='representative'))
+
+def save_artifacts(tmp_path):
+    """
+    Helper that trains a model on the sample transactions and builds a price store
+    """
+    data = recent_df.assign(owner='undisclosed', trans_price=[10., 20., 11., 12., 30.],
+                            response=[1, 0, 0, 1, 1])
+    enc, features, response = train.encode_features(
+        data[['owner', 'ticker', 'type', 'amount', 'representative', 'trans_price',
+              'response']], ['owner', 'ticker', 'type', 'amount', 'representative'],
+        'response')
+    scaler = StandardScaler().fit(features)
+    model = LogisticRegression().fit(scaler.transform(features), response)
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    for path, artifact in zip(paths, [model, enc, scaler]):
+        with open(path, 'wb') as file:
+            pickle.dump(artifact, file)
+    pd.DataFrame({'ticker': ['AAPL', 'MSFT'], 'date': ['2021-01-04', '2021-03-01'],
+                  'price': [130., 230.]}).to_csv(tmp_path / 'prices.csv', index=False)
+    price_store.build_price_store(str(tmp_path / 'prices.csv'), str(tmp_path / 'store'))
+    return paths + [str(tmp_path / 'store')]
+
+def test_build_scores(tmp_path):
+    """
+    Check whether the batch scores match single predictions and are read back by
+    representative, leaving out the transactions without a stored price
+    """
+    paths = save_artifacts(tmp_path)
+    scores = createdb.build_scores(recent_df, *paths)
+    assert scores['transaction_id'].tolist() == [0, 1, 2, 3]
+    assert scores['trans_price'].tolist() == [130., 230., 130., 130.]
+
+    model, enc, scaler = train.get_model(*paths[:3])
+    single = train.predict_ind(model, enc, scaler,
+                               {'owner': 'undisclosed', 'ticker': 'MSFT', 'type': 'sale_full',
+                                'amount': '$1,001 - $15,000', 'representative': 'Hon. A'},
+                               230.)
+    assert scores.loc[1, 'probability'] == single
+
+    engine = sql.create_engine(f'sqlite:///{tmp_path}/test.db')
+    createdb.add_scores(recent_df, engine, *paths)
+    session = sessionmaker(bind=engine)()
+    assert createdb.get_scores(session, 'Hon. A')[('2021-03-01', 'MSFT', '$1,001 - $15,000',
+                                                   'sale_full')] == single
+    assert len(createdb.get_scores(session, 'Hon. B')) == 1
+
+def test_build_scores_owner(tmp_path):
+    """
+    Score a feed with an owner column, imputing the missing owners
+    """
+    paths = save_artifacts(tmp_path)
+    data = recent_df.assign(owner=['self', '--', None, 'self', 'joint'])
+    scores = createdb.build_scores(data, *paths)
+    assert scores['transaction_id'].tolist() == [1, 2]
+
+def test_prediction_log_writer(tmp_path):
+    """
+    Check whether the queued predictions are written in batches and flushed on close
+    """
+    engine_string = f'sqlite:///{tmp_path}/log.db'
+    writer = createdb.PredictionLogWriter(engine_string, batch_size=2, flush_interval=60)
+    record = {'representative': 'Hon. A', 'ticker': 'AAPL', 'owner': 'self',
+              'type': 'purchase', 'amount': '$1,001 - $15,000',
+              'trans_price': 150.0, 'probability': 0.6}
+    for _ in range(5):
+        assert writer.log(record)
+    writer.close()
+    assert not writer.log(record)
+    logged = pd.read_sql('prediction_log', sql.create_engine(engine_string))
+    assert len(logged) == 5
+    assert writer.written == 5 and writer.dropped == 0
+
+def test_prediction_log_writer_after_fork(tmp_path):
+    """
+    Check whether a writer closed before a fork can be started again in the child
+    """
+    engine_string = f'sqlite:///{tmp_path}/log.db'
+    writer = createdb.PredictionLogWriter(engine_string)
+    writer.close()
+    pid = os.fork()
+    if pid == 0:
+        writer.start()
+        writer.log({'representative': 'Hon. A', 'ticker': 'AAPL', 'owner': 'self',
+                    'type': 'purchase', 'amount': '$1,001 - $15,000',
+                    'trans_price': 150.0, 'probability': 0.6})
+        writer.close()
+        os._exit(0 if writer.written == 1 else 1)
+    assert os.waitpid(pid, 0)[1] == 0
+    assert len(pd.read_sql('prediction_log', sql.create_engine(engine_string))) == 1
+    assert writer.closed
+
+def test_prediction_log_writer_full_queue(tmp_path, monkeypatch):
+    """
+    Fill the queue while nothing is written, with the drop policy
+    """
+    monkeypatch.setattr(createdb.PredictionLogWriter, 'run', lambda self: None)
+    writer = createdb.PredictionLogWriter(f'sqlite:///{tmp_path}/log.db', max_queue=1)
+    assert writer.log({'representative': 'Hon. A'})
+    assert not writer.log({'representative': 'Hon. B'})
+    assert writer.dropped == 1
+
+def test_prediction_log_writer_close_full_queue(tmp_path, monkeypatch):
+    """
+    Close the writer while the queue is full and the database does not answer
+    """
+    gate = threading.Event()
+    flush = createdb.PredictionLogWriter.flush
+    monkeypatch.setattr(createdb.PredictionLogWriter, 'flush',
+                        lambda self, batch: gate.wait(5) and flush(self, batch))
+    writer = createdb.PredictionLogWriter(f'sqlite:///{tmp_path}/log.db', batch_size=1,
+                                          max_queue=2, policy='block', block_timeout=0.1)
+    record = {'representative': 'Hon. A', 'ticker': 'AAPL', 'owner': 'self',
+              'type': 'purchase', 'amount': '$1,001 - $15,000',
+              'trans_price': 150.0, 'probability': 0.6}
+    while writer.log(record):
+        pass
+    start = time.perf_counter()
+    writer.close(timeout=0.1)
+    assert time.perf_counter() - start < 1
+    gate.set()
+    writer.thread.join(5)
+    assert writer.written == 3
+
+def test_add_scores_missing_model(tmp_path):
+    """
+    Ingest scores without a saved model, which leaves the score table out
+    """
+    engine = sql.create_engine(f'sqlite:///{tmp_path}/test.db')
+    createdb.add_scores(recent_df, engine, str(tmp_path / 'model.pkl'),
+                        str(tmp_path / 'encoder.pkl'), str(tmp_path / 'scaler.pkl'),
+                        str(tmp_path / 'store'))
+    assert not sql.inspect(engine).has_table('transaction_score')
+
+def test_prediction_log_writer_unexpected_policy(tmp_path):
+    """
+    Provide an unknown backpressure policy
+    """
+    with pytest.raises(ValueError):
+        createdb.PredictionLogWriter(f'sqlite:///{tmp_path}/log.db', policy='retry')
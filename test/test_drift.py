@@ -0,0 +1,118 @@
+"""
+This module defines the unit tests for drift.py
+"""
+import json
+import os
+import pandas as pd
+import pytest
+
+from src import drift
+from src import train
+
+# create a sample DataFrame to mimic the cleaned data
+original_df = pd.DataFrame({'owner'          :['dependent', 'self', 'undisclosed', 'self'] * 6,
+                            'ticker'         :['AAPL', 'GOOG', 'MSFT', 'GOOG'] * 6,
+                            'type'           :['purchase', 'sale_full', 'purchase',
+                                               'sale_partial'] * 6,
+                            'amount'         :['$1,001 - $15,000', '$50,001 - $100,000',
+                                               '$1,001 -', '$1,001 - $15,000'] * 6,
+                            'representative' :['Hon. Alan S. Lowenthal', 'Hon. Rohit Khanna',
+                                               'Hon. Nancy Pelosi', 'Hon. Rohit Khanna'] * 6,
+                            'trans_price'    :[120.5, 80.1, 310.0, 95.2, 118.0, 79.9,
+                                               305.5, 97.0] * 3,
+                            'response'       :[1, 0, 0, 1, 1, 0] * 4})
+
+categ = ['owner', 'ticker', 'type', 'amount', 'representative']
+
+def save_monitor(tmp_path, window_size=24):
+    """
+    Saves the profile of the sample data and returns a monitor reading it
+    """
+    profile_path = str(tmp_path / 'profile.json')
+    drift.save_profile(drift.build_profile(original_df, categ, max_values=2, bins=4),
+                       profile_path)
+    return drift.DriftMonitor(profile_path, window_size, min_predictions=10)
+
+def test_build_profile():
+    """
+    Keep the most frequent values and put the others in the last bucket
+    """
+    profile = drift.build_profile(original_df, categ, max_values=2, bins=4)
+    ticker = profile['categorical']['ticker']
+    assert ticker['values'][0] == 'GOOG'
+    assert ticker['known'] == ['AAPL', 'GOOG', 'MSFT']
+    assert ticker['shares'] == pytest.approx([0.5, 0.25, 0.25])
+    assert len(profile['price']['shares']) == len(profile['price']['edges']) + 1
+    assert sum(profile['price']['shares']) == pytest.approx(1)
+
+def test_monitor_stable(tmp_path):
+    """
+    Feed the training rows back and find no drift
+    """
+    monitor = save_monitor(tmp_path)
+    for row in original_df.to_dict('records'):
+        monitor.update(row, row['trans_price'])
+    scores = monitor.scores()
+    assert scores['predictions'] == 24 and scores['complete_window']
+    assert all(feature['status'] == 'stable' for feature in scores['features'].values())
+    assert scores['features']['ticker']['psi'] == pytest.approx(0, abs=1e-6)
+
+def test_monitor_drift(tmp_path):
+    """
+    Feed a new ticker at prices above the training range
+    """
+    monitor = save_monitor(tmp_path)
+    for row in original_df.to_dict('records')[:10]:
+        monitor.update(dict(row, ticker='TSLA'), 5000.0)
+    scores = monitor.scores()
+    assert scores['predictions'] == 10 and not scores['complete_window']
+    assert scores['features']['ticker']['unseen_share'] == 1.0
+    assert scores['features']['ticker']['status'] == 'alert'
+    assert scores['features']['trans_price']['status'] == 'alert'
+    assert scores['features']['owner']['status'] == 'stable'
+    monitor.update(original_df.iloc[0].to_dict(), 100.0)
+    monitor.min_predictions = 12
+    assert monitor.scores()['features']['ticker']['status'] == 'insufficient'
+
+def test_monitor_missing_profile(tmp_path):
+    """
+    Run the app without a training profile
+    """
+    monitor = drift.DriftMonitor(str(tmp_path / 'missing.json'))
+    monitor.update({'ticker': 'AAPL'}, 100.0)
+    assert monitor.scores() == {'predictions': 0, 'features': {}}
+
+def test_train_profile(tmp_path):
+    """
+    Save the profile with the served model only
+    """
+    data_path = tmp_path / 'data.csv'
+    original_df.to_csv(data_path, index=False)
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    profile_path = tmp_path / 'profile.json'
+    train.train(str(data_path), categ, 'response', None, None, None, *paths,
+                0.5, 2, 100, None, None, None, promote=False, profile_path=str(profile_path))
+    assert not profile_path.exists()
+    train.train(str(data_path), categ, 'response', None, None, None, *paths,
+                0.5, 2, 100, None, None, None, profile_path=str(profile_path))
+    with open(profile_path, 'r', encoding='utf8') as file:
+        assert set(json.load(file)['categorical']) == set(categ)
+
+def test_monitor_shared_by_workers(tmp_path):
+    """
+    Count the predictions of a forked worker and of the parent in the same window
+    """
+    monitor = save_monitor(tmp_path)
+    rows = original_df.to_dict('records')
+    pid = os.fork()
+    if pid == 0:
+        for row in rows[:10]:
+            monitor.update(dict(row, ticker='TSLA'), row['trans_price'])
+        os._exit(0)
+    assert os.waitpid(pid, 0)[1] == 0
+    for row in rows[10:20]:
+        monitor.update(dict(row, ticker='TSLA'), row['trans_price'])
+    scores = monitor.scores()
+    assert scores['predictions'] == 20 and not scores['complete_window']
+    assert scores['features']['ticker']['status'] == 'alert'
+    assert scores['features']['owner']['status'] == 'stable'
@@ -0,0 +1,70 @@
+"""
+This module defines the unit tests for labels.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from src import labels
+
+# create sample daily closes for two tickers (AAPL rises, TSLA falls)
+prices_df = pd.DataFrame({'ticker': ['AAPL'] * 6 + ['TSLA'] * 4,
+                          'date': ['2021-01-04', '2021-01-05', '2021-01-06', '2021-01-07',
+                                   '2021-01-08', '2021-01-11',
+                                   '2021-01-04', '2021-01-05', '2021-01-06', '2021-01-07'],
+                          'price': [10., 11., 12., 13., 14., 15., 100., 90., 80., 70.]})
+
+# create sample cleaned transactions (the second one is on a Saturday)
+clean_df = pd.DataFrame({'transaction_date': ['2021-01-04', '2021-01-09', '2021-01-05',
+                                              '2021-01-04', '2020-12-31'],
+                         'owner': ['self', '--', 'joint', 'self', 'self'],
+                         'ticker': ['AAPL', 'AAPL', 'TSLA', 'FB', 'AAPL'],
+                         'type': ['purchase', 'sale_full', 'purchase', 'purchase', 'purchase'],
+                         'amount': ['$1,001 - $15,000'] * 5,
+                         'representative': ['Hon. A', 'Hon. B', 'Hon. A', 'Hon. B', 'Hon. A'],
+                         'district': ['D0'] * 5,
+                         'trans_price': [10., 14., 90., 5., 9.],
+                         'current_price': [15., 15., 70., 6., 15.]})
+
+def write_prices(tmp_path):
+    """
+    Helper that saves the sample closes and returns their path
+    """
+    path = str(tmp_path / 'price_history.csv')
+    prices_df.sample(frac=1, random_state=0).to_csv(path, index=False)
+    return path
+
+# define tests with happy paths
+def test_forward_returns(tmp_path):
+    """
+    Check the returns at two horizons, including the as-of match on a weekend
+    and the transactions without a price or enough history
+    """
+    prices = labels.load_price_history(write_prices(tmp_path))
+    returns = labels.forward_returns(clean_df, prices, [1, 2])
+    np.testing.assert_allclose(returns['return_1d'], [0.1, 1 / 14, -1 / 9, np.nan, np.nan])
+    np.testing.assert_allclose(returns['return_2d'], [0.2, np.nan, -2 / 9, np.nan, np.nan])
+
+def test_add_horizon_labels(tmp_path):
+    """
+    Check whether one modeling DataFrame is saved per horizon with the labeled rows only
+    """
+    save_path = str(tmp_path / 'features_{horizon}d.csv')
+    labeled = labels.add_horizon_labels(clean_df.copy(), write_prices(tmp_path), [1, 2],
+                                        ['transaction_date', 'district', 'current_price'],
+                                        save_path)
+    assert labeled[1]['response'].tolist() == [1, 1, 0]
+    assert labeled[2]['response'].tolist() == [1, 0]
+    assert labeled[1]['owner'].tolist() == ['self', 'undisclosed', 'joint']
+    saved = pd.read_csv(save_path.format(horizon=2))
+    assert saved.columns.tolist() == ['owner', 'ticker', 'type', 'amount', 'representative',
+                                      'trans_price', 'response']
+
+# define unhappy path
+def test_load_price_history_unexpected_columns(tmp_path):
+    """
+    Provide a price history without the price column
+    """
+    path = str(tmp_path / 'prices.csv')
+    prices_df.rename(columns={'price': 'close'}).to_csv(path, index=False)
+    with pytest.raises(ValueError):
+        labels.load_price_history(path)
@@ -0,0 +1,68 @@
+"""
+This module defines the unit tests for page_cache.py
+"""
+import gzip
+import threading
+from flask import Response
+from src import page_cache
+
+# create a sample page large enough to be compressed
+html = '<html><body>' + '<p>House Stockwatcher</p>' * 100 + '</body></html>'
+
+# define tests with happy paths
+def test_page_cache():
+    """
+    Check whether the least recently used page is dropped and clear empties the cache
+    """
+    cache = page_cache.PageCache(max_entries=2)
+    cache.set(('home',), 'a')
+    cache.set(('response_page', 'Hon. A', '0.5'), 'b')
+    assert cache.get(('home',)) == 'a'
+    cache.set(('response_page', 'Hon. B', '0.5'), 'c')
+    assert cache.get(('response_page', 'Hon. A', '0.5')) is None
+    assert cache.get(('home',)) == 'a'
+    cache.clear('in test')
+    assert cache.get(('home',)) is None
+
+def test_page_cache_threads():
+    """
+    Read, store and clear pages from several threads at once
+    """
+    cache = page_cache.PageCache(max_entries=4)
+    errors = []
+    def use_cache(thread):
+        try:
+            for i in range(3000):
+                cache.set((thread, i % 6), 'page')
+                cache.get((thread, (i + 1) % 6))
+                if i % 50 == 0:
+                    cache.clear()
+        except Exception as error:  # pylint: disable=broad-except
+            errors.append(error)
+    threads = [threading.Thread(target=use_cache, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors and len(cache.entries) <= 4
+
+def test_gzip_response():
+    """
+    Check whether the body is compressed when the client accepts gzip
+    """
+    response = page_cache.gzip_response(Response(html, mimetype='text/html'), 'gzip, br')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.vary
+    assert gzip.decompress(response.get_data()).decode() == html
+
+# define unhappy path
+def test_gzip_response_not_accepted():
+    """
+    Provide a client without gzip support and a body below the minimum size
+    """
+    response = page_cache.gzip_response(Response(html, mimetype='text/html'), 'identity')
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.vary
+    response = page_cache.gzip_response(Response('<p></p>', mimetype='text/html'), 'gzip')
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data() == b'<p></p>'
@@ -0,0 +1,78 @@
+"""
+This module defines the unit tests for price_store.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from src import price_store
+
+# create sample daily closes (unsorted, with a duplicate and a missing price)
+prices_df = pd.DataFrame({'ticker': ['TSLA', 'AAPL', 'AAPL', 'TSLA', 'AAPL', 'AAPL', 'MSFT'],
+                          'date': ['2021-01-05', '2021-01-05', '2021-01-04', '2021-01-04',
+                                   '2021-01-08', '2021-01-04', '2021-01-04'],
+                          'price': [90., 11., 10., 100., 14., 10., np.nan]})
+
+def build(tmp_path):
+    """
+    Helper that builds a price store from the sample closes and opens it
+    """
+    path = str(tmp_path / 'price_history.csv')
+    prices_df.to_csv(path, index=False)
+    price_store.build_price_store(path, str(tmp_path / 'store'))
+    return price_store.PriceStore(str(tmp_path / 'store'))
+
+# define tests with happy paths
+def test_build_price_store(tmp_path):
+    """
+    Check whether every ticker occupies a sorted contiguous slice of the arrays
+    """
+    store = build(tmp_path)
+    assert store.tickers.tolist() == ['AAPL', 'TSLA']
+    assert store.offsets.tolist() == [0, 3] and store.lengths.tolist() == [3, 2]
+    assert isinstance(store.closes, np.memmap)
+    assert store.closes.tolist() == [10., 11., 14., 100., 90.]
+
+def test_lookup(tmp_path):
+    """
+    Check exact and as-of lookups, including unknown tickers and early dates
+    """
+    store = build(tmp_path)
+    tickers = ['TSLA', 'AAPL', 'AAPL', 'MSFT', 'AAPL']
+    dates = ['2021-01-05', '2021-01-04', '2021-01-07', '2021-01-04', '2020-12-31']
+    np.testing.assert_array_equal(store.lookup(tickers, dates),
+                                  [90., 10., np.nan, np.nan, np.nan])
+    np.testing.assert_array_equal(store.lookup(tickers, dates, asof=True),
+                                  [90., 10., 11., np.nan, np.nan])
+    assert store.latest('AAPL') == 14.
+    assert store.latest('AAPL', '2021-01-06') == 11.
+    assert np.isnan(store.latest('FB'))
+
+def test_price_index(tmp_path):
+    """
+    Check whether the index serves prices from memory and reloads a rebuilt store
+    """
+    build(tmp_path)
+    index = price_store.PriceIndex(str(tmp_path / 'store'), refresh_interval=3600)
+    assert not isinstance(index.store.closes, np.memmap)
+    assert index.price('AAPL', '2021-01-07') == 11.
+    assert not index.refresh()
+
+    path = str(tmp_path / 'price_history.csv')
+    pd.DataFrame({'ticker': ['AAPL'], 'date': ['2021-01-04'], 'price': [20.]})\
+      .to_csv(path, index=False)
+    price_store.build_price_store(path, str(tmp_path / 'store'))
+    index.version = None  # the rebuild may share the mtime of the first build
+    assert index.refresh()
+    assert index.price('AAPL') == 20.
+    index.close()
+
+# define unhappy path
+def test_price_store_missing(tmp_path):
+    """
+    Open a folder without a price store
+    """
+    with pytest.raises(FileNotFoundError):
+        price_store.PriceStore(str(tmp_path))
+    index = price_store.PriceIndex(str(tmp_path), refresh_interval=3600)
+    assert np.isnan(index.price('AAPL'))
+    index.close()
@@ -0,0 +1,160 @@
+"""
+This module defines the unit tests for registry.py and shadow.py
+"""
+import json
+import os
+import threading
+import time
+import pandas as pd
+import pytest
+
+from src import registry
+from src import shadow
+from src import train
+
+# create a sample DataFrame to mimic the cleaned data
+original_df = pd.DataFrame({'owner'          :['dependent', 'self', 'undisclosed', 'self'] * 6,
+                            'ticker'         :['AAPL', 'GOOG', 'MSFT', 'GOOG'] * 6,
+                            'type'           :['purchase', 'sale_full', 'purchase',
+                                               'sale_partial'] * 6,
+                            'amount'         :['$1,001 - $15,000', '$50,001 - $100,000',
+                                               '$1,001 -', '$1,001 - $15,000'] * 6,
+                            'representative' :['Hon. Alan S. Lowenthal', 'Hon. Rohit Khanna',
+                                               'Hon. Nancy Pelosi', 'Hon. Rohit Khanna'] * 6,
+                            'trans_price'    :[120.5, 80.1, 310.0, 95.2, 118.0, 79.9,
+                                               305.5, 97.0] * 3,
+                            'response'       :[1, 0, 0, 1, 1, 0] * 4})
+
+categ = ['owner', 'ticker', 'type', 'amount', 'representative']
+
+inputs = {'owner': 'self', 'ticker': 'GOOG', 'type': 'sale_full',
+          'amount': '$1,001 - $15,000', 'representative': 'Hon. Rohit Khanna'}
+
+def train_candidate(tmp_path, promote):
+    """
+    Trains on the sample data and registers the artifacts in tmp_path/registry
+    """
+    data_path = tmp_path / 'data.csv'
+    original_df.to_csv(data_path, index=False)
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    train.train(str(data_path), categ, 'response', str(tmp_path / 'model_results.yaml'),
+                None, None, *paths, 0.5, 2, 100, None, None, None,
+                registry_dir=str(tmp_path / 'registry'), promote=promote)
+    return paths
+
+def test_register_model(tmp_path):
+    """
+    Register a candidate without overwriting the served artifacts
+    """
+    paths = train_candidate(tmp_path, promote=False)
+    assert not any(os.path.exists(path) for path in paths)
+    versions = registry.list_versions(str(tmp_path / 'registry'))
+    assert [metadata['version'] for metadata in versions] == [1]
+    assert {'AUC', 'Log Loss', 'Accuracy'} == set(versions[0]['metrics'])
+    assert versions[0]['params']['categ'] == categ
+
+    model, enc, scaler, metadata = registry.load_version(str(tmp_path / 'registry'))
+    assert metadata['model_class'] == type(model).__name__
+    assert 0 <= train.predict_ind(model, enc, scaler, inputs, 100) <= 1
+
+def test_promote(tmp_path):
+    """
+    Serve a registered version and keep the numbering of the later versions
+    """
+    paths = train_candidate(tmp_path, promote=False)
+    registry_dir = str(tmp_path / 'registry')
+    model, enc, scaler, _ = registry.load_version(registry_dir, 1)
+    assert registry.register_model(registry_dir, model, enc, scaler) == 2
+    assert registry.promote(registry_dir, 1, *paths) == 1
+    served = train.get_model(*paths)
+    assert train.predict_ind(*served, inputs, 100) == \
+        train.predict_ind(model, enc, scaler, inputs, 100)
+    assert 'promoted_at' in registry.list_versions(registry_dir)[0]
+    assert not any(os.path.exists(path + '.promote') for path in paths)
+
+def test_promote_profile(tmp_path):
+    """
+    Promote the training profile of a version with its artifacts
+    """
+    paths = train_candidate(tmp_path, promote=False)
+    profile_path = tmp_path / 'training_profile.json'
+    profile_path.write_text('{"rows": 0}')
+    registry.promote(str(tmp_path / 'registry'), 1, *paths, profile_path=str(profile_path))
+    with open(profile_path, 'r', encoding='utf8') as file:
+        assert json.load(file)['rows'] == len(original_df)
+    assert not os.path.exists(str(profile_path) + '.promote')
+
+def test_promote_reload_time(tmp_path, monkeypatch):
+    """
+    Keep the newest time of the served artifacts until all of them are replaced
+    """
+    paths = train_candidate(tmp_path, promote=True)
+    before = max(os.stat(path).st_mtime_ns for path in paths)
+    seen, replace = [], os.replace
+    def record(source, target):
+        replace(source, target)
+        seen.append(max(os.stat(path).st_mtime_ns for path in paths))
+    monkeypatch.setattr(registry.os, 'replace', record)
+    registry.promote(str(tmp_path / 'registry'), 1, *paths)
+    assert seen == [before] * 3
+    after = {os.stat(path).st_mtime_ns for path in paths}
+    assert len(after) == 1 and after.pop() > before
+
+def test_promote_missing_version(tmp_path):
+    """
+    Ask for a version that was never registered
+    """
+    train_candidate(tmp_path, promote=False)
+    with pytest.raises(FileNotFoundError):
+        registry.promote(str(tmp_path / 'registry'), 7, *[str(tmp_path / 'x.pkl')] * 3)
+
+def test_shadow_scorer(tmp_path):
+    """
+    Score every request with the served model as candidate, which always agrees
+    """
+    train_candidate(tmp_path, promote=True)
+    served = train.get_model(*[str(tmp_path / name) for name in
+                               ['model.pkl', 'encoder.pkl', 'scaler.pkl']])
+    scorer = shadow.ShadowScorer(str(tmp_path / 'registry'), 'latest', fraction=1.0, seed=0)
+    for ticker in ['AAPL', 'GOOG', 'MSFT']:
+        probability = train.predict_ind(*served, dict(inputs, ticker=ticker), 100)
+        assert scorer.submit(dict(inputs, ticker=ticker), 100, probability, 0.001)
+    scorer.close()
+    stats = scorer.stats()
+    assert stats['scored'] == 3 and stats['agreement'] == 1.0
+    assert stats['mean_abs_difference'] == pytest.approx(0, abs=1e-3)
+    assert stats['served_p50_ms'] == pytest.approx(1.0)
+    assert not scorer.submit(inputs, 100, 0.5, 0.001)
+
+def test_shadow_scorer_sampling(tmp_path):
+    """
+    Draw no request at a zero fraction, and none when the version is missing
+    """
+    train_candidate(tmp_path, promote=False)
+    scorer = shadow.ShadowScorer(str(tmp_path / 'registry'), 1, fraction=0.0)
+    assert not any(scorer.submit(inputs, 100, 0.5, 0.001) for _ in range(100))
+    scorer.close()
+    missing = shadow.ShadowScorer(str(tmp_path / 'registry'), 9, fraction=1.0)
+    assert missing.closed and not missing.submit(inputs, 100, 0.5, 0.001)
+
+def test_shadow_scorer_close_full_queue(tmp_path, monkeypatch):
+    """
+    Count the requests dropped by concurrent threads and close while the candidate hangs
+    """
+    train_candidate(tmp_path, promote=False)
+    gate = threading.Event()
+    monkeypatch.setattr(shadow.ShadowScorer, 'score', lambda self, *request: gate.wait(5))
+    scorer = shadow.ShadowScorer(str(tmp_path / 'registry'), 1, fraction=1.0, max_queue=2)
+    results = []
+    def submit_many():
+        results.extend(scorer.submit(inputs, 100, 0.5, 0.001) for _ in range(500))
+    threads = [threading.Thread(target=submit_many) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert scorer.dropped == results.count(False) >= 1996
+    start = time.perf_counter()
+    scorer.close(timeout=0.1)
+    assert time.perf_counter() - start < 1
+    gate.set()
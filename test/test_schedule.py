@@ -0,0 +1,151 @@
+"""
+This module defines the unit tests for schedule.py
+"""
+import os
+import threading
+import time
+import pytest
+
+from src import schedule
+
+# jobs of the tests: two independent jobs and one sharing a resource with the first
+jobs = {'prices':       {'every': '1h', 'steps': ['acquire_prices'],
+                         'resources': ['external_data'], 'run_at_start': True},
+        'retrain':      {'every': '7d', 'steps': ['get_model', 'get_metrics'],
+                         'resources': ['models'], 'run_at_start': True},
+        'transactions': {'every': '1d', 'steps': ['acquire_new', 'clean'],
+                         'resources': ['external_data']}}
+
+def test_parse_interval():
+    """
+    Convert the intervals of the configuration to seconds
+    """
+    assert schedule.parse_interval('1h') == 3600
+    assert schedule.parse_interval('1.5d') == 129600
+    assert schedule.parse_interval(90) == 90
+
+def test_parse_interval_unexpected():
+    """
+    Provide an interval without a known unit
+    """
+    with pytest.raises(ValueError):
+        schedule.parse_interval('3 weeks')
+    with pytest.raises(ValueError):
+        schedule.parse_interval('0h')
+
+def test_independent_jobs_concurrent():
+    """
+    Run two due jobs without a shared resource at the same time
+    """
+    barrier = threading.Barrier(2, timeout=5)
+    ran = []
+    def run_command(command):
+        if command in ('acquire_prices', 'get_model'):
+            barrier.wait()  # raises if the other job does not run meanwhile
+        ran.append(command)
+    scheduler = schedule.Scheduler(jobs, run_command)
+    assert sorted(scheduler.run_pending()) == ['prices', 'retrain']
+    assert all(future.result() for future in scheduler.running.values())
+    assert ran.index('get_model') < ran.index('get_metrics')
+
+def test_shared_resource_serialized():
+    """
+    Run two due jobs sharing a resource one after the other
+    """
+    active = []
+    overlaps = []
+    def run_command(command):
+        active.append(command)
+        overlaps.append(len(active))
+        time.sleep(0.05)
+        active.remove(command)
+    shared = {name: dict(job, run_at_start=True) for name, job in jobs.items()
+              if name != 'retrain'}
+    scheduler = schedule.Scheduler(shared, run_command)
+    assert sorted(scheduler.run_pending()) == ['prices', 'transactions']
+    scheduler.executor.shutdown(wait=True)
+    assert max(overlaps) == 1
+
+def test_no_overlapping_runs():
+    """
+    Skip a due job while its previous run is in progress, and keep the schedule
+    """
+    release = threading.Event()
+    scheduler = schedule.Scheduler({'prices': jobs['prices']},
+                                   lambda command: release.wait(5))
+    now = time.time()
+    assert scheduler.run_pending(now) == ['prices']
+    assert scheduler.run_pending(now + 3 * 3600 + 1) == []
+    assert scheduler.next_run['prices'] > now + 3 * 3600
+    release.set()
+    scheduler.executor.shutdown(wait=True)
+
+def test_failed_step(tmp_path):
+    """
+    Stop a job at its failing step and keep the intervals after a restart
+    """
+    ran = []
+    def run_command(command):
+        ran.append(command)
+        raise ValueError('no data')
+    state_path = str(tmp_path / 'state.json')
+    scheduler = schedule.Scheduler({'retrain': jobs['retrain']}, run_command, state_path)
+    scheduler.run_pending()
+    assert not scheduler.running['retrain'].result()
+    assert ran == ['get_model']
+    restarted = schedule.Scheduler({'retrain': jobs['retrain']}, run_command, state_path)
+    assert restarted.state['retrain']['status'] == 'failed'
+    assert restarted.run_pending() == []
+
+def test_pipeline_lock(tmp_path):
+    """
+    Start a second scheduler while the first holds the lock file
+    """
+    lock_path = str(tmp_path / 'schedule.lock')
+    with schedule.PipelineLock(lock_path):
+        with pytest.raises(RuntimeError):
+            with schedule.PipelineLock(lock_path):
+                pass
+    with schedule.PipelineLock(lock_path):
+        pass
+
+def test_step_resources():
+    """
+    Find the resources of a step from the jobs running it
+    """
+    assert schedule.step_resources(jobs, 'clean') == ['external_data']
+    assert schedule.step_resources(jobs, 'get_model') == ['models']
+    assert schedule.step_resources(jobs, 'create_table') == []
+
+def test_resource_locks_across_processes(tmp_path):
+    """
+    Make a step started in another process wait for the job holding its resource
+    """
+    lock_dir = str(tmp_path / 'locks')
+    read_end, write_end = os.pipe()
+    with schedule.ResourceLocks(lock_dir, ['clean_data', 'external_data']):
+        pid = os.fork()
+        if pid == 0:
+            with schedule.ResourceLocks(lock_dir, ['external_data']):
+                os.write(write_end, b'x')
+            os._exit(0)
+        time.sleep(0.3)
+        os.set_blocking(read_end, False)
+        with pytest.raises(BlockingIOError):
+            os.read(read_end, 1)
+    os.set_blocking(read_end, True)
+    assert os.read(read_end, 1) == b'x'
+    assert os.waitpid(pid, 0)[1] == 0
+
+def test_scheduled_command_unset_variable(monkeypatch):
+    """
+    Start the scheduler with a command using an unset environment variable
+    """
+    import run  # pylint: disable=import-outside-toplevel
+    conf = {'schedule': {'jobs': {'transactions': {'every': '1d',
+                                                   'steps': ['clean --s3_raw $S3_BUCKET']}}}}
+    monkeypatch.delenv('S3_BUCKET', raising=False)
+    with pytest.raises(ValueError):
+        run.scheduled_command(conf)
+    monkeypatch.setenv('S3_BUCKET', 's3://bucket')
+    assert callable(run.scheduled_command(conf))
@@ -0,0 +1,72 @@
+"""
+This module defines the unit tests for synthetic.py
+"""
+import pandas as pd
+import pytest
+from src import synthetic, clean
+
+OWNERS = {'self': 0.6, 'joint': 0.3, 'dependent': 0.1}
+TYPES = {'purchase': 0.5, 'sale_full': 0.3, 'sale_partial': 0.2}
+AMOUNTS = {'$1,001 - $15,000': 0.7, '$15,001 - $50,000': 0.3}
+
+def generate(tmp_path, **kwargs):
+    """
+    Helper that writes synthetic files to a temporary folder and returns their paths
+    """
+    paths = [str(tmp_path / name) for name in ['sw.csv', 'tp.csv', 'cp.csv', 'rt.csv']]
+    args = dict(n_rows=5000, n_tickers=12, n_representatives=7, owner_probs=OWNERS,
+                type_probs=TYPES, amount_probs=AMOUNTS, missing_owner_frac=0.1,
+                dup_frac=0.05, tickers=['AAPL', 'MSFT'], chunksize=2000)
+    args.update(kwargs)
+    synthetic.generate_data(*paths, **args)
+    return paths
+
+# define tests with happy paths
+def test_generate_data_layout(tmp_path):
+    """
+    Check whether the generated files have the layout of the acquired data
+    """
+    paths = generate(tmp_path)
+    data = pd.read_csv(paths[0])
+    assert data.columns.tolist() == synthetic.STOCKWATCHER_COLUMNS
+    assert len(data) == 5000
+    assert data['ticker'].nunique() == 12
+    assert {'AAPL', 'MSFT'} <= set(data['ticker'])
+    assert data['representative'].nunique() == 7
+    assert pd.read_csv(paths[3]).columns.tolist() == synthetic.RECENT_COLUMNS
+    assert pd.read_csv(paths[2])['ticker'].nunique() == 12
+
+def test_generate_data_messiness(tmp_path):
+    """
+    Check whether the generated data contains missing owners and duplicates
+    """
+    data = pd.read_csv(generate(tmp_path)[0])
+    assert 0.05 < (data['owner'] == '--').mean() < 0.15
+    assert data.duplicated().sum() > 0
+
+def test_generate_data_reproducible(tmp_path):
+    """
+    Check whether the same seed generates the same data
+    """
+    (tmp_path / 'first').mkdir()
+    (tmp_path / 'second').mkdir()
+    first = pd.read_csv(generate(tmp_path / 'first')[0])
+    second = pd.read_csv(generate(tmp_path / 'second')[0])
+    assert first.equals(second)
+
+def test_generate_data_cleans(tmp_path):
+    """
+    Check whether the generated data goes through the cleaning stage
+    """
+    paths = generate(tmp_path, missing_price_frac=0.1)
+    cleaned = clean.clean_fused(*paths[:3], ['transaction_date', 'ptr_link'])
+    assert 0 < len(cleaned) < 5000
+    assert '--' not in set(cleaned['owner'])
+
+# define unhappy path
+def test_generate_data_unexpected_probs(tmp_path):
+    """
+    Provide negative relative frequencies to the generator
+    """
+    with pytest.raises(ValueError):
+        generate(tmp_path, owner_probs={'self': -1.0, 'joint': 2.0})
@@ -5,6 +5,8 @@ import warnings
 import pandas as pd
 import numpy as np
 import pytest
+import yaml
+import matplotlib.pyplot as plt
 
 from sklearn.metrics import roc_auc_score
 from sklearn.linear_model import LogisticRegression
@@ -13,7 +15,7 @@ from sklearn.preprocessing import OneHotEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import log_loss
 from sklearn.metrics import classification_report
-from src import train
+from src import train, vocab
 
 # create a sample DataFrame to mimic the cleaned data
 original_df = pd.DataFrame({'owner'          :['dependent',
@@ -349,3 +351,340 @@ def test_unexpected_max_iter():
                                 max_iter='15',
                                 pred_path_1=None,
                                 pred_path_2=None)
+
+# define tests for the hyperparameter search
+def test_cache_folds():
+    """
+    Check that every cached fold is scaled with the statistics of its own training rows
+    """
+    features = OH_encoded_df.drop(['response'],axis=1)
+    folds = train.cache_folds(features, OH_encoded_df['response'].values, 2, SEED)
+    assert len(folds) == 2
+    for x_fold_train, _, x_fold_valid, _ in folds:
+        assert np.allclose(x_fold_train.mean(axis=0), 0)
+        assert x_fold_valid.shape[1] == features.shape[1]
+
+def test_tune(tmp_path):
+    """
+    Check that the search returns a supported configuration and keeps existing results
+    """
+    data_path = tmp_path / 'data.csv'
+    results_path = tmp_path / 'model_results.yaml'
+    pd.concat([original_df]*4, ignore_index=True).to_csv(data_path, index=False)
+    train.update_results(str(results_path), {'AUC': '0.5'})
+    best = train.tune(local_path=str(data_path),
+                      categ=['owner','ticker','type','amount','representative'],
+                      response='response',
+                      results_path=str(results_path),
+                      test_size=0.25,
+                      random_state=SEED,
+                      max_iter=100,
+                      param_grid={'C': [0.1, 1.0],
+                                  'penalty': ['l1', 'l2'],
+                                  'solver': ['lbfgs', 'liblinear']},
+                      n_folds=2,
+                      n_jobs=1)
+    assert best['penalty'] in train.SOLVER_PENALTIES[best['solver']]
+    with open(results_path, 'r', encoding='utf8') as file:
+        results = yaml.safe_load(file)
+    assert results[0] == {'AUC': '0.5'}
+    assert len(results[1]['Tuning']['Candidates']) == 6
+
+def test_train_tuned_params(tmp_path):
+    """
+    Train with the best configuration of tune and keep the tuning results in the file
+    """
+    data_path = tmp_path / 'data.csv'
+    results_path = tmp_path / 'model_results.yaml'
+    pd.concat([original_df]*4, ignore_index=True).to_csv(data_path, index=False)
+    tuned = {'C': 0.1, 'penalty': 'l1', 'solver': 'liblinear'}
+    train.update_results(str(results_path), {'Tuning': {'Best': {'params': tuned}}})
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    train.train(str(data_path), ['owner','ticker','type','amount','representative'],
+                'response', str(results_path), None, None, *paths, 0.25, SEED, 100,
+                None, None, None, tuned_params_path=str(results_path))
+    model, _, _ = train.get_model(*paths)
+    assert (model.C, model.penalty, model.solver) == (0.1, 'l1', 'liblinear')
+    with open(results_path, 'r', encoding='utf8') as file:
+        results = yaml.safe_load(file)
+    assert results[0] == {'Tuning': {'Best': {'params': tuned}}}
+    assert 'AUC' in results[2]
+
+def test_tune_unexpected_grid(tmp_path):
+    """
+    Provide a grid without any supported penalty/solver combination
+    """
+    data_path = tmp_path / 'data.csv'
+    original_df.to_csv(data_path, index=False)
+    with pytest.raises(ValueError):
+        train.tune(local_path=str(data_path),
+                   categ=['owner','ticker','type','amount','representative'],
+                   response='response',
+                   results_path=None,
+                   test_size=0.50,
+                   random_state=SEED,
+                   max_iter=15,
+                   param_grid={'penalty': ['l1'], 'solver': ['lbfgs']},
+                   n_folds=2,
+                   n_jobs=1)
+
+# define test for the incremental training mode
+def test_train_incremental(tmp_path):
+    """
+    Check that chunked training produces artifacts usable by predict_ind
+    """
+    data_path = tmp_path / 'data.csv'
+    pd.concat([original_df]*5, ignore_index=True).to_csv(data_path, index=False)
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    train.train_incremental(local_path=str(data_path),
+                            categ=['owner','ticker','type','amount','representative'],
+                            response='response',
+                            model_path=paths[0],
+                            encoder_path=paths[1],
+                            scaler_path=paths[2],
+                            results_path=None,
+                            chunksize=7,
+                            n_epochs=3,
+                            random_state=SEED)
+    sgd_model, sgd_enc, sgd_scaler = train.get_model(*paths)
+    full_enc = OneHotEncoder().fit(original_df[['owner','ticker','type','amount','representative']])
+    assert sgd_enc.get_feature_names_out().tolist() == full_enc.get_feature_names_out().tolist()
+    assert sgd_scaler.n_samples_seen_ == 50
+    prediction = train.predict_ind(sgd_model, sgd_enc, sgd_scaler,
+                                   ['self','GOOG','sale_full','$1,001 - $15,000',
+                                    'Hon. Rohit Khanna'], 120)
+    assert 0 <= prediction <= 1
+
+def test_train_incremental_missing_category(tmp_path):
+    """
+    Stream chunks with a missing owner and check the loss is stored as a float
+    """
+    data_path = tmp_path / 'data.csv'
+    results_path = tmp_path / 'model_results.yaml'
+    data = pd.concat([original_df]*5, ignore_index=True).replace({'undisclosed': 'joint'})
+    data.loc[3, 'owner'] = None
+    data.to_csv(data_path, index=False)
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    train.train_incremental(local_path=str(data_path),
+                            categ=['owner','ticker','type','amount','representative'],
+                            response='response',
+                            model_path=paths[0],
+                            encoder_path=paths[1],
+                            scaler_path=paths[2],
+                            results_path=str(results_path),
+                            chunksize=7,
+                            n_epochs=2,
+                            random_state=SEED)
+    _, sgd_enc, _ = train.get_model(*paths)
+    assert train.MISSING_CATEGORY in sgd_enc.categories_[0]
+    with open(results_path, 'r', encoding='utf8') as file:
+        epochs = yaml.safe_load(file)[0]['Incremental']
+    assert all(isinstance(epoch['Progressive Log Loss'], float) for epoch in epochs)
+
+def test_train_incremental_missing_code(tmp_path):
+    """
+    Stream integer codes with a missing owner, decoded to categorical columns
+    """
+    data_path, vocab_path = tmp_path / 'data.csv', str(tmp_path / 'vocab.json')
+    data = pd.concat([original_df]*5, ignore_index=True).replace({'undisclosed': 'joint'})
+    data.loc[3, 'owner'] = None
+    vocab.save_encoded(data, str(data_path), vocab_path)
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    train.train_incremental(local_path=str(data_path),
+                            categ=['owner','ticker','type','amount','representative'],
+                            response='response',
+                            model_path=paths[0],
+                            encoder_path=paths[1],
+                            scaler_path=paths[2],
+                            results_path=None,
+                            chunksize=7,
+                            n_epochs=1,
+                            random_state=SEED,
+                            vocab_path=vocab_path)
+    _, sgd_enc, _ = train.get_model(*paths)
+    assert train.MISSING_CATEGORY in sgd_enc.categories_[0]
+
+# define tests for the warm-start retraining mode
+def test_transfer_coefficients():
+    """
+    Check that the transferred coefficients keep the decision function of the prior model
+    """
+    features = OH_encoded_df.drop(['response'],axis=1)
+    old_scaler = StandardScaler().fit(features)
+    prior = LogisticRegression().fit(old_scaler.transform(features), OH_encoded_df['response'])
+    new_features = features.assign(new_col=np.arange(len(features)))
+    new_scaler = StandardScaler().fit(new_features.iloc[:6])
+    coef, intercept = train.transfer_coefficients(prior, old_scaler, new_scaler,
+                                                  new_features.columns.tolist())
+    expected = prior.decision_function(old_scaler.transform(features))
+    actual = new_scaler.transform(new_features) @ coef[0] + intercept[0]
+    assert np.allclose(actual, expected)
+
+def test_retrain_warm(tmp_path):
+    """
+    Check that warm-start retraining extends the encoder with new categories
+    """
+    categ = ['owner','ticker','type','amount','representative']
+    data_path = tmp_path / 'data.csv'
+    results_path = tmp_path / 'model_results.yaml'
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    pd.concat([original_df]*3, ignore_index=True).to_csv(data_path, index=False)
+    train.train(str(data_path), categ, 'response', None, None, None, *paths,
+                0.25, SEED, 100, None, None, None)
+    new_df = original_df.assign(ticker=['TSLA']*2 + original_df['ticker'].tolist()[2:])
+    pd.concat([original_df]*3 + [new_df], ignore_index=True).to_csv(data_path, index=False)
+    train.retrain_warm(str(data_path), categ, 'response', *paths, str(results_path),
+                       0.25, SEED, 100)
+    _, new_enc, _ = train.get_model(*paths)
+    assert new_enc.categories_[1].tolist() == ['AAPL', 'GOOG', 'MSFT', 'TSLA']
+    with open(results_path, 'r', encoding='utf8') as file:
+        report = yaml.safe_load(file)[0]['Warm Start']
+    assert set(report) == {'Warm', 'Cold', 'Iterations Saved', 'Seconds Saved'}
+
+# define tests for the sharded training mode
+def test_train_sharded(tmp_path):
+    """
+    Check that every ticker gets a shard and that predictions are routed to it
+    """
+    categ = ['owner','ticker','type','amount','representative']
+    data_path = tmp_path / 'data.csv'
+    results_path = tmp_path / 'model_results.yaml'
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    pd.concat([original_df]*6, ignore_index=True).to_csv(data_path, index=False)
+    train.train_sharded(str(data_path), categ, 'response', str(results_path), *paths,
+                        0.25, SEED, 100, min_rows=5, n_jobs=1)
+    sharded, enc_4, scaler_4 = train.get_model(*paths)
+    assert sorted(sharded.models) == ['AAPL', 'GOOG', 'MSFT']
+    assert sharded.route('TSLA') is sharded.default
+
+    inputs = {'owner':'self', 'ticker':'GOOG', 'type':'sale_full',
+              'amount':'$1,001 - $15,000', 'representative':'Hon. Rohit Khanna'}
+    expected = sharded.models['GOOG'].predict_proba(train.transform(enc_4, scaler_4,
+                                                                    inputs, 120))
+    assert train.predict_ind(sharded, enc_4, scaler_4, inputs, 120) == \
+        round(float(expected[0][1]), 3)
+    batch = pd.DataFrame([inputs, dict(inputs, ticker='AAPL')]).assign(trans_price=120)
+    probabilities = train.predict_batch(sharded, enc_4, scaler_4, batch)
+    assert round(float(probabilities[0]), 3) == round(float(expected[0][1]), 3)
+    assert probabilities[1] == pytest.approx(train.predict_ind(
+        sharded.models['AAPL'], enc_4, scaler_4, dict(inputs, ticker='AAPL'), 120), abs=5e-4)
+
+    with open(results_path, 'r', encoding='utf8') as file:
+        report = yaml.safe_load(file)[0]['Sharded']
+    assert [shard['Ticker'] for shard in report['Shards']] == ['AAPL', 'GOOG', 'MSFT']
+    assert {'Routed', 'Single Model', 'Single Model Seconds',
+            'Shard Wall Seconds'} <= set(report)
+
+def test_train_sharded_single_class(tmp_path, monkeypatch, caplog):
+    """
+    Score a test set holding a single class, which has no AUC
+    """
+    categ = ['owner','ticker','type','amount','representative']
+    data_path = tmp_path / 'data.csv'
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    pd.concat([original_df]*6, ignore_index=True).to_csv(data_path, index=False)
+    monkeypatch.setattr(train, 'score_rows', lambda y_true, proba: {'AUC': None,
+                                                                    'Log Loss': 0.5})
+    with caplog.at_level('INFO', logger='src.train'):
+        train.train_sharded(str(data_path), categ, 'response', None, *paths,
+                            0.25, SEED, 100, min_rows=5, n_jobs=1)
+    assert 'Test AUC n/a' in caplog.text
+
+def test_retrain_warm_missing_category(tmp_path):
+    """
+    Retrain on new rows with a missing owner, which the prior encoder never saw
+    """
+    categ = ['owner','ticker','type','amount','representative']
+    data_path = tmp_path / 'data.csv'
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    data = pd.concat([original_df]*3, ignore_index=True).replace({'undisclosed': 'joint'})
+    data.to_csv(data_path, index=False)
+    train.train(str(data_path), categ, 'response', None, None, None, *paths,
+                0.25, SEED, 100, None, None, None)
+    data.loc[[0, 5], 'owner'] = None
+    data.to_csv(data_path, index=False)
+    train.retrain_warm(str(data_path), categ, 'response', *paths, None, 0.25, SEED, 100,
+                       compare_cold=False)
+    _, new_enc, _ = train.get_model(*paths)
+    assert new_enc.categories_[0].tolist() == ['dependent', 'joint', 'self',
+                                               train.MISSING_CATEGORY]
+
+def test_retrain_warm_sharded(tmp_path):
+    """
+    Provide a sharded model to the warm-start retraining
+    """
+    categ = ['owner','ticker','type','amount','representative']
+    data_path = tmp_path / 'data.csv'
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    pd.concat([original_df]*6, ignore_index=True).to_csv(data_path, index=False)
+    train.train_sharded(str(data_path), categ, 'response', None, *paths,
+                        0.25, SEED, 100, min_rows=5, n_jobs=1)
+    with pytest.raises(ValueError):
+        train.retrain_warm(str(data_path), categ, 'response', *paths, None, 0.25, SEED, 100)
+
+def test_retrain_warm_liblinear(tmp_path):
+    """
+    Provide a model fitted with the liblinear solver, which ignores warm_start
+    """
+    categ = ['owner','ticker','type','amount','representative']
+    data_path = tmp_path / 'data.csv'
+    paths = [str(tmp_path / name) for name in ['model.pkl', 'encoder.pkl', 'scaler.pkl']]
+    pd.concat([original_df]*3, ignore_index=True).to_csv(data_path, index=False)
+    train.train(str(data_path), categ, 'response', None, None, None, *paths,
+                0.25, SEED, 100, None, None, None, model_params={'solver': 'liblinear'})
+    with pytest.raises(ValueError):
+        train.retrain_warm(str(data_path), categ, 'response', *paths, None, 0.25, SEED, 100)
+
+# define test for the metrics plots
+def test_save_plots(tmp_path):
+    """
+    Check that the plots are saved from cached predictions and the figures get closed
+    """
+    matrix_path = tmp_path / 'confusion_matrix.png'
+    roc_path = tmp_path / 'aucroc_curve.png'
+    train.train_evaluate(features=OH_encoded_df.drop(['response'],axis=1),
+                         response=OH_encoded_df['response'].values.ravel(),
+                         results_path=None,
+                         matrix_path=str(matrix_path),
+                         roc_path=str(roc_path),
+                         test_size=0.50,
+                         random_state=SEED,
+                         max_iter=15,
+                         pred_path_1=None,
+                         pred_path_2=None)
+    assert matrix_path.exists() and roc_path.exists()
+    assert plt.get_fignums() == []
+
+def test_save_plots_async(tmp_path):
+    """
+    Check that the plots rendered in a background process exist once train returns
+    """
+    data_path = tmp_path / 'data.csv'
+    matrix_path = tmp_path / 'confusion_matrix.png'
+    roc_path = tmp_path / 'aucroc_curve.png'
+    pd.concat([original_df]*3, ignore_index=True).to_csv(data_path, index=False)
+    train.train(str(data_path), ['owner','ticker','type','amount','representative'],
+                'response', None, str(matrix_path), str(roc_path), None, None, None,
+                0.25, SEED, 100, None, None, None, plot_async=True)
+    assert matrix_path.exists() and roc_path.exists()
+
+def test_transform_numeric_amount():
+    """
+    Check whether inputs keyed by column name are encoded as the model was trained,
+    with the amount turned into its numeric bounds
+    """
+    data = df_two_row.rename(columns={'type_trans': 'type'}).assign(response=[1, 0])
+    data, categ = train.use_numeric_amount(data, ['owner', 'ticker', 'type', 'amount',
+                                                  'representative'])
+    assert categ == ['owner', 'ticker', 'type', 'representative']
+    enc_3, features_3, _ = train.encode_features(data, categ, 'response')
+    scaler_3 = StandardScaler().fit(features_3)
+    inputs = {'representative':'Hon. Kurt Schrader', 'owner':'self', 'type':'purchase',
+              'amount':'$15,001 - $50,000', 'ticker':'AAPL'}
+    expected_df = pd.DataFrame([[1., 1., 0., 1., 0., 0., 1.,
+                                 15001., 50000., 32500.5, 153.6]],
+                               columns=features_3.columns)
+    actual_output = train.transform(enc_3, scaler_3, inputs, 153.6)
+    assert features_3.columns[-4:].tolist() == ['amount_lower', 'amount_upper',
+                                                'amount_mid', 'trans_price']
+    np.testing.assert_allclose(actual_output, scaler_3.transform(expected_df))
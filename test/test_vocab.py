@@ -0,0 +1,83 @@
+"""
+This module defines the unit tests for vocab.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from src import vocab
+
+# create sample data with repeated strings and a missing owner
+data_df = pd.DataFrame({'owner': ['self', 'joint', np.nan, 'self'],
+                        'ticker': ['TSLA', 'AAPL', 'TSLA', 'MSFT'],
+                        'amount': ['$1,001 - $15,000'] * 4,
+                        'trans_price': [100., 10., 90., 200.],
+                        'response': [1, 0, 1, 0]})
+
+# define tests with happy paths
+def test_update_vocab():
+    """
+    Check whether new values are appended in sorted order without moving the old ones
+    """
+    vocab_in = {'ticker': ['TSLA']}
+    vocab_out = vocab.update_vocab(vocab_in, data_df)
+    assert vocab_out['ticker'] == ['TSLA', 'AAPL', 'MSFT']
+    assert vocab_out['owner'] == ['joint', 'self']
+    assert list(vocab_out) == ['ticker', 'owner', 'amount']
+    assert vocab_in == {'ticker': ['TSLA']}
+
+def test_encode_decode():
+    """
+    Check whether the codes are int32, unknown and missing values map to -1 and
+    string or categorical inputs decode to the same values
+    """
+    vocab_in = {'owner': ['joint', 'self'], 'ticker': ['AAPL', 'TSLA']}
+    encoded = vocab.encode_frame(data_df, vocab_in)
+    assert encoded['owner'].tolist() == [1, 0, -1, 1]
+    assert encoded['ticker'].tolist() == [1, 0, 1, -1]
+    assert encoded['ticker'].dtype == np.int32
+    assert encoded['amount'].equals(data_df['amount'])
+
+    categorical = data_df.astype({'owner': 'category', 'ticker': 'category'})
+    pd.testing.assert_frame_equal(vocab.encode_frame(categorical, vocab_in), encoded)
+
+    decoded = vocab.decode_frame(encoded.copy(), vocab_in)
+    assert decoded['owner'].astype(object).tolist()[:2] == ['self', 'joint']
+    assert decoded['ticker'].isna().tolist() == [False, False, False, True]
+
+def test_save_read_encoded(tmp_path):
+    """
+    Check whether the data read back, whole or in chunks, matches the data saved
+    """
+    save_path, vocab_path = str(tmp_path / 'data.csv'), str(tmp_path / 'vocab.json')
+    vocab.save_encoded(data_df, save_path, vocab_path)
+    assert pd.read_csv(save_path)['ticker'].tolist() == [2, 0, 2, 1]
+
+    data = vocab.read_encoded(save_path, vocab_path)
+    pd.testing.assert_frame_equal(data.astype({'owner': object, 'ticker': object,
+                                               'amount': object}), data_df)
+    chunks = list(vocab.read_encoded(save_path, vocab_path, chunksize=3))
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    assert chunks[1]['ticker'].tolist() == ['MSFT']
+
+    # values of a later batch get new codes, the earlier file stays readable
+    vocab.save_encoded(data_df.assign(ticker='FB'), str(tmp_path / 'more.csv'), vocab_path)
+    assert vocab.load_vocab(vocab_path)['ticker'] == ['AAPL', 'MSFT', 'TSLA', 'FB']
+    assert vocab.read_encoded(save_path, vocab_path)['ticker'].tolist() == \
+        data_df['ticker'].tolist()
+    assert vocab.read_encoded(save_path).equals(pd.read_csv(save_path))
+
+def test_memory_per_row():
+    """
+    Check whether the integer codes take less memory than the strings
+    """
+    vocab_in = vocab.update_vocab({}, data_df)
+    encoded = vocab.encode_frame(data_df, vocab_in)
+    assert vocab.memory_per_row(encoded) < vocab.memory_per_row(data_df)
+
+# define unhappy path
+def test_decode_unknown_code():
+    """
+    Check whether codes outside of the vocabulary are rejected
+    """
+    with pytest.raises(ValueError):
+        vocab.decode_frame(pd.DataFrame({'ticker': [0, 5]}), {'ticker': ['AAPL']})